@@ -0,0 +1,110 @@
+"""
+benchmarks/bench_jsobj.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+
+Benchmark :py:func:`gw2copilot.jsobj.parse_js_object` against the slimit-based
+:py:func:`gw2copilot.jsobj.read_js_object` on gw2timer's ``general.js``, the
+same way :py:meth:`~.CachingAPIClient._gw2timer_travel_connections` uses them.
+
+Usage: ``python benchmarks/bench_jsobj.py [path/to/general.js] [iterations]``
+
+If no path is given, the copy in the default gw2copilot cache directory is used.
+"""
+
+import os
+import sys
+import time
+import cStringIO
+
+from gw2copilot.utils import extract_js_var
+from gw2copilot import jsobj
+
+VARNAME = 'GW2T_GATEWAY_CONNECTION'
+
+
+def best_of(func, iterations):
+    """return the best wall-clock time of ``iterations`` calls to ``func``"""
+    best = None
+    for _ in range(iterations):
+        start = time.time()
+        func()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def main(path, iterations):
+    with open(path, 'r') as fh:
+        src = fh.read()
+    start = time.time()
+    var_src = extract_js_var(src, VARNAME)
+    print('extract_js_var: %.6fs (%d of %d bytes)' % (
+        time.time() - start, len(var_src), len(src)))
+
+    def slimit():
+        # ply writes table-generation warnings to stderr
+        real_stderr = sys.stderr
+        sys.stderr = cStringIO.StringIO()
+        try:
+            return jsobj.read_js_object(var_src)
+        finally:
+            sys.stderr = real_stderr
+
+    def native():
+        # clear the memoization so every iteration really parses
+        jsobj._parse_cache.clear()
+        return jsobj.parse_js_object(var_src)
+
+    if slimit() != native():
+        raise SystemExit('ERROR: parse results differ between implementations')
+    t_slimit = best_of(slimit, iterations)
+    t_native = best_of(native, iterations)
+    jsobj.parse_js_object(var_src)
+    t_memo = best_of(lambda: jsobj.parse_js_object(var_src), iterations)
+    print('read_js_object (slimit):    %.6fs' % t_slimit)
+    print('parse_js_object:            %.6fs (%.1fx faster)' % (
+        t_native, t_slimit / t_native))
+    print('parse_js_object (memoized): %.6fs' % t_memo)
+
+
+if __name__ == "__main__":
+    default = os.path.abspath(os.path.expanduser(
+        '~/.gw2copilot/cache/gw2timer/general.js'))
+    p = sys.argv[1] if len(sys.argv) > 1 else default
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(p, n)
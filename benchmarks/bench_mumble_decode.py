@@ -0,0 +1,116 @@
+"""
+benchmarks/bench_mumble_decode.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+
+Micro-benchmark MumbleLink decoding: the old ctypes path (copy the mmap to a
+string, cast it to :py:class:`~gw2copilot.read_mumble_link.Link`, call
+``as_dict()``) against :py:class:`~gw2copilot.read_mumble_link.LinkDecoder`,
+both for a full decode and for the common "uiTick unchanged" poll.
+
+The ctypes ``Link`` layout only matches GW2's under Windows/wine (4-byte
+``c_ulong`` and 2-byte ``c_wchar``); elsewhere the ctypes numbers are still
+representative of its cost, but not of its output.
+
+Usage: ``python benchmarks/bench_mumble_decode.py [iterations]``
+"""
+
+import sys
+import mmap
+import timeit
+
+from gw2copilot.read_mumble_link import (
+    Link, Unpack, LinkDecoder, pack_link, LINK_SIZE
+)
+
+SAMPLE = dict(
+    uiVersion=2, uiTick=124,
+    fAvatarPosition=[-33.63, 25.56, 316.72],
+    fAvatarFront=[0.13, 0.0, -0.99],
+    name=u'Guild Wars 2',
+    fCameraPosition=[-33.86, 27.54, 318.36],
+    fCameraFront=[0.13, -0.22, -0.96],
+    identity={
+        "name": "Jantman", "profession": 4, "race": 3, "map_id": 50,
+        "world_id": 268435465, "team_color_id": 0, "commander": False,
+        "fov": 0.873
+    },
+    context={
+        "buildId": 68550, "mapId": 50, "shardId": 268435465, "instance": 0,
+        "mapType": 5,
+        "serverAddress": {"sin_port": 27999, "sin_addr": "97.105.110.95",
+                          "sin_family": 2}
+    }
+)
+
+
+def main(iterations):
+    mm = mmap.mmap(-1, LINK_SIZE)
+    mm.write(pack_link(**SAMPLE))
+    decoder = LinkDecoder()
+    previous_tick = [124]
+
+    def ctypes_full():
+        mm.seek(0)
+        Unpack(Link, mm.read(LINK_SIZE)).as_dict()
+
+    def ctypes_unchanged():
+        # the old reader did the full copy and cast before checking uiTick
+        mm.seek(0)
+        Unpack(Link, mm.read(LINK_SIZE)).uiTick != previous_tick[0]
+
+    def struct_full():
+        decoder.decode(mm)
+
+    def struct_unchanged():
+        decoder.tick(mm)[1] != previous_tick[0]
+
+    print('%d iterations each; best of 3' % iterations)
+    for name, func in [
+        ('ctypes full decode', ctypes_full),
+        ('struct full decode', struct_full),
+        ('ctypes unchanged tick', ctypes_unchanged),
+        ('struct unchanged tick', struct_unchanged),
+    ]:
+        best = min(timeit.repeat(func, number=iterations, repeat=3))
+        print('%-22s %8.2f us/call' % (name, best / iterations * 1e6))
+
+
+if __name__ == "__main__":
+    iterations = 20000
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+    main(iterations)
@@ -0,0 +1,216 @@
+"""
+benchmarks/bench_tiles.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+
+Load test for ``/api/tiles``-style responses: compare buffering each tile in
+memory (the old behavior; read the file into a string and return it) against
+streaming it from disk with :py:class:`~.CachingFile` (the current behavior
+for cached tiles).
+
+For each mode a server is started in a separate process, serving a directory
+of synthetic tiles; it's hit with a few hundred concurrent clients, and then
+asked for its peak RSS (``ru_maxrss``).
+
+Usage: ``python benchmarks/bench_tiles.py [-c CONCURRENCY] [-n REQUESTS]
+[-s TILE_SIZE] [-t NUM_TILES]``
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib2
+import resource as pyresource
+
+MODES = ['buffered', 'streaming']
+
+
+def serve(mode, tile_dir, port):
+    """run a tile server in ``mode`` until killed"""
+    from twisted.internet import reactor
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+    from gw2copilot.caching_file import CachingFile
+
+    class BufferedTile(Resource):
+        isLeaf = True
+
+        def __init__(self, path):
+            Resource.__init__(self)
+            self.path = path
+
+        def render_GET(self, request):
+            request.setHeader('Content-Type', 'image/jpeg')
+            with open(self.path, 'rb') as fh:
+                return fh.read()
+
+    class Tiles(Resource):
+
+        def getChild(self, name, request):
+            path = os.path.join(tile_dir, name)
+            if mode == 'buffered':
+                return BufferedTile(path)
+            return CachingFile(path, defaultType='image/jpeg')
+
+    class RSS(Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            return '%d' % pyresource.getrusage(
+                pyresource.RUSAGE_SELF).ru_maxrss
+
+    root = Resource()
+    root.putChild('tiles', Tiles())
+    root.putChild('rss', RSS())
+    reactor.listenTCP(port, Site(root), backlog=1024,
+                      interface='127.0.0.1')
+    reactor.run()
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def wait_for(port, timeout=30):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start on port %d' % port)
+
+
+def load(port, names, concurrency, num_requests):
+    """
+    Request tiles with ``concurrency`` client threads; return (seconds,
+    bytes received, errors).
+    """
+    counter = {'next': 0, 'bytes': 0, 'errors': 0}
+    lock = threading.Lock()
+    start_evt = threading.Event()
+
+    def worker():
+        start_evt.wait()
+        while True:
+            with lock:
+                i = counter['next']
+                if i >= num_requests:
+                    return
+                counter['next'] += 1
+            url = 'http://127.0.0.1:%d/tiles/%s' % (
+                port, names[i % len(names)])
+            try:
+                data = urllib2.urlopen(url, timeout=60).read()
+                with lock:
+                    counter['bytes'] += len(data)
+            except Exception:
+                with lock:
+                    counter['errors'] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    start = time.time()
+    start_evt.set()
+    for t in threads:
+        t.join()
+    return time.time() - start, counter['bytes'], counter['errors']
+
+
+def run_mode(mode, tile_dir, names, args):
+    port = free_port()
+    proc = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), '--serve', mode, tile_dir,
+        str(port)
+    ])
+    try:
+        wait_for(port)
+        baseline = int(urllib2.urlopen(
+            'http://127.0.0.1:%d/rss' % port).read())
+        duration, nbytes, errors = load(
+            port, names, args.concurrency, args.requests)
+        peak = int(urllib2.urlopen('http://127.0.0.1:%d/rss' % port).read())
+    finally:
+        proc.kill()
+        proc.wait()
+    print('%-10s %8.1f req/s %8.1f MB/s  peak RSS %7d KB (+%d KB)  '
+          'errors %d' % (mode, args.requests / duration,
+                         nbytes / duration / 1048576.0, peak,
+                         peak - baseline, errors))
+
+
+def main():
+    p = argparse.ArgumentParser(description='tile serving load test')
+    p.add_argument('-c', '--concurrency', type=int, default=300)
+    p.add_argument('-n', '--requests', type=int, default=5000)
+    p.add_argument('-s', '--tile-size', type=int, default=65536,
+                   help='synthetic tile size in bytes')
+    p.add_argument('-t', '--tiles', type=int, default=500,
+                   help='number of distinct synthetic tiles')
+    args = p.parse_args()
+    tile_dir = tempfile.mkdtemp(prefix='gw2copilot-bench-tiles-')
+    try:
+        names = []
+        for i in range(args.tiles):
+            name = '1_1_5_%d_%d.jpg' % (i % 32, i // 32)
+            with open(os.path.join(tile_dir, name), 'wb') as fh:
+                fh.write(os.urandom(args.tile_size))
+            names.append(name)
+        print('%d requests, %d concurrent, %d tiles of %d bytes' % (
+            args.requests, args.concurrency, args.tiles, args.tile_size))
+        for mode in MODES:
+            run_mode(mode, tile_dir, names, args)
+    finally:
+        shutil.rmtree(tile_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,112 @@
+"""
+benchmarks/tile_dedup_report.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+
+Report how much disk space the content-addressed
+:py:class:`~gw2copilot.tile_store.TileStore` saves: the number of cached
+tiles, distinct blobs, dedup ratio and bytes saved, per continent and floor.
+
+With ``--seed MAX_ZOOM``, first retrieve every tile of the given continent and
+floor up to ``MAX_ZOOM`` into the cache (slow; this makes one request per
+tile not already cached), so the report reflects a fully seeded continent.
+
+Usage: ``python benchmarks/tile_dedup_report.py [-c CACHE_DIR]
+[--continent ID] [--floor FLOOR] [--seed MAX_ZOOM]``
+"""
+
+import os
+import sys
+import math
+import argparse
+
+import requests
+
+from gw2copilot.caching_api_client import CachingAPIClient
+
+
+def seed(client, continent, floor, max_zoom):
+    """retrieve every tile of ``continent``/``floor`` up to ``max_zoom``"""
+    info = requests.get(
+        'https://api.guildwars2.com/v2/continents/%d' % continent).json()
+    width, height = info['continent_dims']
+    top = info['max_zoom']
+    for zoom in range(info['min_zoom'], min(max_zoom, top) + 1):
+        # at max_zoom, one tile is 256 continent units square
+        span = 256 * (2 ** (top - zoom))
+        nx = int(math.ceil(width / float(span)))
+        ny = int(math.ceil(height / float(span)))
+        print('Seeding zoom %d (%d x %d tiles)' % (zoom, nx, ny))
+        for x in range(nx):
+            for y in range(ny):
+                client.tile(continent, floor, zoom, x, y)
+
+
+def fmt_bytes(num):
+    return '%.1f MiB' % (num / 1048576.0)
+
+
+def main():
+    p = argparse.ArgumentParser(description='tile store dedup report')
+    p.add_argument('-c', '--cache-dir', dest='cache_dir', type=str,
+                   default=os.path.expanduser('~/.gw2copilot/cache'))
+    p.add_argument('--continent', type=int, default=None)
+    p.add_argument('--floor', type=int, default=None)
+    p.add_argument('--seed', type=int, default=None, metavar='MAX_ZOOM',
+                   help='first seed the cache up to this zoom; requires '
+                        '--continent and --floor')
+    args = p.parse_args()
+    client = CachingAPIClient(args.cache_dir)
+    if args.seed is not None:
+        if args.continent is None or args.floor is None:
+            p.error('--seed requires --continent and --floor')
+        seed(client, args.continent, args.floor, args.seed)
+    s = client.tile_store.stats(continent=args.continent, floor=args.floor)
+    print('tiles cached:         %d' % s['tiles'])
+    print('tiles missing (403):  %d' % s['missing'])
+    print('distinct blobs:       %d' % s['blobs'])
+    print('dedup ratio:          %.2f tiles/blob' % s['dedup_ratio'])
+    print('size without dedup:   %s' % fmt_bytes(s['logical_bytes']))
+    print('size on disk:         %s' % fmt_bytes(s['stored_bytes']))
+    pct = 0.0
+    if s['logical_bytes'] > 0:
+        pct = 100.0 * s['saved_bytes'] / s['logical_bytes']
+    print('saved:                %s (%.1f%%)' % (
+        fmt_bytes(s['saved_bytes']), pct))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
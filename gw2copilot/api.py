@@ -39,13 +39,39 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import json
+import math
+import os
+from twisted.web import http
 from twisted.web._responses import OK
 
-from .utils import make_response, set_headers, log_request
+from .utils import (
+    make_response, set_headers, log_request, unavailable_response,
+    not_found_response
+)
 from .route_helpers import classroute, ClassRouteMixin
+from .caching_file import CachingFile
+from .coords import LEAFLET_MAX_ZOOM
 
 logger = logging.getLogger(__name__)
 
+#: Cache-Control header for map tiles. A tile's content is fully determined by
+#: its continent, floor, zoom and coordinates, so browsers may cache it
+#: forever.
+TILE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+#: Cache-Control header for provisional tiles built by
+#: :py:class:`~.TileSynthesizer`; these are replaced once the real tile has
+#: been retrieved
+PROVISIONAL_TILE_CACHE_CONTROL = 'public, max-age=30'
+
+#: Retry-After value (seconds) for routes requested before the map catalog
+#: has been loaded
+ROUTE_RETRY_AFTER = 5
+
+#: Retry-After value (seconds) for trails requested while the character's
+#: trail file is being read
+TRAIL_RETRY_AFTER = 1
+
 
 class GW2CopilotAPI(ClassRouteMixin):
     """
@@ -84,6 +110,29 @@ class GW2CopilotAPI(ClassRouteMixin):
         """
         return self.site._render_template(tmpl_name, **kwargs)
 
+    def _mumble_session(self, request):
+        """
+        Find the :py:class:`~.MumbleSession` named by the request's
+        ``session`` query parameter (the default session if there is none).
+        If there is no such session, set a 404 response on ``request``; if
+        no MumbleLink data has been received for it yet, set a 503 response.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :return: 2-tuple of (session, None), or (None, error response body)
+        :rtype: tuple
+        """
+        session = self.parent_server.sessions.for_request(request)
+        if session is None:
+            return None, not_found_response(request, 'Unknown session')
+        if session.raw_mumble_link_data is not None:
+            return session, None
+        return None, unavailable_response(
+            request,
+            int(math.ceil(self.parent_server.poll_interval)),
+            'No data received from MumbleLink yet'
+        )
+
     @classroute('player_info')
     def player_info(self, request):
         """
@@ -153,16 +202,23 @@ class GW2CopilotAPI(ClassRouteMixin):
         :>json map_name: *(string)* current map name
         :>json map_level_range: *(string)* current map level range
         :>json position: *(2-tuple of floats)* current position in inches
+        :query session: MumbleLink name of the game client (see
+          ``--mumble-name``); defaults to the first one
         :statuscode 200: successfully returned result
+        :statuscode 404: unknown session
+        :statuscode 503: no MumbleLink data has been received yet
         """
         log_request(request)
         set_headers(request)
+        session, error = self._mumble_session(request)
+        if error is not None:
+            return error
         statuscode = OK
         msg = make_response('OK')
         request.setResponseCode(statuscode, message=msg)
         request.setHeader("Content-Type", 'application/json')
         return make_response(
-            json.dumps(self.parent_server.playerinfo.as_dict)
+            json.dumps(session.playerinfo.as_dict)
         )
 
     @classroute('position')
@@ -202,16 +258,23 @@ class GW2CopilotAPI(ClassRouteMixin):
         :>json position: *(array)* array of player's current position,
           [x (float), y (float)]
         :>json map_id: *(int)* player's current map_id
+        :query session: MumbleLink name of the game client (see
+          ``--mumble-name``); defaults to the first one
         :statuscode 200: successfully returned result
+        :statuscode 404: unknown session
+        :statuscode 503: no MumbleLink data has been received yet
         """
         log_request(request)
         set_headers(request)
+        session, error = self._mumble_session(request)
+        if error is not None:
+            return error
         statuscode = OK
         msg = make_response('OK')
         request.setResponseCode(statuscode, message=msg)
         request.setHeader("Content-Type", 'application/json')
         return make_response(
-            json.dumps(self.parent_server.playerinfo.position)
+            json.dumps(session.playerinfo.position)
         )
 
     @classroute('player_dict')
@@ -257,18 +320,265 @@ class GW2CopilotAPI(ClassRouteMixin):
         :>json profession: *(string)* character's profession
         :>json race: *(string)* character's race
         :>json level: *(int)* character's level
+        :query session: MumbleLink name of the game client (see
+          ``--mumble-name``); defaults to the first one
         :statuscode 200: successfully returned result
+        :statuscode 404: unknown session
+        :statuscode 503: no MumbleLink data has been received yet
         """
         log_request(request)
         set_headers(request)
+        session, error = self._mumble_session(request)
+        if error is not None:
+            return error
         statuscode = OK
         msg = make_response('OK')
         request.setResponseCode(statuscode, message=msg)
         request.setHeader("Content-Type", 'application/json')
         return make_response(
-            json.dumps(self.parent_server.playerinfo.player_dict)
+            json.dumps(session.playerinfo.player_dict)
         )
 
+    @classroute('trail')
+    def trail(self, request):
+        """
+        Return the current character's position trail on a map, simplified
+        for a zoom level; see :py:meth:`~.CharacterTrail.query`.
+
+        This serves :http:get:`/api/trail` endpoint.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :return: JSON response data string
+        :rtype: str
+
+        <HTTPAPI>
+        Return where the current character has been on a map, in this and
+        previous sessions, as JSON. The trail is split into segments at gaps
+        and waypoint jumps, and simplified so that no dropped point is more
+        than about a pixel from the line at the requested zoom level.
+
+        Served by :py:meth:`.trail`.
+
+        **Example request**:
+
+        .. sourcecode:: http
+
+          GET /api/trail?map_id=15&zoom=5&since=1479660000 HTTP/1.1
+          Host: example.com
+
+        **Example Response**:
+
+        .. sourcecode:: http
+
+          HTTP/1.1 200 OK
+          Content-Type: application/json
+
+          {
+              "name": "Character Name",
+              "map_id": 15,
+              "zoom": 5,
+              "latest": 1479661234.5,
+              "segments": [[[44688.0, 29305.3], [44702.5, 29311.0]]]
+          }
+
+        :>json name: *(string)* character name
+        :>json map_id: *(int)* map ID of the trail
+        :>json zoom: *(int)* zoom level the trail was simplified for
+        :>json latest: *(float)* timestamp of the last point on the map, or
+          null; pass as ``since`` to get only newer points
+        :>json segments: *(array)* segments, each an array of [x, y]
+          continent coordinates
+        :query session: MumbleLink name of the game client (see
+          ``--mumble-name``); defaults to the first one
+        :query integer map_id: map ID; defaults to the current map
+        :query integer zoom: Leaflet zoom level, 0 to 7; defaults to 7
+        :query float since: only return points from this time (seconds since
+          the epoch) onwards
+        :statuscode 200: successfully returned result
+        :statuscode 404: unknown session, or trails are disabled
+        :statuscode 500: invalid parameters
+        :statuscode 503: no MumbleLink data has been received yet, or the
+          character's trail is still being read from disk; retry after the
+          number of seconds in the ``Retry-After`` header
+        """
+        log_request(request)
+        set_headers(request)
+        if self.parent_server.trails is None:
+            return not_found_response(request, 'Trail recording is disabled')
+        session, error = self._mumble_session(request)
+        if error is not None:
+            return error
+        try:
+            map_id = int(request.args.get(
+                'map_id', [session.playerinfo.position['map_id']])[0])
+            zoom = int(request.args.get('zoom', [LEAFLET_MAX_ZOOM])[0])
+            since = request.args.get('since', [None])[0]
+            if since is not None:
+                since = float(since)
+        except ValueError:
+            request.setResponseCode(500, message='INVALID PARAMETERS')
+            return ''
+        zoom = min(max(zoom, 0), LEAFLET_MAX_ZOOM)
+        name = session.character_name
+        trail = self.parent_server.trails.trail(name)
+        if trail is None:
+            return unavailable_response(
+                request, TRAIL_RETRY_AFTER, 'Trail is being loaded')
+        map_trail = trail.maps.get(map_id)
+        statuscode = OK
+        msg = make_response('OK')
+        request.setResponseCode(statuscode, message=msg)
+        request.setHeader("Content-Type", 'application/json')
+        return make_response(json.dumps({
+            'name': name,
+            'map_id': map_id,
+            'zoom': zoom,
+            'latest': None if map_trail is None else map_trail.latest,
+            'segments': trail.query(map_id, zoom, since=since)
+        }))
+
+    @classroute('route')
+    def route(self, request):
+        """
+        Return the fastest route between two places; see
+        :py:meth:`~.TravelGraph.route`.
+
+        This serves :http:get:`/api/route` endpoint.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :return: JSON response data string
+        :rtype: str
+
+        <HTTPAPI>
+        Return the fastest route, by walking, travel connections (asura
+        gates, zone portals, skritt tunnels and launch pads) and waypoints,
+        between two places as JSON. Either end may be a map ID or ``x,y``
+        continent coordinates; a route to a map ends as soon as it reaches
+        the map.
+
+        Served by :py:meth:`.route`.
+
+        **Example request**:
+
+        .. sourcecode:: http
+
+          GET /api/route?from=44688.0,29305.3&to=18 HTTP/1.1
+          Host: example.com
+
+        **Example Response**:
+
+        .. sourcecode:: http
+
+          HTTP/1.1 200 OK
+          Content-Type: application/json
+
+          {
+              "from": {"map_id": 15, "coord": [44688.0, 29305.3]},
+              "to": {"map_id": 18, "coord": null},
+              "seconds": 42.7,
+              "steps": [
+                  {
+                      "mode": "walk",
+                      "seconds": 27.7,
+                      "map_id": 15,
+                      "coord": [44816.0, 29440.0],
+                      "name": "Asura Gate to Divinity's Reach",
+                      "chat_link": null
+                  },
+                  {
+                      "mode": "gate",
+                      "seconds": 15.0,
+                      "map_id": 18,
+                      "coord": [38912.0, 32256.0],
+                      "name": "Asura Gate to Queensdale",
+                      "chat_link": null
+                  }
+              ]
+          }
+
+        :>json from: *(object)* ``map_id`` and ``coord`` of the start
+        :>json to: *(object)* ``map_id`` and ``coord`` (null for a map) of
+          the destination
+        :>json seconds: *(float)* estimated travel time, in seconds
+        :>json steps: *(array)* hops, each with its ``mode`` ("walk", "gate"
+          or "waypoint"), ``seconds``, and the ``map_id``, ``coord``,
+          ``name`` and ``chat_link`` of where it ends
+        :query from: map ID or ``x,y`` continent coordinates; defaults to the
+          current position
+        :query to: map ID or ``x,y`` continent coordinates
+        :query session: MumbleLink name of the game client (see
+          ``--mumble-name``) whose position is the default ``from``;
+          defaults to the first one
+        :statuscode 200: successfully returned result
+        :statuscode 404: unknown session or map, or no route
+        :statuscode 500: invalid parameters
+        :statuscode 503: the map catalog hasn't been loaded, or no
+          MumbleLink data has been received yet
+        """
+        log_request(request)
+        set_headers(request)
+        graph = self.parent_server.cache.travel_graph
+        if graph is None:
+            return unavailable_response(
+                request, ROUTE_RETRY_AFTER,
+                'Map catalog has not been loaded yet'
+            )
+        from_arg = request.args.get('from', [None])[0]
+        if from_arg is None:
+            session, error = self._mumble_session(request)
+            if error is not None:
+                return error
+            pos = session.playerinfo.position
+            start = (pos['map_id'], tuple(pos['position']))
+        try:
+            if from_arg is not None:
+                start = self._route_place(graph, from_arg)
+            end = self._route_place(graph, request.args['to'][0])
+        except (KeyError, ValueError):
+            request.setResponseCode(500, message='INVALID PARAMETERS')
+            return ''
+        if start[0] is None or end[0] is None:
+            return not_found_response(request, 'Unknown map')
+        if start[1] is None:
+            start = (start[0], graph.map_center(start[0]))
+        result = graph.route(start[0], start[1], end[0], end[1])
+        if result is None:
+            return not_found_response(request, 'No route found')
+        result['from'] = {'map_id': start[0], 'coord': list(start[1])}
+        result['to'] = {
+            'map_id': end[0],
+            'coord': None if end[1] is None else list(end[1])
+        }
+        statuscode = OK
+        msg = make_response('OK')
+        request.setResponseCode(statuscode, message=msg)
+        request.setHeader("Content-Type", 'application/json')
+        return make_response(json.dumps(result))
+
+    def _route_place(self, graph, value):
+        """
+        Parse a ``from`` or ``to`` parameter of :py:meth:`~.route`.
+
+        :param graph: the travel graph
+        :type graph: :py:class:`~.TravelGraph`
+        :param value: map ID or ``x,y`` continent coordinates
+        :type value: str
+        :return: 2-tuple of map ID (None if the map isn't in the graph) and
+          (x, y) coordinates (None for a map ID)
+        :rtype: tuple
+        :raises: ValueError if ``value`` can't be parsed
+        """
+        if ',' not in value:
+            map_id = int(value)
+            if map_id not in graph.map_rects:
+                map_id = None
+            return map_id, None
+        x, y = value.split(',')
+        pos = (float(x), float(y))
+        return graph.map_at(*pos), pos
+
     @classroute('map_floors')
     def map_floors(self, request):
         """
@@ -332,12 +642,29 @@ class GW2CopilotAPI(ClassRouteMixin):
         tile is not already in the cache, it will be requested from the  GW2
         Tiles API.
 
+        Cached tiles are streamed from disk by a :py:class:`~.CachingFile`
+        resource, rather than being read into memory; only cache misses are
+        buffered.
+
+        On a cache miss, if a provisional tile can be synthesized from cached
+        tiles at neighboring zoom levels (see :py:class:`~.TileSynthesizer`),
+        it is returned immediately with a short cache lifetime and an
+        ``X-Tile-Provisional`` header; the real tile is retrieved in the
+        background and a ``tile_ready`` websocket message is sent when it's
+        available.
+
+        If tile transcoding is enabled (``--webp-tiles``) and the client's
+        ``Accept`` header includes ``image/webp``, a WebP variant of the tile
+        is served instead, transcoded by
+        :py:attr:`~.TwistedServer.tile_transcoder` on first use.
+
         This serves :http:get:`/api/tiles` endpoint.
 
         :param request: incoming HTTP request
         :type request: :py:class:`twisted.web.server.Request`
-        :return: JSON response data string
-        :rtype: str
+        :return: file resource for cached tiles (possibly via a Deferred),
+          tile content for misses
+        :rtype: :py:class:`~.CachingFile`, Deferred or str
 
         <HTTPAPI>
         Return the specified GW2 map tile, from cache on disk.
@@ -356,7 +683,11 @@ class GW2CopilotAPI(ClassRouteMixin):
         .. sourcecode:: http
 
           HTTP/1.1 200 OK
-          Content-Type: image/png
+          Content-Type: image/jpeg
+          Vary: Accept
+          Cache-Control: public, max-age=31536000, immutable
+          ETag: "5e8f0b7c2a6f1d3e9b4a8c7d6e5f4a3b2c1d0e9f"
+          Last-Modified: Sun, 20 Nov 2016 16:38:20 GMT
 
           <binary data>
 
@@ -365,25 +696,63 @@ class GW2CopilotAPI(ClassRouteMixin):
         :query integer zoom: zoom level
         :query integer x: x coordinate
         :query integer y: y coordinate
+        :query string tier: optional WebP quality tier name (see
+          ``--webp-tier``); defaults to the highest-quality tier
+        :reqheader Accept: include ``image/webp`` to receive WebP tiles, if
+          enabled
+        :reqheader If-None-Match: ETag of a previously-retrieved copy
+        :reqheader If-Modified-Since: Last-Modified of a previously-retrieved
+          copy
         :statuscode 200: successfully returned result
+        :statuscode 304: tile has not changed
         :statuscode 500: invalid parameters
         :statuscode 403: tile not available
         """
         log_request(request)
         set_headers(request)
         required = ['continent', 'floor', 'x', 'y', 'zoom']
-        if sorted(request.args.keys()) != required:
+        if not set(required).issubset(request.args.keys()):
             request.setResponseCode(500, message='MISSING PARAMETERS')
             return ''
-        data = self.parent_server.cache.tile(
-            int(request.args['continent'][0]),
-            int(request.args['floor'][0]),
-            int(request.args['zoom'][0]),
-            int(request.args['x'][0]),
-            int(request.args['y'][0])
-        )
-        if data is None:
-            request.setResponseCode(403, message='CACHE ERROR')
+        args = [
+            int(request.args[k][0])
+            for k in ['continent', 'floor', 'zoom', 'x', 'y']
+        ]
+        # prefetch tiles for the zoom level the browser is showing
+        self.parent_server.prefetcher.note_tile(*args[:3])
+        transcoder = self.parent_server.tile_transcoder
+        tier = None
+        if transcoder is not None:
+            # the response depends on Accept, whichever format we pick
+            request.setHeader('Vary', 'Accept')
+            if self._accepts_webp(request):
+                tier = request.args.get('tier', [None])[0]
+                if tier not in transcoder.tiers:
+                    tier = transcoder.default_tier
+        cache = self.parent_server.cache
+        path = cache.tile_path(*args)
+        cached = path is not None
+        data = None
+        if not cached and not cache.tile_known_missing(*args):
+            synth = self.parent_server.tile_synthesizer
+            d = None if synth is None else synth.synthesize(*args)
+            if d is not None:
+                d.addCallback(self._provisional_tile, request, args)
+                return d
+        if not cached:
+            data = cache.tile(*args)
+            if data is None:
+                request.setResponseCode(403, message='CACHE ERROR')
+                return ''
+            path = cache.tile_path(*args)
+        if tier is not None:
+            d = transcoder.transcode(path, tier)
+            d.addCallback(self._tile_resource, path)
+            return d
+        if cached:
+            # stream it from disk. This also handles conditional GET.
+            return self._tile_resource(None, path)
+        if self._tile_validators(request, path) is http.CACHED:
             return ''
         statuscode = OK
         msg = make_response('OK')
@@ -391,6 +760,109 @@ class GW2CopilotAPI(ClassRouteMixin):
         request.setHeader("Content-Type", 'image/jpeg')
         return data
 
+    def _provisional_tile(self, data, request, args):
+        """
+        Callback for :py:meth:`~.TileSynthesizer.synthesize`; return the
+        provisional tile and start retrieving the real one in the background.
+        If synthesis failed, retrieve the real tile now.
+
+        :param data: synthesized JPEG content, or None
+        :type data: str
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :param args: [continent, floor, zoom, x, y]
+        :type args: list
+        :return: tile content
+        :rtype: str
+        """
+        if data is None:
+            data = self.parent_server.cache.tile(*args)
+            if data is None:
+                request.setResponseCode(403, message='CACHE ERROR')
+                return ''
+        else:
+            self.parent_server.fetch_tile_in_background(*args)
+            request.setHeader('Cache-Control', PROVISIONAL_TILE_CACHE_CONTROL)
+            request.setHeader('X-Tile-Provisional', '1')
+        request.setResponseCode(OK, message=make_response('OK'))
+        request.setHeader("Content-Type", 'image/jpeg')
+        return data
+
+    def _tile_resource(self, webp_path, path):
+        """
+        Return a :py:class:`~.CachingFile` to stream a cached tile from disk.
+
+        :param webp_path: path to the WebP variant of the tile, or None to
+          serve the original JPEG
+        :type webp_path: str
+        :param path: path to the cached JPEG tile
+        :type path: str
+        :rtype: :py:class:`~.CachingFile`
+        """
+        if webp_path is not None:
+            return CachingFile(webp_path, defaultType='image/webp',
+                               cache_control=TILE_CACHE_CONTROL,
+                               etag=self._tile_etag(webp_path))
+        return CachingFile(path, defaultType='image/jpeg',
+                           cache_control=TILE_CACHE_CONTROL,
+                           etag=self._tile_etag(path))
+
+    def _tile_etag(self, path):
+        """
+        Return the ETag for a tile file in the :py:class:`~.TileStore`. Tiles
+        are named for the SHA1 of their content (WebP variants also include
+        their quality), so the name is a strong validator.
+
+        :param path: path to the tile or tile variant
+        :type path: str
+        :return: quoted ETag
+        :rtype: str
+        """
+        return '"%s"' % os.path.basename(path).rsplit('.', 1)[0]
+
+    def _accepts_webp(self, request):
+        """
+        Return whether the request's ``Accept`` header includes
+        ``image/webp`` with a non-zero quality.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :rtype: bool
+        """
+        accept = request.getHeader('accept')
+        if accept is None:
+            return False
+        for item in accept.split(','):
+            params = [p.replace(' ', '') for p in item.split(';')]
+            if params[0].lower() != 'image/webp':
+                continue
+            for param in params[1:]:
+                if param.startswith('q='):
+                    try:
+                        return float(param[2:]) > 0
+                    except ValueError:
+                        return False
+            return True
+        return False
+
+    def _tile_validators(self, request, path):
+        """
+        Set the caching headers (``ETag``, ``Last-Modified`` and
+        ``Cache-Control``) for the cached tile at ``path``, and check them
+        against the request's conditional headers.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :param path: path to the tile in the :py:class:`~.TileStore`
+        :type path: str
+        :return: :py:data:`twisted.web.http.CACHED` if the client's copy is
+          current (the response code has been set to 304), otherwise None
+        """
+        request.setHeader('Cache-Control', TILE_CACHE_CONTROL)
+        if request.setETag(self._tile_etag(path)) is http.CACHED:
+            return http.CACHED
+        return request.setLastModified(os.path.getmtime(path))
+
     @classroute('zone_reminders', methods=['GET'])
     def get_zone_reminders(self, request):
         """
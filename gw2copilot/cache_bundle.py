@@ -0,0 +1,323 @@
+"""
+gw2copilot/cache_bundle.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import os
+import io
+import json
+import time
+import hashlib
+import tarfile
+import posixpath
+
+from .version import VERSION
+from .utils import replace_file
+
+logger = logging.getLogger(__name__)
+
+#: version of the bundle layout/manifest format; bump on incompatible change
+SCHEMA_VERSION = 1
+
+#: name of the manifest member; always the first member of a bundle
+MANIFEST_NAME = 'manifest.json'
+
+#: cache types (top-level cache directories) included in every bundle;
+#: ``user_settings`` is deliberately excluded, as it's per-user
+BUNDLE_CACHE_TYPES = ['api', 'assets', 'gw2timer', 'map_floors', 'mapdata']
+
+#: cache type for map tiles; only included on request, as it's large
+TILES_CACHE_TYPE = 'tiles'
+
+#: read/write chunk size when streaming file content
+CHUNK_SIZE = 65536
+
+
+class _HashingReader(object):
+    """
+    File-like wrapper that computes the SHA256 and size of everything read
+    through it.
+    """
+
+    def __init__(self, fh):
+        self._fh = fh
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fh.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+def _bundle_files(cache_dir, include_tiles=False):
+    """
+    Return a sorted list of (archive name, absolute path) 2-tuples for all
+    cache files that should go into a bundle.
+
+    :param cache_dir: cache directory path
+    :type cache_dir: str
+    :param include_tiles: whether or not to include map tiles
+    :type include_tiles: bool
+    :rtype: list
+    """
+    types = list(BUNDLE_CACHE_TYPES)
+    if include_tiles:
+        types.append(TILES_CACHE_TYPE)
+    files = []
+    for cache_type in types:
+        top = os.path.join(cache_dir, cache_type)
+        for dirpath, _, filenames in os.walk(top):
+            for fname in filenames:
+                if fname.endswith('.tmp'):
+                    # in-progress atomic write
+                    continue
+                path = os.path.join(dirpath, fname)
+                rel = os.path.relpath(path, cache_dir)
+                files.append((rel.replace(os.sep, '/'), path))
+    return sorted(files)
+
+
+def _file_sha256(path):
+    """
+    Return the hex SHA256 digest of the file at ``path``.
+
+    :param path: file path
+    :type path: str
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def export_cache_bundle(cache_dir, out_path, build_id=None,
+                        include_tiles=False):
+    """
+    Write the contents of ``cache_dir`` to a gzipped tar bundle at
+    ``out_path``, for seeding the cache on another machine with
+    :py:func:`~.import_cache_bundle`.
+
+    The first member of the bundle is a JSON manifest recording
+    :py:data:`~.SCHEMA_VERSION`, the gw2copilot version, the game build and
+    the size, SHA256 and mtime of every file. The archive is written as a
+    stream, so memory use doesn't depend on the cache size.
+
+    :param cache_dir: cache directory path
+    :type cache_dir: str
+    :param out_path: path to write the bundle to
+    :type out_path: str
+    :param build_id: game build ID the cache was generated against, if known
+    :type build_id: int
+    :param include_tiles: whether or not to include map tiles
+    :type include_tiles: bool
+    :return: the bundle manifest
+    :rtype: dict
+    :raises: ValueError if a file changes while the bundle is being written
+    """
+    files = _bundle_files(cache_dir, include_tiles=include_tiles)
+    manifest = {
+        'schema_version': SCHEMA_VERSION,
+        'gw2copilot_version': VERSION,
+        'build_id': build_id,
+        'created': time.time(),
+        'include_tiles': include_tiles,
+        'files': {}
+    }
+    logger.info('Hashing %d cache files', len(files))
+    for name, path in files:
+        st = os.stat(path)
+        manifest['files'][name] = {
+            'size': st.st_size,
+            'mtime': int(st.st_mtime),
+            'sha256': _file_sha256(path)
+        }
+    manifest_bytes = json.dumps(manifest, sort_keys=True).encode('utf-8')
+    logger.info('Writing cache bundle to %s', out_path)
+    with tarfile.open(out_path, 'w|gz') as tar:
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size = len(manifest_bytes)
+        info.mtime = int(manifest['created'])
+        tar.addfile(info, io.BytesIO(manifest_bytes))
+        for name, path in files:
+            meta = manifest['files'][name]
+            info = tarfile.TarInfo(name)
+            info.size = meta['size']
+            info.mtime = meta['mtime']
+            with open(path, 'rb') as fh:
+                reader = _HashingReader(fh)
+                tar.addfile(info, reader)
+            if reader.sha256.hexdigest() != meta['sha256']:
+                raise ValueError('Cache file %s changed while writing bundle; '
+                                 'stop gw2copilot and try again' % path)
+    logger.info('Wrote %d files to cache bundle %s', len(files), out_path)
+    return manifest
+
+
+def _validate_member_name(name):
+    """
+    Ensure that a bundle member name is a relative path inside one of the
+    bundled cache types.
+
+    :param name: archive member name
+    :type name: str
+    :raises: ValueError if the name is not acceptable
+    """
+    norm = posixpath.normpath(name)
+    parts = norm.split('/')
+    if (
+        norm != name or posixpath.isabs(name) or '..' in parts or
+        '\\' in name or ':' in name or len(parts) < 2 or
+        parts[0] not in BUNDLE_CACHE_TYPES + [TILES_CACHE_TYPE]
+    ):
+        raise ValueError('Invalid path in cache bundle: %r' % name)
+
+
+def _read_manifest(tar):
+    """
+    Read and validate the manifest, which must be the first bundle member.
+
+    :param tar: tar file opened for streaming read
+    :type tar: tarfile.TarFile
+    :return: manifest
+    :rtype: dict
+    """
+    member = tar.next()
+    if member is None or member.name != MANIFEST_NAME or not member.isfile():
+        raise ValueError('Not a gw2copilot cache bundle (first member is not '
+                         '%s)' % MANIFEST_NAME)
+    manifest = json.loads(tar.extractfile(member).read().decode('utf-8'))
+    if manifest.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError('Unsupported cache bundle schema version %s '
+                         '(expected %s)' % (manifest.get('schema_version'),
+                                            SCHEMA_VERSION))
+    for name in manifest['files']:
+        _validate_member_name(name)
+    return manifest
+
+
+def import_cache_bundle(bundle_path, cache_dir):
+    """
+    Validate a bundle written by :py:func:`~.export_cache_bundle` and unpack
+    it into ``cache_dir``.
+
+    The bundle is read as a stream; each file is written to a temporary file
+    while its size and SHA256 are checked against the manifest. Only once
+    every file in the manifest has been received and verified are the
+    temporary files renamed into place, so an invalid or truncated bundle
+    leaves the existing cache untouched.
+
+    :param bundle_path: path to the bundle file
+    :type bundle_path: str
+    :param cache_dir: cache directory path
+    :type cache_dir: str
+    :return: the bundle manifest
+    :rtype: dict
+    :raises: ValueError if the bundle is invalid
+    """
+    staged = []
+    try:
+        with tarfile.open(bundle_path, 'r|gz') as tar:
+            manifest = _read_manifest(tar)
+            logger.info('Importing cache bundle from gw2copilot %s, game '
+                        'build %s, with %d files',
+                        manifest.get('gw2copilot_version'),
+                        manifest.get('build_id'), len(manifest['files']))
+            seen = set()
+            # iterating the TarFile would start over with the manifest
+            member = tar.next()
+            while member is not None:
+                name = member.name
+                _validate_member_name(name)
+                if not member.isfile():
+                    raise ValueError('Cache bundle member %s is not a regular '
+                                     'file' % name)
+                if name not in manifest['files'] or name in seen:
+                    raise ValueError('Cache bundle member %s is not in the '
+                                     'manifest, or is duplicated' % name)
+                seen.add(name)
+                meta = manifest['files'][name]
+                dest = os.path.join(cache_dir, *name.split('/'))
+                tmp_path = '%s.%d.bundle.tmp' % (dest, os.getpid())
+                _makedirs(os.path.dirname(dest))
+                staged.append((tmp_path, dest, meta['mtime']))
+                reader = _HashingReader(tar.extractfile(member))
+                with open(tmp_path, 'wb') as fh:
+                    for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                        fh.write(chunk)
+                if (
+                    reader.size != meta['size'] or
+                    reader.sha256.hexdigest() != meta['sha256']
+                ):
+                    raise ValueError('Checksum mismatch for %s in cache '
+                                     'bundle' % name)
+                member = tar.next()
+            missing = set(manifest['files'].keys()) - seen
+            if len(missing) > 0:
+                raise ValueError('Cache bundle is missing %d files listed in '
+                                 'its manifest' % len(missing))
+    except Exception:
+        for tmp_path, _, _ in staged:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        raise
+    for tmp_path, dest, mtime in staged:
+        os.utime(tmp_path, (mtime, mtime))
+        replace_file(tmp_path, dest)
+    logger.info('Imported %d files from cache bundle %s into %s',
+                len(staged), bundle_path, cache_dir)
+    return manifest
+
+
+def _makedirs(path):
+    """
+    Create ``path`` and any missing parents, if it doesn't already exist.
+
+    :param path: directory path
+    :type path: str
+    """
+    if os.path.isdir(path):
+        return
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
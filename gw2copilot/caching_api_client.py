@@ -37,8 +37,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
-import sys
-import cStringIO
 import logging
 import requests
 import os
@@ -46,13 +44,15 @@ import json
 import urllib
 import time
 from base64 import b64encode
-from PIL import Image
 from StringIO import StringIO
 
-from .utils import dict2js, file_age, extract_js_var
+from .utils import dict2js, file_age, extract_js_var, write_atomic
 from .static_data import world_zones
 from .version import VERSION
-from .jsobj import read_js_object
+from .jsobj import parse_js_object
+from .tile_store import TileStore
+from .coords import MapTransform, build_transforms
+from .travel_graph import TravelGraph
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +62,10 @@ TTL_1DAY = 86400
 #: Cache TTL - 1 hour, in seconds
 TTL_1HOUR = 3600
 
+#: URL format for gw2timer.com data files; interpolate the file name
+GW2TIMER_URL = 'https://raw.githubusercontent.com/Drant/GW2Timer/gh-pages/' \
+               'data/%s.js'
+
 
 class CachingAPIClient(object):
     """
@@ -82,8 +86,12 @@ class CachingAPIClient(object):
         self._api_key = api_key
         self._characters = {}  # these don't get cached to disk
         self._all_maps = None  # cache in memory as well
+        self._transforms = {}  # map ID to MapTransform; see map_transform
         self._zone_reminders = None  # cache in memory as well
         self._map_floors = {}  # cached in memory as well
+        self._travel_paths = None  # cached in memory as well
+        self._travel_graph = None  # see travel_graph
+        self._tile_store = None  # see tile_store
         if not os.path.exists(cache_dir):
             logger.debug('Creating cache directory at: %s', cache_dir)
             os.makedirs(cache_dir, 0700)
@@ -92,12 +100,24 @@ class CachingAPIClient(object):
     def fill_persistent_cache(self):
         """
         Ensure we have cached data for things we *know* we will need...
+
+        This blocks until everything is cached. The server does not call this;
+        it runs the same steps in the background via :py:class:`~.CacheWarmer`.
         """
-        # ensure we have all map data cached
-        _ = self.all_maps
+        self.fill_map_catalog()
+        self.get_gw2_api_files()
+
+    def fill_map_catalog(self, progress=None):
+        """
+        Ensure that data for all maps is cached (see :py:attr:`~.all_maps`)
+        and that ``mapdata/mapdata.js`` has been generated.
+
+        :param progress: optional ``progress(done, total)`` callable, called
+          as each map is loaded
+        :type progress: callable
+        """
+        self._load_all_maps(progress=progress)
         self._make_map_data_js()
-        self._get_gw2_api_files()
-        self._get_gw2timer_data()
 
     @property
     def cache_dir(self):
@@ -174,7 +194,9 @@ class CachingAPIClient(object):
     def _cache_set(self, cache_type, cache_key, data, binary=False, raw=False,
                    extension='json'):
         """
-        Cache the given data.
+        Cache the given data. The cache file is replaced atomically, so
+        concurrent readers (i.e. the ``/cache/`` HTTP endpoint) never see a
+        partially-written file.
 
         :param cache_type: the cache type name (directory)
         :type cache_type: str
@@ -195,18 +217,19 @@ class CachingAPIClient(object):
         cd = os.path.join(self._cache_dir, cache_type)
         if not os.path.exists(cd):
             logger.debug('Creating cache directory: %s', cd)
-            os.mkdir(cd, 0700)
+            try:
+                os.mkdir(cd, 0700)
+            except OSError:
+                # another thread may have just created it
+                if not os.path.isdir(cd):
+                    raise
         if binary:
-            with open(p, 'wb') as fh:
-                fh.write(data)
+            write_atomic(p, data, binary=True)
             return
         if raw:
-            with open(p, 'w') as fh:
-                fh.write(data)
+            write_atomic(p, data)
             return
-        raw = json.dumps(data)
-        with open(p, 'w') as fh:
-            fh.write(raw)
+        write_atomic(p, json.dumps(data))
 
     def _get(self, path, auth=False):
         """
@@ -244,6 +267,21 @@ class CachingAPIClient(object):
         if self._all_maps is not None:
             logger.debug('Already have all maps in cache')
             return self._all_maps
+        return self._load_all_maps()
+
+    def _load_all_maps(self, progress=None):
+        """
+        Load (from cache or the API) and return the data for all maps; the
+        implementation of :py:attr:`~.all_maps`.
+
+        :param progress: optional ``progress(done, total)`` callable, called
+          as each map is loaded
+        :type progress: callable
+        :return: dict of all map data, keys are map ID and values are map data
+        :rtype: dict
+        """
+        if self._all_maps is not None:
+            return self._all_maps
         ids = self._cache_get('mapdata', 'ids', ttl=TTL_1DAY)
         if ids is None:
             r = self._get('/v2/maps')
@@ -252,10 +290,14 @@ class CachingAPIClient(object):
         logger.debug('Got list of all %d map IDs', len(ids))
         maps = {}
         logger.info("Starting to fill map data cache...")
-        for _id in ids:
+        for idx, _id in enumerate(ids):
             maps[_id] = self.map_data(_id)
+            if progress is not None:
+                progress(idx + 1, len(ids))
         logger.info('Cached all map data')
         self._all_maps = maps
+        self._transforms = build_transforms(maps)
+        self._travel_graph = self._build_travel_graph()
         self._cache_set('mapdata', 'all_maps', maps)
         return self._all_maps
 
@@ -276,7 +318,7 @@ class CachingAPIClient(object):
         s += dict2js('WORLD_ZONES_NAMEtoID', zones_name_to_id)
         self._cache_set('mapdata', 'mapdata', s, extension='js', raw=True)
 
-    def map_data(self, map_id):
+    def map_data(self, map_id, fetch=True):
         """
         Return dict of map data for the given map ID. This combines the data
         container in the GW2 API's ``/v1/maps.json?map_id=ID`` endpoint with
@@ -284,7 +326,11 @@ class CachingAPIClient(object):
 
         :param map_id: requested map ID
         :type map_id: int
-        :return: map data
+        :param fetch: if False, only return data that is already cached, so
+          that this never blocks on the network
+        :type fetch: bool
+        :return: map data, or None if ``fetch`` is False and the map isn't
+          cached
         :rtype: dict
         """
         if self._all_maps is not None and map_id in self._all_maps:
@@ -292,6 +338,8 @@ class CachingAPIClient(object):
         cached = self._cache_get('mapdata', map_id)
         if cached is not None:
             return cached
+        if not fetch:
+            return None
         r = self._get('/v1/maps.json?map_id=%d' % map_id)
         logger.debug('Got map data (HTTP status %d) response length %d',
                      r.status_code, len(r.text))
@@ -318,6 +366,30 @@ class CachingAPIClient(object):
         self._cache_set('mapdata', map_id, result)
         return result
 
+    def map_transform(self, map_id, fetch=True):
+        """
+        Return the :py:class:`~.MapTransform` for converting between the
+        given map's coordinates and continent coordinates. These are built
+        for every map when the map catalog is loaded; for any other map, it
+        is built from :py:meth:`~.map_data` on first use.
+
+        :param map_id: map ID
+        :type map_id: int
+        :param fetch: passed to :py:meth:`~.map_data`
+        :type fetch: bool
+        :return: the transform, or None if ``fetch`` is False and the map
+          isn't cached
+        :rtype: :py:class:`~.MapTransform`
+        """
+        t = self._transforms.get(map_id)
+        if t is None:
+            mapdata = self.map_data(map_id, fetch=fetch)
+            if mapdata is None:
+                return None
+            t = MapTransform.from_map_data(mapdata, map_id)
+            self._transforms[map_id] = t
+        return t
+
     def _add_chat_link_to_poi_dict(self, poi):
         """
         Given a POI dictionary such as the one returned by the floor_info API
@@ -370,9 +442,33 @@ class CachingAPIClient(object):
             return None
         result = r.json()
         self._cache_set('map_floors', key, result)
-        self._map_floors[key] = cached
+        self._map_floors[key] = result
         return result
 
+    def build_id(self, ttl=TTL_1HOUR):
+        """
+        Return the current game build ID from the ``/v2/build`` API endpoint.
+        If the API can't be reached, fall back to the last cached value, even
+        if expired.
+
+        :param ttl: cache TTL in seconds
+        :type ttl: int
+        :return: build ID, or None if unknown
+        :rtype: int
+        """
+        cached = self._cache_get('api', 'build', ttl=ttl)
+        if cached is None:
+            try:
+                r = self._get('/v2/build')
+                cached = r.json()
+                self._cache_set('api', 'build', cached)
+            except Exception:
+                logger.exception('Unable to retrieve game build from API')
+                cached = self._cache_get('api', 'build')
+        if cached is None:
+            return None
+        return cached.get('id', None)
+
     def character_info(self, name):
         """
         Return character information for the named character. This is NOT cached
@@ -393,6 +489,59 @@ class CachingAPIClient(object):
         self._characters[name] = j
         return j
 
+    @property
+    def tile_store(self):
+        """
+        Return the content-addressed store for map tiles, loading its index
+        on first use.
+
+        :rtype: :py:class:`~.TileStore`
+        """
+        if self._tile_store is None:
+            self._tile_store = TileStore(
+                os.path.join(self._cache_dir, 'tiles'))
+        return self._tile_store
+
+    def tile_path(self, continent, floor, zoom, x, y):
+        """
+        Return the path on disk of the cached content of a tile, or None if
+        the tile isn't cached (or doesn't exist upstream). Identical tiles
+        share one file, named for the SHA1 of its content.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        :param x: x coordinate
+        :type x: int
+        :param y: y coordinate
+        :type y: int
+        :return: absolute path to the tile content, or None
+        :rtype: str
+        """
+        return self.tile_store.path((continent, floor, zoom, x, y))
+
+    def tile_known_missing(self, continent, floor, zoom, x, y):
+        """
+        Return whether the tile service has returned a 403 (no such tile) for
+        a tile.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        :param x: x coordinate
+        :type x: int
+        :param y: y coordinate
+        :type y: int
+        :rtype: bool
+        """
+        return self.tile_store.lookup((continent, floor, zoom, x, y)) == ''
+
     def tile(self, continent, floor, zoom, x, y):
         """
         Get a tile from local cache, or if not cached, from the GW2 Tile Service
@@ -409,14 +558,14 @@ class CachingAPIClient(object):
         :type y: int
         :return: binary tile JPG content
         """
-        cache_key = '%d_%d_%d_%d_%d' % (continent, floor, zoom, x, y)
-        cached = self._cache_get('tiles', cache_key, binary=True,
-                                 extension='jpg')
-        if cached:
-            if cached == '':
-                logger.debug('Returning cached 403 for tile')
-                return None
-            return cached
+        key = (continent, floor, zoom, x, y)
+        hexdigest = self.tile_store.lookup(key)
+        if hexdigest == '':
+            logger.debug('Returning cached 403 for tile')
+            return None
+        if hexdigest is not None:
+            with open(self.tile_store.blob_path(hexdigest), 'rb') as fh:
+                return fh.read()
         url = 'https://tiles.guildwars2.com/{continent_id}/{floor}/' \
               '{zoom}/{x}/{y}.jpg'.format(continent_id=continent, floor=floor,
                                           zoom=zoom, x=x, y=y)
@@ -429,18 +578,20 @@ class CachingAPIClient(object):
             return None
         if r.status_code == 403:
             logger.debug('403 - Tile does not exist')
-            self._cache_set('tiles', cache_key, r.content, binary=True,
-                            extension='jpg')
+            self.tile_store.mark_missing(key)
             return None
-        self._cache_set('tiles', cache_key, r.content, binary=True,
-                        extension='jpg')
+        self.tile_store.put(key, r.content)
         return r.content
 
-    def _get_gw2_api_files(self):
+    def get_gw2_api_files(self, progress=None):
         """
         Get assets that we need from the GW2
         `files API <https://wiki.guildwars2.com/wiki/API:1/files>`_ and add them
         to cache; this is mainly map icons.
+
+        :param progress: optional ``progress(done, total)`` callable, called
+          as each asset is checked
+        :type progress: callable
         """
         files_to_get = [
             'map_adventure',
@@ -471,7 +622,9 @@ class CachingAPIClient(object):
             r = self._get('/v1/files.json?ids=all', auth=True)
             files = r.json()
             self._cache_set('api', 'files', files)
-        for name in files_to_get:
+        for idx, name in enumerate(files_to_get):
+            if progress is not None:
+                progress(idx, len(files_to_get))
             if os.path.exists(self._cache_path('assets', name, 'png')):
                 logger.debug('Already have asset: %s', name)
                 continue
@@ -493,6 +646,8 @@ class CachingAPIClient(object):
             self._cache_set('assets', name, r.content, binary=True,
                             extension='png')
             self._resize_asset(name, r.content)
+        if progress is not None:
+            progress(len(files_to_get), len(files_to_get))
         logger.debug('Done getting assets')
 
     def _resize_asset(self, name, bin_content):
@@ -505,6 +660,8 @@ class CachingAPIClient(object):
         :param bin_content: image binary content
         :type bin_content: str
         """
+        # PIL is only needed when assets are first cached; import it lazily
+        from PIL import Image
         name += '_32x32'
         img = Image.open(StringIO(bin_content))
         img.thumbnail((32, 32))
@@ -542,87 +699,219 @@ class CachingAPIClient(object):
         self._zone_reminders = reminders
         self._cache_set('user_settings', 'zone_reminders', reminders)
 
-    def _get_gw2timer_data(self):
+    def refresh_gw2timer_data(self, ttl=TTL_1DAY):
         """
-        Retrive gw2timer.com data files from GitHub; cache locally.
+        Retrieve gw2timer.com data files from GitHub if our cached copies are
+        older than ``ttl``, and regenerate ``travel.js`` if ``general.js``
+        changed. Cache files are swapped in atomically.
+
+        This performs blocking network requests; it is intended to be run
+        periodically in a thread (see
+        :py:meth:`~.TwistedServer._refresh_gw2timer_data`), not on the
+        reactor.
+
+        :param ttl: re-download files whose cached copy is at least this many
+          seconds old
+        :type ttl: int
+        :return: list of cache keys (in the ``gw2timer`` cache type) whose
+          content changed
+        :rtype: list
         """
-        logger.debug('Getting gw2timer.com data files')
-        ###############
-        # resource.js #
-        ###############
-        url = 'https://raw.githubusercontent.com/Drant/GW2Timer/gh-pages/' \
-              'data/resource.js'
-        cached = self._cache_get('gw2timer', 'resource', extension='js',
-                                 ttl=TTL_1DAY, raw=True)
-        if cached is None:
-            r = requests.get(url)
-            if r.status_code != 200:
-                logger.error("Error: GET %s returned status code %s", url,
-                             r.status_code)
-                return
-            content = "// generated by gw2copilot %s at %s\n" % (VERSION, time.time())
-            content += "// retrieved from %s\n" % url
-            content += r.content
-            self._cache_set('gw2timer', 'resource', content, extension='js',
-                            raw=True)
-        ##############
-        # general.js #
-        ##############
-        url = 'https://raw.githubusercontent.com/Drant/GW2Timer/gh-pages/' \
-              'data/general.js'
-        cached = self._cache_get('gw2timer', 'general', extension='js',
-                                 ttl=TTL_1DAY, raw=True)
-        if cached is None:
+        logger.debug('Refreshing gw2timer.com data files (ttl=%s)', ttl)
+        changed = []
+        _, res_changed = self._refresh_gw2timer_file('resource', ttl)
+        if res_changed:
+            changed.append('resource')
+        general, gen_changed = self._refresh_gw2timer_file('general', ttl)
+        if gen_changed:
+            changed.append('general')
+        if general is None:
+            return changed
+        have_travel = os.path.exists(
+            self._cache_path('gw2timer', 'travel', 'js')
+        ) and os.path.exists(self._cache_path('gw2timer', 'travel', 'json'))
+        if not gen_changed and have_travel:
+            return changed
+        content = self._gw2timer_header(GW2TIMER_URL % 'general')
+        try:
+            logger.debug('Generating gw2timer travel data')
+            paths = self._gw2timer_travel_connections(general)
+        except Exception:
+            logger.exception('Unable to build gw2timer travel connections '
+                             'JS source')
+            return changed
+        content += dict2js('GW2T_TRAVEL_PATHS', paths)
+        self._cache_set('gw2timer', 'travel', paths)
+        self._cache_set('gw2timer', 'travel', content, extension='js',
+                        raw=True)
+        self._travel_paths = paths
+        self._travel_graph = self._build_travel_graph()
+        changed.append('travel')
+        return changed
+
+    @property
+    def travel_paths(self):
+        """
+        Return the travel connections between maps derived from gw2timer.com
+        data (cached as ``gw2timer/travel.json``, with ``travel.js`` holding
+        the same data for the browser): a dict of connection type
+        (``interborders``, ``interzones``, ``intrazones`` and ``launchpads``)
+        to a list of dicts with ``end_a`` and ``end_b`` keys, each end having
+        ``coord``, ``map_id``, ``map_name``, ``title`` and ``icon``.
+
+        :return: travel connections, or None if not yet retrieved
+        :rtype: dict
+        """
+        if self._travel_paths is None:
+            self._travel_paths = self._cache_get('gw2timer', 'travel')
+        return self._travel_paths
+
+    @property
+    def travel_graph(self):
+        """
+        Return the :py:class:`~.TravelGraph` of the world zones and the
+        travel connections between them. It is built when the map catalog is
+        loaded, and rebuilt when :py:meth:`~.refresh_gw2timer_data` changes
+        the travel connections (both in worker threads); this never builds
+        it.
+
+        :return: travel graph, or None if the map catalog isn't loaded yet
+        :rtype: :py:class:`~.TravelGraph`
+        """
+        return self._travel_graph
+
+    def _build_travel_graph(self):
+        """
+        Build a :py:class:`~.TravelGraph` from the map catalog and the
+        current :py:attr:`~.travel_paths`, for :py:attr:`~.travel_graph`.
+
+        :return: travel graph, or None if the map catalog isn't loaded yet
+        :rtype: :py:class:`~.TravelGraph`
+        """
+        if self._all_maps is None:
+            return None
+        logger.debug('Building travel graph')
+        return TravelGraph(
+            dict(
+                (map_id, self._all_maps[map_id])
+                for map_id in world_zones if map_id in self._all_maps
+            ),
+            self.travel_paths
+        )
+
+    def map_neighbors(self, map_id):
+        """
+        Return the IDs of the maps directly reachable from a map through any
+        of its :py:attr:`~.travel_paths`.
+
+        :param map_id: map ID
+        :type map_id: int
+        :return: sorted list of map IDs
+        :rtype: list
+        """
+        paths = self.travel_paths
+        if paths is None:
+            return []
+        result = set()
+        for conns in paths.values():
+            for conn in conns:
+                a = conn['end_a']['map_id']
+                b = conn['end_b']['map_id']
+                if a == map_id and b != map_id:
+                    result.add(b)
+                elif b == map_id and a != map_id:
+                    result.add(a)
+        result.discard(-1)
+        return sorted(result)
+
+    def _refresh_gw2timer_file(self, name, ttl):
+        """
+        Ensure that the cached copy of gw2timer's ``data/{name}.js`` is no
+        older than ``ttl``. If it is, download it; if the upstream content is
+        unchanged, just reset the age of the cached file.
+
+        :param name: gw2timer data file name, without ``.js``
+        :type name: str
+        :param ttl: maximum age of the cached file, in seconds
+        :type ttl: int
+        :return: 2-tuple of the current file content (or None if we have
+          neither a cached copy nor a successful download) and a boolean
+          indicating whether the content changed
+        :rtype: tuple
+        """
+        cached = self._cache_get('gw2timer', name, extension='js', ttl=ttl,
+                                 raw=True)
+        if cached is not None:
+            return cached, False
+        # expired or missing; keep the stale copy around in case of error
+        stale = self._cache_get('gw2timer', name, extension='js', raw=True)
+        url = GW2TIMER_URL % name
+        logger.debug('GET %s', url)
+        try:
             r = requests.get(url)
-            if r.status_code != 200:
-                logger.error("Error: GET %s returned status code %s", url,
-                             r.status_code)
-                return
-            content = "// generated by gw2copilot %s at %s\n" % (
-            VERSION, time.time())
-            content += "// retrieved from %s\n" % url
-            content += r.content
-            self._cache_set('gw2timer', 'general', content, extension='js',
-                            raw=True)
-        ###########################
-        # general.js travel paths #
-        ###########################
-        cached = self._cache_get('gw2timer', 'travel', extension='js',
-                                 ttl=TTL_1DAY, raw=True)
-        if cached is None:
-            content = "// generated by gw2copilot %s at %s\n" % (
-                VERSION, time.time())
-            content += "// retrieved from %s\n" % url
-            try:
-                logger.debug('Generating gw2timer travel data')
-                content += self._gw2timer_travel_connections(r.content)
-                self._cache_set('gw2timer', 'travel', content, extension='js',
-                                raw=True)
-            except Exception:
-                logger.exception('Unable to build gw2timer travel connections'
-                                 'JS source')
+        except Exception:
+            logger.exception('Error: GET %s failed', url)
+            return stale, False
+        if r.status_code != 200:
+            logger.error("Error: GET %s returned status code %s", url,
+                         r.status_code)
+            return stale, False
+        if stale is not None and self._strip_gw2timer_header(
+                stale) == r.content:
+            logger.debug('gw2timer %s.js unchanged upstream', name)
+            os.utime(self._cache_path('gw2timer', name, 'js'), None)
+            return stale, False
+        content = self._gw2timer_header(url) + r.content
+        self._cache_set('gw2timer', name, content, extension='js', raw=True)
+        logger.info('Updated gw2timer %s.js from %s', name, url)
+        return content, True
+
+    def _gw2timer_header(self, url):
+        """
+        Return the comment header we prepend to gw2timer-derived cache files.
+
+        :param url: the URL the data was retrieved from
+        :type url: str
+        :return: JS comment lines
+        :rtype: str
+        """
+        s = "// generated by gw2copilot %s at %s\n" % (VERSION, time.time())
+        s += "// retrieved from %s\n" % url
+        return s
+
+    def _strip_gw2timer_header(self, content):
+        """
+        Return ``content`` with the header added by
+        :py:meth:`~._gw2timer_header` removed.
+
+        :param content: cached file content
+        :type content: str
+        :return: original upstream content
+        :rtype: str
+        """
+        if not content.startswith('// generated by gw2copilot '):
+            return content
+        parts = content.split("\n", 2)
+        if len(parts) < 3:
+            return ''
+        return parts[2]
 
     def _gw2timer_travel_connections(self, src):
         """
         Given the content of gw2timer's general.js, extract the source of the
         ``GW2T_GATEWAY_CONNECTION`` variable, convert it to a Python dict,
-        add the appropriate titles to the travel paths, and return javascript
-        source for the resulting object.
+        and add the map IDs, map names and titles to the travel paths; see
+        :py:attr:`~.travel_paths`.
 
         :param src: original source of gw2timer general.js
         :type src: str
-        :return: javascript object for GW2TIMER_TRAVEL_CONNECTIONS
-        :rtype: str
+        :return: travel paths dict
+        :rtype: dict
         """
         logger.debug('Extracting source of GW2T_GATEWAY_CONNECTION')
         var_src = extract_js_var(src, 'GW2T_GATEWAY_CONNECTION')
         logger.debug('Parsing javascript')
-        # this uses slimit, which used ply's lex/yacc, which write their f***ing
-        # error messages to stderr. So... we just trash stderr during this...
-        real_stderr = sys.stderr
-        sys.stderr = cStringIO.StringIO()
-        data = read_js_object(var_src)['GW2T_GATEWAY_CONNECTION']
-        sys.stderr = real_stderr
+        data = parse_js_object(var_src)['GW2T_GATEWAY_CONNECTION']
         # ok, now we need to do the manipulations; mainly, we need to find
         # the zone name for each coordinate.
         result = {
@@ -674,7 +963,7 @@ class CachingAPIClient(object):
                 arr['end_a']['title'] = '%s to %s' % ('Launch Pad', map_name_b)
                 arr['end_b']['title'] = '%s to %s' % ('Launch Pad', map_name_a)
             result['launchpads'].append(arr)
-        return dict2js('GW2T_TRAVEL_PATHS', result)
+        return result
 
     def _gw2t_travel_coord_dict(self, coord_list, title_prefix, icon_name):
         """
@@ -733,9 +1022,9 @@ class CachingAPIClient(object):
 
     def find_map_for_position(self, pos):
         """
-        Given a continent coordinates position (i.e. the **output** of
-        py:meth:`~.PlayerInfo._continent_coords`), find the map_id, map_rect and
-        continent_rect corresponding to that position.
+        Given a continent coordinates position (i.e.
+        :py:attr:`~.PlayerInfo.position`), find the map_id, map_rect and
+        continent_rect of the world zone containing it.
 
         :param pos: continent coordinates position 2-tuple (x, y)
         :type pos: tuple
@@ -743,15 +1032,12 @@ class CachingAPIClient(object):
         :rtype: tuple
         """
         x, y = pos
-        for map_id, _map in self.all_maps.items():
-            x1 = _map['continent_rect'][0][0]
-            x2 = _map['continent_rect'][1][0]
-            y1 = _map['continent_rect'][0][1]
-            y2 = _map['continent_rect'][1][1]
-            if x1 <= x <= x2 and y1 <= y <= y2:
+        self._load_all_maps()
+        for map_id, t in self._transforms.items():
+            if t.contains(x, y):
                 if map_id in world_zones:
                     logger.debug('Found map %d for position %s', map_id, pos)
-                    return map_id, _map['map_rect'], _map['continent_rect']
+                    return map_id, t.map_rect, t.continent_rect
                 else:
                     logger.info('Found non-world-zone map %d for position %s',
                                 map_id, pos)
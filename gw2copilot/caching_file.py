@@ -0,0 +1,116 @@
+"""
+gw2copilot/caching_file.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+from twisted.web import http
+from twisted.web.static import File
+
+logger = logging.getLogger(__name__)
+
+
+def file_etag(mtime, size):
+    """
+    Return a strong entity tag for a file, based on its modification time and
+    size. Cache files are always replaced atomically (see
+    :py:func:`~.write_atomic`), so a new version always has a new mtime.
+
+    :param mtime: file modification time, in seconds since the epoch
+    :type mtime: float
+    :param size: file size in bytes
+    :type size: int
+    :return: quoted ETag value
+    :rtype: str
+    """
+    return '"%x-%x"' % (int(mtime * 1000), size)
+
+
+class CachingFile(File):
+    """
+    :py:class:`twisted.web.static.File` that adds an ``ETag`` and a fixed
+    ``Cache-Control`` header to every file it serves, and answers matching
+    ``If-None-Match`` requests with a 304. (``File`` itself already handles
+    ``Last-Modified`` and ``If-Modified-Since``.) Child resources inherit the
+    ``Cache-Control`` value.
+
+    By default the ETag is built from the file's mtime and size (see
+    :py:func:`~.file_etag`); content-addressed files can pass their own.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        """
+        :param path: file or directory to serve
+        :type path: str
+        :param args: positional arguments for
+          :py:class:`twisted.web.static.File`
+        :param kwargs: keyword arguments for
+          :py:class:`twisted.web.static.File`, plus ``cache_control``, the
+          ``Cache-Control`` header value (default "no-cache"), and ``etag``,
+          a quoted ETag to use for this file (not inherited by children)
+        """
+        self.cache_control = kwargs.pop('cache_control', 'no-cache')
+        self.etag = kwargs.pop('etag', None)
+        File.__init__(self, path, *args, **kwargs)
+
+    def createSimilarFile(self, path):
+        """
+        Create a resource for a child path, carrying over our
+        :py:attr:`cache_control`.
+        """
+        f = File.createSimilarFile(self, path)
+        f.cache_control = self.cache_control
+        return f
+
+    def render_GET(self, request):
+        """
+        Set the caching headers and handle ``If-None-Match``, then let
+        :py:meth:`twisted.web.static.File.render_GET` do the rest.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        """
+        self.restat(False)
+        if self.exists() and not self.isdir():
+            request.setHeader('Cache-Control', self.cache_control)
+            etag = self.etag
+            if etag is None:
+                etag = file_etag(self.getModificationTime(), self.getsize())
+            if request.setETag(etag) is http.CACHED:
+                return ''
+        return File.render_GET(self, request)
+    render_HEAD = render_GET
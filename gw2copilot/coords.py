@@ -0,0 +1,202 @@
+"""
+gw2copilot/coords.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+#: inches per meter; MumbleLink positions are meters, map_rect is inches
+INCHES_PER_METER = 39.3701
+
+#: Leaflet max zoom level used by the live map (``maxZoom`` in map.js);
+#: continent coordinates are Leaflet pixel coordinates at this zoom
+LEAFLET_MAX_ZOOM = 7
+
+
+class MapTransform(object):
+    """
+    Precomputed conversion between the coordinate systems of one map:
+
+    * **MumbleLink** - ``fAvatarPosition`` in meters; X is east, Z is north
+      (Y is elevation).
+    * **map** - inches; MumbleLink X and Z scaled by
+      :py:data:`~.INCHES_PER_METER`. The map's ``map_rect`` bounds X and -Y.
+    * **continent** - as in the map's ``continent_rect`` and the tile API;
+      Y increases southward. These are Leaflet pixel coordinates at
+      :py:data:`~.LEAFLET_MAX_ZOOM`.
+
+    Map to continent conversion is an independent scale and offset per axis,
+    computed once here. Build from the map's data with
+    :py:meth:`~.from_map_data`.
+    """
+
+    __slots__ = [
+        'map_id', 'map_rect', 'continent_rect', '_sx', '_sy', '_ox', '_oy'
+    ]
+
+    def __init__(self, map_id, map_rect, continent_rect):
+        """
+        :param map_id: map ID
+        :type map_id: int
+        :param map_rect: map's ``map_rect``, ``[[x1, y1], [x2, y2]]``
+        :type map_rect: list
+        :param continent_rect: map's ``continent_rect``,
+          ``[[x1, y1], [x2, y2]]`` continent coordinates
+        :type continent_rect: list
+        :raises: ValueError if ``map_rect`` is empty
+        """
+        self.map_id = map_id
+        self.map_rect = map_rect
+        self.continent_rect = continent_rect
+        (mx1, my1), (mx2, my2) = map_rect
+        (cx1, cy1), (cx2, cy2) = continent_rect
+        if mx2 == mx1 or my2 == my1:
+            raise ValueError('Map %s has an empty map_rect: %s' % (
+                map_id, map_rect))
+        # continent = map * scale + offset; map_rect bounds -Y
+        self._sx = float(cx2 - cx1) / (mx2 - mx1)
+        self._sy = -float(cy2 - cy1) / (my2 - my1)
+        self._ox = cx1 - mx1 * self._sx
+        self._oy = cy1 + my1 * self._sy
+
+    @classmethod
+    def from_map_data(cls, map_data, map_id=None):
+        """
+        Build the transform for a map from its data, as returned by
+        :py:meth:`~.CachingAPIClient.map_data`.
+
+        :param map_data: map data dict
+        :type map_data: dict
+        :param map_id: map ID; if None, taken from ``map_data``
+        :type map_id: int
+        :rtype: :py:class:`~.MapTransform`
+        """
+        if map_id is None:
+            map_id = map_data.get('map_id')
+        return cls(map_id, map_data['map_rect'], map_data['continent_rect'])
+
+    def contains(self, x, y):
+        """
+        Return whether continent coordinates fall within this map.
+
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :rtype: bool
+        """
+        (x1, y1), (x2, y2) = self.continent_rect
+        return x1 <= x <= x2 and y1 <= y <= y2
+
+    def map_to_continent(self, x, y):
+        """
+        Convert map coordinates (inches) to continent coordinates.
+
+        :param x: map X coordinate
+        :type x: float
+        :param y: map Y coordinate
+        :type y: float
+        :return: continent (x, y) 2-tuple
+        :rtype: tuple
+        """
+        return x * self._sx + self._ox, y * self._sy + self._oy
+
+    def continent_to_map(self, x, y):
+        """
+        Convert continent coordinates to map coordinates (inches); the
+        inverse of :py:meth:`~.map_to_continent`.
+
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :return: map (x, y) 2-tuple
+        :rtype: tuple
+        """
+        return (x - self._ox) / self._sx, (y - self._oy) / self._sy
+
+    def mumble_to_continent(self, x, z):
+        """
+        Convert a MumbleLink position (meters) to continent coordinates.
+
+        :param x: ``fAvatarPosition[0]``
+        :type x: float
+        :param z: ``fAvatarPosition[2]``
+        :type z: float
+        :return: continent (x, y) 2-tuple
+        :rtype: tuple
+        """
+        return self.map_to_continent(x * INCHES_PER_METER,
+                                     z * INCHES_PER_METER)
+
+    def continent_to_mumble(self, x, y):
+        """
+        Convert continent coordinates to a MumbleLink position (meters); the
+        inverse of :py:meth:`~.mumble_to_continent`.
+
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :return: (x, z) 2-tuple, as in ``fAvatarPosition[0]`` and ``[2]``
+        :rtype: tuple
+        """
+        mx, my = self.continent_to_map(x, y)
+        return mx / INCHES_PER_METER, my / INCHES_PER_METER
+
+
+def build_transforms(all_maps):
+    """
+    Build the :py:class:`~.MapTransform` for every map in the catalog,
+    skipping (and logging) any without usable rectangles.
+
+    :param all_maps: dict of map ID to map data, as returned by
+      :py:attr:`~.CachingAPIClient.all_maps`
+    :type all_maps: dict
+    :return: dict of map ID to :py:class:`~.MapTransform`
+    :rtype: dict
+    """
+    result = {}
+    for map_id, data in all_maps.items():
+        try:
+            result[map_id] = MapTransform.from_map_data(data, map_id=map_id)
+        except (KeyError, TypeError, ValueError):
+            logger.debug('No coordinate transform for map %s', map_id)
+    logger.debug('Built coordinate transforms for %d maps', len(result))
+    return result
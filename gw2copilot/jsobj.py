@@ -4,7 +4,9 @@ Vendored in; retrieved 2016-11-20 from
 https://github.com/darkf/py-js-object-parser/blob/master/jsobj.py
 as of f73c2e711ab45d5e051611b2eb270cf1c8b90dd7
 
-with minor formatting/pep8/pyflakes changes
+with minor formatting/pep8/pyflakes changes; :py:func:`~.parse_js_object`
+and :py:func:`~.tokenize_js` were added for gw2copilot and do not require
+slimit.
 ############################
 Simple JavaScript/ECMAScript object literal reader
 
@@ -37,9 +39,15 @@ Licensed under the terms of the WTFPL:
 
 """
 
-from slimit.parser import Parser
-import slimit.ast as ast
 import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    unichr
+except NameError:  # nocoverage - python3
+    unichr = chr
 
 unicodepoint = re.compile('\\\\u([0-9a-fA-F]{4})')
 
@@ -52,6 +60,11 @@ def read_js_object(code, use_unicode=False):
     """Takes in code and returns a dictionary of assignments to object literals, e.g.
         `var x = {y: 1, z: 2};`
         returns {'x': {'y': 1, 'z': 2}}."""
+    # slimit is only needed here; import it lazily so that
+    # :py:func:`~.parse_js_object` users don't pay for ply's table generation
+    from slimit.parser import Parser
+    import slimit.ast as ast
+
     def visit(node):
         if isinstance(node, ast.Program):
             d = {}
@@ -116,3 +129,230 @@ def read_js_object(code, use_unicode=False):
         else:
             raise Exception("Unhandled node: %r" % node)
     return visit(Parser().parse(code))
+
+
+#: Token regex for :py:func:`~.tokenize_js`. Order matters; comments must be
+#: tried before punctuation, and strings may not span lines.
+_token_re = re.compile(
+    r'(?P<ws>\s+)'
+    r'|(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<string>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')'
+    r'|(?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)'
+    r'|(?P<name>[A-Za-z_$][\w$]*)'
+    r'|(?P<punct>[{}\[\]:,;=+\-])',
+    re.DOTALL
+)
+
+#: maximum number of results memoized by :py:func:`~.parse_js_object`
+PARSE_CACHE_SIZE = 16
+
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+
+def tokenize_js(code):
+    """
+    Generator that tokenizes JavaScript source, yielding ``(kind, text, pos)``
+    3-tuples. ``kind`` is one of "string", "number", "name" or "punct";
+    whitespace and comments are skipped. Only the subset of JavaScript needed
+    for object literals in ``var`` statements is recognized.
+
+    :param code: JavaScript source
+    :type code: str
+    :raises: ValueError on any character that does not start a known token
+    """
+    pos = 0
+    end = len(code)
+    match = _token_re.match
+    while pos < end:
+        m = match(code, pos)
+        if m is None:
+            raise ValueError("Unexpected character %r at position %d" % (
+                code[pos], pos))
+        kind = m.lastgroup
+        if kind != 'ws' and kind != 'comment':
+            yield kind, m.group(kind), pos
+        pos = m.end()
+
+
+class _JSObjectParser(object):
+    """
+    Recursive descent parser over :py:func:`~.tokenize_js` that produces the
+    same results as :py:func:`~.read_js_object`.
+    """
+
+    def __init__(self, code, use_unicode=False):
+        self._tokens = tokenize_js(code)
+        self._use_unicode = use_unicode
+        self._kind = None
+        self._text = None
+        self._pos = -1
+        self._advance()
+
+    def _advance(self):
+        try:
+            self._kind, self._text, self._pos = next(self._tokens)
+        except StopIteration:
+            self._kind, self._text, self._pos = None, None, -1
+
+    def _error(self, expected):
+        if self._kind is None:
+            return ValueError("Expected %s but reached end of input" % expected)
+        return ValueError("Expected %s but found %r at position %d" % (
+            expected, self._text, self._pos))
+
+    def _accept(self, text):
+        if self._kind == 'punct' and self._text == text:
+            self._advance()
+            return True
+        return False
+
+    def _expect(self, text):
+        if not self._accept(text):
+            raise self._error(repr(text))
+
+    def parse_program(self):
+        result = {}
+        while self._kind is not None:
+            if self._kind != 'name' or self._text != 'var':
+                raise ValueError("All statements should be var statements")
+            self._advance()
+            while True:
+                if self._kind != 'name':
+                    raise self._error('variable name')
+                name = self._text
+                self._advance()
+                self._expect('=')
+                result[name] = self._parse_expression()
+                if not self._accept(','):
+                    break
+            self._accept(';')
+        return result
+
+    def _parse_expression(self):
+        kind, value = self._parse_operand()
+        while self._accept('+'):
+            rkind, rvalue = self._parse_operand()
+            if kind != rkind or kind not in ('string', 'number'):
+                raise ValueError('Cannot + on anything other than two literals')
+            value += rvalue
+        if self._kind == 'punct' and self._text == '-':
+            raise ValueError("Cannot do operator '-'")
+        return value
+
+    def _parse_operand(self):
+        kind = self._kind
+        text = self._text
+        if kind == 'punct':
+            if text == '{':
+                return 'object', self._parse_object()
+            if text == '[':
+                return 'array', self._parse_array()
+            if text == '-' or text == '+':
+                self._advance()
+                if self._kind != 'number':
+                    raise self._error('number after unary %s' % text)
+                value = self._number(self._text)
+                self._advance()
+                return 'number', (-value if text == '-' else value)
+            raise self._error('value')
+        if kind is None:
+            raise self._error('value')
+        self._advance()
+        if kind == 'string':
+            return kind, self._string(text)
+        if kind == 'number':
+            return kind, self._number(text)
+        if text == 'true':
+            return 'boolean', True
+        if text == 'false':
+            return 'boolean', False
+        if text == 'null':
+            return 'null', None
+        return 'identifier', text
+
+    def _parse_object(self):
+        self._expect('{')
+        d = {}
+        while not self._accept('}'):
+            kind = self._kind
+            text = self._text
+            if kind == 'name':
+                key = text
+            elif kind == 'string':
+                key = self._string(text)
+            elif kind == 'number':
+                key = self._number(text)
+            else:
+                raise self._error('property name')
+            self._advance()
+            self._expect(':')
+            d[key] = self._parse_expression()
+            if not self._accept(','):
+                self._expect('}')
+                break
+        return d
+
+    def _parse_array(self):
+        self._expect('[')
+        a = []
+        while not self._accept(']'):
+            a.append(self._parse_expression())
+            if not self._accept(','):
+                self._expect(']')
+                break
+        return a
+
+    def _string(self, text):
+        s = text[1:-1]
+        if not self._use_unicode:
+            return s
+        if isinstance(s, bytes):
+            s = s.decode('utf8')
+        return unicodepoint.sub(unicode_replace, s)
+
+    @staticmethod
+    def _number(text):
+        if text[:2] in ('0x', '0X'):
+            return int(text, 16)
+        try:
+            i = int(text)
+            if text == '%d' % i:
+                return i
+        except ValueError:
+            pass
+        return float(text)
+
+
+def parse_js_object(code, use_unicode=False):
+    """
+    Drop-in replacement for :py:func:`~.read_js_object` that uses the
+    streaming :py:func:`~.tokenize_js` tokenizer and a small recursive descent
+    parser instead of slimit. It handles objects, arrays, strings, numbers,
+    booleans, null, identifiers and ``+`` folding of string or number literals.
+
+    Results are memoized on a hash of ``code`` (the last
+    :py:data:`~.PARSE_CACHE_SIZE` sources are kept), so the returned object
+    may be shared between callers and must be treated as read-only.
+
+    :param code: JavaScript source of one or more ``var x = ...;`` statements
+    :type code: str
+    :param use_unicode: decode strings and ``\\uXXXX`` escapes to unicode
+    :type use_unicode: bool
+    :return: dict of variable name to value
+    :rtype: dict
+    :raises: ValueError if the source cannot be parsed
+    """
+    raw = code if isinstance(code, bytes) else code.encode('utf-8')
+    key = (hashlib.sha1(raw).hexdigest(), use_unicode)
+    with _parse_cache_lock:
+        result = _parse_cache.pop(key, None)
+        if result is not None:
+            _parse_cache[key] = result
+            return result
+    result = _JSObjectParser(code, use_unicode=use_unicode).parse_program()
+    with _parse_cache_lock:
+        _parse_cache[key] = result
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return result
@@ -0,0 +1,148 @@
+"""
+gw2copilot/mumble_recording.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import struct
+import time
+import logging
+
+from .read_mumble_link import (
+    BinaryFrameEncoder, BinaryFramer, FRAME_DELTA, decode_frame
+)
+
+logger = logging.getLogger(__name__)
+
+#: magic bytes at the start of a MumbleLink recording
+RECORDING_MAGIC = b'GW2MLREC'
+#: recording format version
+RECORDING_VERSION = 1
+#: file header: magic, format version
+_FILE_HEADER = struct.Struct('<8sH')
+#: record header: timestamp (seconds since the epoch), frame length
+_RECORD_HEADER = struct.Struct('<dI')
+
+
+class MumbleRecorder(object):
+    """
+    Write every MumbleLink update to a compact binary log, for
+    :py:class:`~.ReplayMumbleLinkReader`. After a file header
+    (:py:data:`~.RECORDING_MAGIC` and :py:data:`~.RECORDING_VERSION`), each
+    record is a timestamp and length followed by a binary frame from
+    :py:class:`~.BinaryFrameEncoder`, so unchanged strings are only stored in
+    periodic keyframes.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to write the recording to; it is overwritten
+        :type path: str
+        """
+        logger.warning('Recording MumbleLink data to %s', path)
+        self.path = path
+        self._fh = open(path, 'wb')
+        self._fh.write(_FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        self._encoder = BinaryFrameEncoder()
+        self.frames = 0
+
+    def record(self, data, timestamp=None):
+        """
+        Append an update to the recording.
+
+        :param data: full MumbleLink dict
+        :type data: dict
+        :param timestamp: time of the update in seconds since the epoch;
+          defaults to now
+        :type timestamp: float
+        """
+        if self._fh is None:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        frame = self._encoder.encode(data)
+        self._fh.write(_RECORD_HEADER.pack(timestamp, len(frame)) + frame)
+        self.frames += 1
+
+    def close(self):
+        """Flush and close the recording."""
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        logger.warning('Recorded %d MumbleLink frames to %s', self.frames,
+                       self.path)
+
+
+def iter_recording(path):
+    """
+    Generator of the updates in a recording made by
+    :py:class:`~.MumbleRecorder`, as ``(timestamp, data, partial)`` 3-tuples;
+    ``partial`` is True if ``data`` is a delta to be merged into the previous
+    state (as for :py:meth:`~.TwistedServer.update_mumble_data`). A record
+    truncated at the end of the file (e.g. if the recording process was
+    killed) is ignored.
+
+    :param path: path to the recording
+    :type path: str
+    :raises: ValueError if the file is not a recording in a known format
+    """
+    with open(path, 'rb') as fh:
+        header = fh.read(_FILE_HEADER.size)
+        if len(header) < _FILE_HEADER.size:
+            raise ValueError('%s is not a MumbleLink recording' % path)
+        magic, version = _FILE_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC:
+            raise ValueError('%s is not a MumbleLink recording' % path)
+        if version != RECORDING_VERSION:
+            raise ValueError('%s is a version %d MumbleLink recording; only '
+                             'version %d is supported' % (
+                                 path, version, RECORDING_VERSION))
+        while True:
+            rec = fh.read(_RECORD_HEADER.size)
+            if len(rec) < _RECORD_HEADER.size:
+                break
+            timestamp, length = _RECORD_HEADER.unpack(rec)
+            frame = fh.read(length)
+            if len(frame) < length:
+                logger.warning('Ignoring truncated record at end of %s', path)
+                break
+            frames = BinaryFramer().feed(frame)
+            if len(frames) != 1:
+                raise ValueError('Invalid record in %s' % path)
+            frame_type, payload = frames[0]
+            yield (timestamp, decode_frame(frame_type, payload),
+                   frame_type == FRAME_DELTA)
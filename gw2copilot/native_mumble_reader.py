@@ -38,7 +38,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from twisted.internet.task import LoopingCall
 from .read_mumble_link import GW2MumbleLinkReader
 
 logger = logging.getLogger(__name__)
@@ -49,7 +48,8 @@ class NativeMumbleLinkReader(object):
     Class to handle reading MumbleLink natively (direct mmap).
     """
 
-    def __init__(self, parent_server, poll_interval):
+    def __init__(self, parent_server, poll_interval, path=None,
+                 name='MumbleLink'):
         """
         Initialize the class. Create the :py:class:`~.GW2MumbleLinkReader`
         instance.
@@ -58,33 +58,42 @@ class NativeMumbleLinkReader(object):
         :type parent_server: :py:class:`~.TwistedServer`
         :param poll_interval: interval in seconds to poll MumbleLink
         :type poll_interval: float
+        :param path: if not None, path to a file-backed MumbleLink segment to
+          map instead of the Windows named shared memory
+        :type path: str
+        :param name: name of the Windows named shared memory (the game's
+          ``-mumble`` argument)
+        :type name: str
         """
         logger.debug("Instantiating NativeMumbleLinkReader")
         self.server = parent_server
         self._poll_interval = poll_interval
-        self._looping_deferred = None
-        self._reader = GW2MumbleLinkReader()
+        self.poll_scheduler = None
+        self._reader = GW2MumbleLinkReader(path=path, name=name)
         self._add_update_loop()
 
     def _add_update_loop(self):
         """
-        Setup the LoopingCall to poll MumbleLink every ``self.poll_interval``;
-        helper for testing. The LoopingCall will simply call :py:meth:`~._read`.
+        Setup the :py:class:`~.PollScheduler` to poll MumbleLink; helper for
+        testing. The scheduler will simply call :py:meth:`~._read`.
         """
-        logger.debug("Creating LoopingCall")
-        l = LoopingCall(self._read)
-        l.clock = self.server.reactor
-        logger.info('Setting poll interval to %s seconds',
-                    self._poll_interval)
-        self._looping_deferred = l.start(self._poll_interval)
-        self._looping_deferred.addErrback(logger.error)
+        logger.debug("Creating PollScheduler")
+        self.poll_scheduler = self.server.make_poll_scheduler(self._read)
+        self.poll_scheduler.start()
 
     def _read(self):
         """
         Read from the mmap via ``self._reader`` (
         :py:meth:`~.GW2MumbleLinkReader.read`) and pass data back to
         ``self.parent_server`` via :py:meth:`~.TwistedServer.update_mumble_data`
+
+        :return: set of MumbleLink fields that changed, or None if ``uiTick``
+          did not change
+        :rtype: set
         """
         logger.debug("Reading MumbleLink mmap")
         d = self._reader.read()
-        self.server.update_mumble_data(d)
+        if d is None:
+            # uiTick unchanged
+            return None
+        return self.server.update_mumble_data(d)
@@ -39,6 +39,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import math
+import time
+
+from .coords import INCHES_PER_METER
+from .sample_buffer import SampleBuffer
 
 logger = logging.getLogger(__name__)
 
@@ -46,8 +50,26 @@ logger = logging.getLogger(__name__)
 class PlayerInfo(object):
     """
     Class to store MumbleLink- and API-derived data about the current player.
+
+    State is updated incrementally by :py:meth:`~.update_mumble_link`. The
+    derived views (:py:attr:`~.as_dict`, :py:attr:`~.position` and
+    :py:attr:`~.player_dict`) are built at most once per update, the first
+    time they're accessed after their inputs changed, so the returned dicts
+    are shared and must be treated as read-only. Whether the last update
+    changed a view is available cheaply from :py:attr:`~.position_changed`
+    and :py:attr:`~.player_changed`.
     """
 
+    __slots__ = [
+        '_cache', '_mumble_link_data', '_current_map', '_current_map_data',
+        '_transform',
+        '_facing_direction', '_elevation', '_continent_id', '_continent_name',
+        '_region_id', '_region_name', '_map_name', '_position',
+        '_char_api_info', '_player_key', '_as_dict', '_position_dict',
+        '_player_dict', '_position_changed', '_player_changed',
+        '_map_changed', '_pending_map', '_map_retry', 'samples'
+    ]
+
     professions = [
         '',  # 1-based indexing
         'Guardian',  # 1
@@ -79,6 +101,7 @@ class PlayerInfo(object):
         self._mumble_link_data = {}
         self._current_map = -1
         self._current_map_data = {}
+        self._transform = None
         # calculated values
         self._facing_direction = 0
         self._elevation = 0
@@ -89,6 +112,20 @@ class PlayerInfo(object):
         self._map_name = ''
         self._position = [0, 0]
         self._char_api_info = None
+        # (name, profession, race, level) the player_dict was built from
+        self._player_key = None
+        # cached derived views; None when they need to be rebuilt
+        self._as_dict = None
+        self._position_dict = None
+        self._player_dict = None
+        self._position_changed = False
+        self._player_changed = False
+        self._map_changed = False
+        # map entered whose data isn't cached yet; see map_pending
+        self._pending_map = None
+        self._map_retry = False
+        #: recent position samples, for velocity and other derived values
+        self.samples = SampleBuffer()
 
     @property
     def as_dict(self):
@@ -102,31 +139,34 @@ class PlayerInfo(object):
         :return: player information
         :rtype: dict
         """
-        return {
-            'facing_direction': self._facing_direction,
-            'elevation': self._elevation,
-            'map_id': self._current_map,
-            'name': self._mumble_link_data['identity']['name'],
-            'level': self._char_api_info['level'],
-            'profession_id': self._mumble_link_data['identity']['profession'],
-            'profession_name': self.professions[
-                self._mumble_link_data['identity']['profession']
-            ],
-            'race_id': self._mumble_link_data['identity']['race'],
-            'race_name': self.races[
-                self._mumble_link_data['identity']['race']
-            ],
-            'continent_id': self._continent_id,
-            'continent_name': self._continent_name,
-            'region_id': self._region_id,
-            'region_name': self._region_name,
-            'map_name': self._map_name,
-            'map_level_range': '%d-%d' % (
-                self._current_map_data['min_level'],
-                self._current_map_data['max_level']
-            ),
-            'position': self._position
-        }
+        if self._as_dict is None:
+            self._as_dict = {
+                'facing_direction': self._facing_direction,
+                'elevation': self._elevation,
+                'map_id': self._current_map,
+                'name': self._mumble_link_data['identity']['name'],
+                'level': self._char_api_info['level'],
+                'profession_id': self._mumble_link_data[
+                    'identity']['profession'],
+                'profession_name': self.professions[
+                    self._mumble_link_data['identity']['profession']
+                ],
+                'race_id': self._mumble_link_data['identity']['race'],
+                'race_name': self.races[
+                    self._mumble_link_data['identity']['race']
+                ],
+                'continent_id': self._continent_id,
+                'continent_name': self._continent_name,
+                'region_id': self._region_id,
+                'region_name': self._region_name,
+                'map_name': self._map_name,
+                'map_level_range': '%d-%d' % (
+                    self._current_map_data['min_level'],
+                    self._current_map_data['max_level']
+                ) if self._current_map_data else '',
+                'position': self._position
+            }
+        return self._as_dict
 
     @property
     def position(self):
@@ -140,10 +180,12 @@ class PlayerInfo(object):
           coordinates and "map_id" (int, map id)
         :rtype: tuple
         """
-        return {
-            'position': self._position,
-            'map_id': self._current_map
-        }
+        if self._position_dict is None:
+            self._position_dict = {
+                'position': self._position,
+                'map_id': self._current_map
+            }
+        return self._position_dict
 
     @property
     def player_dict(self):
@@ -160,110 +202,199 @@ class PlayerInfo(object):
         :return: Dict of information about the player.
         :rtype: dict
         """
-        return {
-            'name': self._mumble_link_data['identity']['name'],
-            'profession': self.professions[
-                self._mumble_link_data['identity']['profession']
-            ],
-            'race': self.races[
-                self._mumble_link_data['identity']['race']
-            ],
-            'level': self._char_api_info['level']
-        }
+        if self._player_dict is None:
+            self._player_dict = {
+                'name': self._mumble_link_data['identity']['name'],
+                'profession': self.professions[
+                    self._mumble_link_data['identity']['profession']
+                ],
+                'race': self.races[
+                    self._mumble_link_data['identity']['race']
+                ],
+                'level': self._char_api_info['level']
+            }
+        return self._player_dict
+
+    @property
+    def position_changed(self):
+        """
+        Return whether the last :py:meth:`~.update_mumble_link` changed
+        :py:attr:`~.position`.
+
+        :rtype: bool
+        """
+        return self._position_changed
+
+    @property
+    def player_changed(self):
+        """
+        Return whether the last :py:meth:`~.update_mumble_link` changed
+        :py:attr:`~.player_dict`.
+
+        :rtype: bool
+        """
+        return self._player_changed
+
+    @property
+    def map_changed(self):
+        """
+        Return whether the last :py:meth:`~.update_mumble_link` moved the
+        player to a different map, according to MumbleLink (see
+        :py:attr:`~.map_id`).
+
+        :rtype: bool
+        """
+        return self._map_changed
+
+    @property
+    def map_id(self):
+        """
+        Return the ID of the map the player is on according to MumbleLink.
+        This is the ``map_id`` of :py:attr:`~.position` unless
+        :py:attr:`~.map_pending`.
+
+        :rtype: int
+        """
+        if self._pending_map is not None:
+            return self._pending_map
+        return self._current_map
+
+    @property
+    def map_pending(self):
+        """
+        Return whether the player is on a map whose data wasn't cached when
+        they entered it. Until :py:meth:`~.retry_map` finds it in the cache,
+        the derived views keep describing the previous map and position, and
+        no samples are recorded.
 
-    def update_mumble_link(self, mumble_link_data):
+        :rtype: bool
         """
-        Update any values that have changed from mumble link data.
+        return self._pending_map is not None
+
+    def retry_map(self):
+        """
+        Check the cache for the pending map's data again on the next
+        :py:meth:`~.update_mumble_link`; call this once something (i.e. the
+        :py:class:`~.PrefetchJob` for the map) may have cached it. Misses are
+        remembered until then, so that updates don't hit the disk cache.
+        """
+        self._map_retry = True
+
+    def update_mumble_link(self, mumble_link_data, changed=None):
+        """
+        Update any values that have changed from mumble link data, and mark
+        the derived views that depend on them to be rebuilt.
 
         :param mumble_link_data: raw mumble link data
         :type mumble_link_data: dict
+        :param changed: set of top-level ``mumble_link_data`` keys that
+          changed since the last update; derived values that only depend on
+          unchanged fields are not recalculated. If None, everything is.
+        :type changed: set
         """
         logger.debug("Updating mumble link data")
         self._mumble_link_data = mumble_link_data
-        if self._current_map != mumble_link_data['context']['mapId']:
-            logger.debug("Changed maps from %d to %d", self._current_map,
-                         mumble_link_data['context']['mapId'])
-            self._handle_map_change(mumble_link_data['context']['mapId'])
-        self._facing_direction = -(
-            math.atan2(mumble_link_data['fAvatarFront'][2],
-                       mumble_link_data['fAvatarFront'][0]
-                       )*180/math.pi
-        ) % 360
-        self._elevation = m2i(mumble_link_data['fAvatarPosition'][1])
-        self._update_position()
-        self._char_api_info = self._cache.character_info(
-            mumble_link_data['identity']['name']
+        if changed is None:
+            changed = set(mumble_link_data.keys())
+        self._position_changed = False
+        self._player_changed = False
+        self._map_changed = False
+        if changed:
+            self._as_dict = None
+        # whether the map the views describe changed
+        map_changed = False
+        if 'context' in changed or self._map_retry:
+            new_map = mumble_link_data['context']['mapId']
+            if new_map != self.map_id:
+                logger.debug("Changed maps from %d to %d", self.map_id,
+                             new_map)
+                self._map_changed = True
+                self._pending_map = None
+                if new_map != self._current_map:
+                    map_changed = self._handle_map_change(new_map)
+                else:
+                    # back on the map the views describe
+                    map_changed = True
+            elif self._map_retry and self._pending_map is not None:
+                map_changed = self._handle_map_change(new_map)
+            self._map_retry = False
+        if map_changed:
+            self._position_changed = True
+            self._as_dict = None
+        if 'fAvatarFront' in changed:
+            self._facing_direction = -(
+                math.atan2(mumble_link_data['fAvatarFront'][2],
+                           mumble_link_data['fAvatarFront'][0]
+                           )*180/math.pi
+            ) % 360
+        if ('fAvatarPosition' in changed or map_changed) and \
+                self._pending_map is None:
+            self._elevation = m2i(mumble_link_data['fAvatarPosition'][1])
+            prev = self._position
+            self._update_position()
+            if self._position[0] != prev[0] or self._position[1] != prev[1]:
+                self._position_changed = True
+        if self._position_changed:
+            self._position_dict = None
+        if 'identity' in changed or self._char_api_info is None:
+            self._char_api_info = self._cache.character_info(
+                mumble_link_data['identity']['name']
+            )
+            self._as_dict = None
+            self._update_player_key()
+        if self._pending_map is None:
+            self.samples.append(
+                time.time(), mumble_link_data['uiTick'], self._position[0],
+                self._position[1], self._elevation, self._facing_direction,
+                self._current_map
+            )
+
+    def _update_player_key(self):
+        """
+        Compare the fields :py:attr:`~.player_dict` is built from to those of
+        the cached view; if any differ, mark it to be rebuilt and set
+        :py:attr:`~.player_changed`.
+        """
+        identity = self._mumble_link_data['identity']
+        key = (
+            identity['name'], identity['profession'], identity['race'],
+            None if self._char_api_info is None
+            else self._char_api_info.get('level')
         )
+        if key != self._player_key:
+            self._player_key = key
+            self._player_dict = None
+            self._player_changed = True
 
     def _update_position(self):
         """
         Update player position with current mumble and map data.
         """
-        map_rect = self._current_map_data['map_rect']
-        con_rect = self._current_map_data['continent_rect']
-        x = m2i(self._mumble_link_data['fAvatarPosition'][0])
-        y = m2i(self._mumble_link_data['fAvatarPosition'][2])
-        self._position = self._continent_coords(con_rect, map_rect, x, y)
-
-    def _continent_coords(self, con_rect, map_rect, x, y):
-        """
-        Given a continent rectangle and map rectangle from map data, plus the
-        MumbleLink-provided player x and y corrdinates, determine the continent
-        coordinates.
-
-        :param con_rect: continent rectangle from map data
-        :type con_rect: list
-        :param map_rect: map rectangle from map data
-        :type map_rect: list
-        :param x: player x position from MumbleLink (inches)
-        :type x: float
-        :param y: player y position from MumbleLink (inches)
-        :type y: float
-        :return: continent coordinate (x, y) 2-tuple
-        :rtype: tuple
-        """
-        con_x = (x - map_rect[0][0]) / (map_rect[1][0] - map_rect[0][0]) * \
-                (con_rect[1][0] - con_rect[0][0]) + con_rect[0][0]
-        con_y = ((-1 * y) - map_rect[0][1]) / \
-                (map_rect[1][1] - map_rect[0][1]) * \
-                (con_rect[1][1] - con_rect[0][1]) + con_rect[0][1]
-        return con_x, con_y
+        pos = self._mumble_link_data['fAvatarPosition']
+        self._position = self._transform.mumble_to_continent(pos[0], pos[2])
 
     def _map_coords_from_position(self, pos):
         """
-        Given a continent coordinates position (i.e. the **output** of
-        :py:meth:`~._continent_coords`), calculate the continent, map and map
-        coordinates position that corresponds to them. This is the mathematical
-        inverse of :py:meth:`~._continent_coords`.
+        Given a continent coordinates position (i.e. :py:attr:`~.position`),
+        find the map it is on and calculate the map coordinates (inches)
+        that correspond to it, using the map's :py:class:`~.MapTransform`.
 
         This function really only exists to be used by
         :py:class:`~.TestMumbleLinkReader`.
 
         :param pos: continent coordinates position 2-tuple (x, y)
         :type pos: tuple
-        :return: 3-tuple: (continent_id, map_id, map_x, map_y)
+        :return: 3-tuple: (map_id, map_x, map_y)
         :rtype: tuple
         """
-        con_x, con_y = pos
-        map_id, map_rect, con_rect = self._find_map_for_position(pos)
-        x = (
-                (con_x - con_rect[0][0]) /
-                (con_rect[1][0] - con_rect[0][0]) *
-                (map_rect[1][0] - map_rect[0][0])
-            ) + map_rect[0][0]
-        y = (
-                (
-                    (con_y - con_rect[0][1]) /
-                    (con_rect[1][1] - con_rect[0][1]) *
-                    (map_rect[1][1] - map_rect[0][1])
-                ) + map_rect[0][1]
-        ) * -1
+        map_id, _, _ = self._find_map_for_position(pos)
+        x, y = self._cache.map_transform(map_id).continent_to_map(*pos)
         return map_id, x, y
 
     def _find_map_for_position(self, pos):
         """
-        Given a continent coordinates position (i.e. the **output** of
-        py:meth:`~._continent_coords`), find the map_id, map_rect and
+        Given a continent coordinates position (i.e. :py:attr:`~.position`),
+        find the map_id, map_rect and
         continent_rect corresponding to that position.
 
         Wrapper around
@@ -278,19 +409,30 @@ class PlayerInfo(object):
 
     def _handle_map_change(self, new_map_id):
         """
-        Handle when a player changes maps.
+        Handle when a player changes maps. Only cached map data is used, so
+        that this never blocks on the GW2 API; if the map isn't cached yet,
+        nothing changes but :py:attr:`~.map_pending` is set.
 
         :param new_map_id: new map ID
         :type new_map_id: int
+        :return: whether the map's data was cached
+        :rtype: bool
         """
+        mapdata = self._cache.map_data(new_map_id, fetch=False)
+        if mapdata is None:
+            logger.info('Map %d is not cached yet', new_map_id)
+            self._pending_map = new_map_id
+            return False
+        self._pending_map = None
         self._current_map = new_map_id
-        mapdata = self._cache.map_data(new_map_id)
         self._continent_id = mapdata['continent_id']
         self._continent_name = mapdata['continent_name']
         self._region_id = mapdata['region_id']
         self._region_name = mapdata['region_name']
         self._map_name = mapdata['map_name']
         self._current_map_data = mapdata
+        self._transform = self._cache.map_transform(new_map_id)
+        return True
 
 
 def m2i(m):
@@ -302,4 +444,4 @@ def m2i(m):
     :return: value in inches
     :rtype: float
     """
-    return m * 39.3701
+    return m * INCHES_PER_METER
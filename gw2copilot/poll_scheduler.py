@@ -0,0 +1,173 @@
+"""
+gw2copilot/poll_scheduler.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+#: MumbleLink fields that change while the player or camera moves
+MOTION_FIELDS = frozenset([
+    'fAvatarPosition', 'fAvatarFront', 'fCameraPosition', 'fCameraFront'
+])
+
+#: default factor to multiply the poll interval by when nothing moves
+DEFAULT_BACKOFF = 2.0
+
+
+class PollScheduler(object):
+    """
+    Adaptive MumbleLink poll scheduler, used by all of the MumbleLink reader
+    classes in place of a fixed-interval LoopingCall.
+
+    ``poll`` is called via ``reactor.callLater``. The MumbleLink fields that
+    changed are reported to :py:meth:`~.observe`, either as the return value
+    of ``poll`` (for readers that read synchronously) or by calling it
+    directly when data arrives (for readers that only request data in
+    ``poll``). After each poll, if any of :py:data:`~.MOTION_FIELDS` changed
+    since the previous one, the interval drops to ``min_interval``;
+    otherwise (including when ``uiTick`` stalled and nothing was reported at
+    all) it is multiplied by ``backoff``, up to ``max_interval``.
+    """
+
+    def __init__(self, reactor, poll, interval, min_interval, max_interval,
+                 backoff=DEFAULT_BACKOFF):
+        """
+        :param reactor: reactor to schedule polls with
+        :type reactor: twisted.internet.reactor
+        :param poll: callable to poll MumbleLink; may return the set of
+          fields that changed
+        :type poll: callable
+        :param interval: initial poll interval in seconds
+        :type interval: float
+        :param min_interval: shortest poll interval in seconds
+        :type min_interval: float
+        :param max_interval: longest poll interval in seconds
+        :type max_interval: float
+        :param backoff: factor to multiply the interval by when nothing moved
+        :type backoff: float
+        """
+        if min_interval > max_interval:
+            raise ValueError(
+                'min_interval (%s) must not be greater than max_interval '
+                '(%s)' % (min_interval, max_interval))
+        self._reactor = reactor
+        self._poll_func = poll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min(max(interval, min_interval), max_interval)
+        self._observed = None
+        self._call = None
+
+    def start(self):
+        """Poll immediately, and keep polling until :py:meth:`~.stop`."""
+        logger.info('Polling MumbleLink every %s to %s seconds',
+                    self.min_interval, self.max_interval)
+        self._call = self._reactor.callLater(0, self._poll)
+
+    def stop(self):
+        """Cancel the next poll."""
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+    def observe(self, changed):
+        """
+        Record MumbleLink fields that changed.
+
+        :param changed: names of the top-level MumbleLink fields that
+          changed, or None if nothing was read
+        :type changed: set
+        """
+        if changed is None:
+            return
+        if self._observed is None:
+            self._observed = set()
+        self._observed.update(changed)
+
+    @property
+    def rate(self):
+        """
+        Return the current effective poll rate.
+
+        :return: polls per second
+        :rtype: float
+        """
+        return 1.0 / self.interval
+
+    @property
+    def status(self):
+        """
+        Return the scheduler state, for the status page.
+
+        :return: dict with ``rate`` (Hz) and ``interval``, ``min_interval``
+          and ``max_interval`` (seconds)
+        :rtype: dict
+        """
+        return {
+            'rate': self.rate,
+            'interval': self.interval,
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval
+        }
+
+    def _poll(self):
+        """Call the poll function, adapt the interval and schedule the next
+        poll."""
+        self._call = None
+        try:
+            self.observe(self._poll_func())
+        except Exception:
+            logger.exception('Error polling MumbleLink')
+        self._adapt()
+        self._call = self._reactor.callLater(self.interval, self._poll)
+
+    def _adapt(self):
+        """Update ``self.interval`` from the changes observed since the
+        previous poll."""
+        observed = self._observed
+        self._observed = None
+        if observed is not None and not MOTION_FIELDS.isdisjoint(observed):
+            interval = self.min_interval
+        else:
+            interval = min(self.interval * self.backoff, self.max_interval)
+        if interval != self.interval:
+            logger.debug('MumbleLink poll interval changed from %s to %s',
+                         self.interval, interval)
+        self.interval = interval
@@ -0,0 +1,334 @@
+"""
+gw2copilot/prefetch.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import logging
+from collections import deque
+
+from .coords import LEAFLET_MAX_ZOOM
+
+logger = logging.getLogger(__name__)
+
+#: tile (continent, floor, zoom) assumed until a browser requests a tile;
+#: the live map's tile layer (see ``map.js``)
+DEFAULT_TILE_VIEW = (1, 1, LEAFLET_MAX_ZOOM)
+
+#: tile edge length in pixels
+TILE_SIZE = 256
+
+#: most tiles prefetched per map
+MAX_TILES = 256
+
+
+def tiles_for_rect(continent_rect, zoom, center=None, limit=MAX_TILES):
+    """
+    Return the (x, y) coordinates of the tiles covering a continent
+    rectangle at a zoom level; continent coordinates are pixels at
+    :py:data:`~.LEAFLET_MAX_ZOOM`.
+
+    :param continent_rect: ``[[x1, y1], [x2, y2]]`` continent coordinates
+    :type continent_rect: list
+    :param zoom: tile zoom level
+    :type zoom: int
+    :param center: if not None, (x, y) continent coordinates to order the
+      tiles by distance from; otherwise tiles are in row order
+    :type center: tuple
+    :param limit: maximum number of tiles to return; the closest to
+      ``center`` are kept
+    :type limit: int
+    :return: list of (x, y) tile coordinate tuples
+    :rtype: list
+    """
+    scale = float(TILE_SIZE * 2 ** (LEAFLET_MAX_ZOOM - zoom))
+    (x1, y1), (x2, y2) = continent_rect
+    tiles = [
+        (tx, ty)
+        for ty in range(int(y1 // scale), int((y2 - 1) // scale) + 1)
+        for tx in range(int(x1 // scale), int((x2 - 1) // scale) + 1)
+    ]
+    if center is not None:
+        cx = center[0] / scale - 0.5
+        cy = center[1] / scale - 0.5
+        tiles.sort(key=lambda t: (t[0] - cx) ** 2 + (t[1] - cy) ** 2)
+    return tiles[:limit]
+
+
+class PrefetchJob(object):
+    """
+    One run of :py:meth:`~.ZonePrefetcher.prefetch`: a queue of tasks run in
+    priority order, some of which queue further tasks when they complete.
+    """
+
+    def __init__(self, map_id, view, position=None):
+        """
+        :param map_id: map ID being prefetched
+        :type map_id: int
+        :param view: tile (continent, floor, zoom) to prefetch
+        :type view: tuple
+        :param position: player's continent coordinates, to prefetch the
+          closest tiles first
+        :type position: tuple
+        """
+        self.map_id = map_id
+        self.view = view
+        self.position = position
+        #: whether :py:meth:`~.cancel` has been called
+        self.cancelled = False
+        #: whether every task has completed, or the job was cancelled and
+        #: running tasks have completed
+        self.finished = False
+        #: whether the task retrieving the data for ``map_id`` has completed
+        #: (or failed)
+        self.map_done = False
+        #: number of tasks completed
+        self.completed = 0
+        #: number of tasks that raised an exception
+        self.failed = 0
+        self._queue = deque()
+        self._seen = set()
+        self._running = 0
+
+    def cancel(self):
+        """
+        Stop the job; tasks already running in a thread are left to
+        complete, but no more are started.
+        """
+        if not self.cancelled and not self.finished:
+            logger.debug('Cancelling prefetch of map %s', self.map_id)
+        self.cancelled = True
+        self._queue.clear()
+
+    @property
+    def pending(self):
+        """
+        Return the number of tasks not yet started.
+
+        :rtype: int
+        """
+        return len(self._queue)
+
+
+class ZonePrefetcher(object):
+    """
+    Warm the cache for a map the player just entered, in the background, so
+    that neither the reactor nor the browser has to wait on the GW2 API and
+    tile service. In priority order, a :py:class:`~.PrefetchJob` retrieves:
+
+    1. the map's data (:py:meth:`~.CachingAPIClient.map_data`),
+    2. its floor (:py:meth:`~.CachingAPIClient.map_floor`),
+    3. the tiles covering its continent rectangle at the zoom level the
+       browser last requested, closest to the player first,
+    4. the same for every map reachable through its travel connections
+       (:py:meth:`~.CachingAPIClient.map_neighbors`).
+
+    Each task runs in a thread; only ``concurrency`` run at once per job, and
+    a job can be cancelled (e.g. when the player moves on to another map).
+    """
+
+    def __init__(self, cache, run, concurrency=1, neighbors=True,
+                 tiles=True, max_tiles=MAX_TILES):
+        """
+        :param cache: the API client to warm
+        :type cache: :py:class:`~.CachingAPIClient`
+        :param run: ``run(func, *args)`` callable that calls ``func`` in a
+          thread and returns a Deferred that fires with its result, e.g.
+          :py:func:`twisted.internet.threads.deferToThreadPool` with the
+          reactor and pool bound
+        :type run: callable
+        :param concurrency: maximum tasks running at once per job
+        :type concurrency: int
+        :param neighbors: whether to prefetch maps reachable through travel
+          connections
+        :type neighbors: bool
+        :param tiles: whether to prefetch tiles
+        :type tiles: bool
+        :param max_tiles: most tiles prefetched per map
+        :type max_tiles: int
+        """
+        self._cache = cache
+        self._run = run
+        self._concurrency = concurrency
+        self._neighbors = neighbors
+        self._tiles = tiles
+        self._max_tiles = max_tiles
+        #: tile (continent, floor, zoom) last requested by a browser
+        self.view = DEFAULT_TILE_VIEW
+
+    def note_tile(self, continent, floor, zoom):
+        """
+        Record the continent, floor and zoom of a tile requested by a
+        browser; later jobs prefetch tiles for this view.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        """
+        self.view = (continent, floor, zoom)
+
+    def prefetch(self, map_id, position=None):
+        """
+        Start prefetching a map and its neighbors.
+
+        :param map_id: map ID
+        :type map_id: int
+        :param position: player's continent coordinates, to prefetch the
+          closest tiles first
+        :type position: tuple
+        :return: the job, which the caller should cancel when the player
+          leaves the map
+        :rtype: :py:class:`~.PrefetchJob`
+        """
+        logger.debug('Prefetching map %s (view %s)', map_id, self.view)
+        job = PrefetchJob(map_id, self.view, position=position)
+        self._add(job, ('map', map_id), self._load_map, map_id, True)
+        self._pump(job)
+        return job
+
+    def _add(self, job, key, func, *args):
+        """
+        Queue a task, unless the job has already queued one with this key.
+        """
+        if key in job._seen:
+            return
+        job._seen.add(key)
+        job._queue.append((key, func, args))
+
+    def _pump(self, job):
+        """
+        Start queued tasks, up to the concurrency limit.
+        """
+        while not job.cancelled and job._queue and \
+                job._running < self._concurrency:
+            key, func, args = job._queue.popleft()
+            job._running += 1
+            d = self._run(func, *args)
+            d.addCallbacks(
+                self._task_done, self._task_failed,
+                callbackArgs=(job, key), errbackArgs=(job, key))
+        if job._running == 0 and not job.finished and \
+                (job.cancelled or not job._queue):
+            job.finished = True
+            logger.debug('Prefetch of map %s %s after %d tasks',
+                         job.map_id,
+                         'cancelled' if job.cancelled else 'finished',
+                         job.completed)
+
+    def _task_done(self, result, job, key):
+        """
+        Callback for a completed task; plan the tiles and neighbors of a
+        loaded map.
+        """
+        job._running -= 1
+        job.completed += 1
+        if key == ('map', job.map_id):
+            job.map_done = True
+        if key[0] == 'map' and result is not None and not job.cancelled:
+            self._plan_map(job, key[1], *result)
+        self._pump(job)
+
+    def _task_failed(self, failure, job, key):
+        """
+        Errback for a failed task; log it and carry on with the rest.
+        """
+        job._running -= 1
+        job.completed += 1
+        job.failed += 1
+        if key == ('map', job.map_id):
+            job.map_done = True
+        logger.warning('Prefetch task %s failed: %s', key,
+                       failure.getErrorMessage())
+        self._pump(job)
+
+    def _plan_map(self, job, map_id, mapdata, neighbors):
+        """
+        Queue the floor and tile tasks for a loaded map, and the map tasks
+        for its neighbors.
+
+        :param job: the job
+        :type job: :py:class:`~.PrefetchJob`
+        :param map_id: map ID
+        :type map_id: int
+        :param mapdata: the map's data
+        :type mapdata: dict
+        :param neighbors: IDs of maps reachable from this one, if it is the
+          job's map; otherwise empty
+        :type neighbors: list
+        """
+        continent = mapdata['continent_id']
+        self._add(job, ('floor', continent, mapdata['default_floor']),
+                  self._cache.map_floor, continent, mapdata['default_floor'])
+        v_continent, v_floor, v_zoom = job.view
+        if self._tiles and continent == v_continent:
+            center = job.position if map_id == job.map_id else None
+            for x, y in tiles_for_rect(mapdata['continent_rect'], v_zoom,
+                                       center=center,
+                                       limit=self._max_tiles):
+                key = (v_continent, v_floor, v_zoom, x, y)
+                self._add(job, ('tile',) + key, self._load_tile, key)
+        for n in neighbors:
+            self._add(job, ('map', n), self._load_map, n, False)
+
+    def _load_map(self, map_id, primary):
+        """
+        Task, run in a thread: retrieve a map's data and, for the job's own
+        map, the maps reachable from it.
+
+        :return: 2-tuple of (map data, list of neighbor map IDs), or None if
+          the map data is unavailable
+        :rtype: tuple
+        """
+        mapdata = self._cache.map_data(map_id)
+        if mapdata is None:
+            return None
+        neighbors = []
+        if primary and self._neighbors:
+            neighbors = self._cache.map_neighbors(map_id)
+        return mapdata, neighbors
+
+    def _load_tile(self, key):
+        """
+        Task, run in a thread: retrieve a tile into the cache, if it isn't
+        already there.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        """
+        if self._cache.tile_store.lookup(key) is None:
+            self._cache.tile(*key)
@@ -49,18 +49,578 @@ See: https://wiki.guildwars2.com/wiki/API:MumbleLink
 """
 
 import sys
+import os
 import binascii
 import time
 import json
-from socket import inet_ntoa
+import struct
+from socket import inet_ntoa, inet_aton
 import ctypes
 import mmap
 import argparse
 import logging
+import threading
 from traceback import format_exc
 
 logger = logging.getLogger(__name__)
 
+#: size of the MumbleLink shared memory as laid out by GW2 (a Windows
+#: process, so 4-byte ``unsigned long`` and 2-byte ``wchar_t``); equal to
+#: ``ctypes.sizeof(Link)`` under Windows or wine
+LINK_SIZE = 5252
+
+#: uiVersion, uiTick at offset 0
+_TICK = struct.Struct('<II')
+#: fAvatarPosition, fAvatarFront, fAvatarTop at offset 8
+_AVATAR = struct.Struct('<9f')
+#: name (wchar[256]) at offset 44
+_NAME = struct.Struct('<512s')
+#: fCameraPosition, fCameraFront, fCameraTop at offset 556
+_CAMERA = struct.Struct('<9f')
+#: identity (wchar[256]) at offset 592
+_IDENTITY = struct.Struct('<512s')
+#: context_len, then GW2 context (serverAddress as sockaddr_in - family,
+#: port, address, padding to 28 bytes - then mapId, mapType, shardId,
+#: instance, buildId) at offset 1104
+_CONTEXT = struct.Struct('<IhH4s20x5I')
+#: description (wchar[2048]) at offset 1156
+_DESCRIPTION = struct.Struct('<4096s')
+
+_NAME_OFFSET = 44
+_CAMERA_OFFSET = 556
+_IDENTITY_OFFSET = 592
+_CONTEXT_OFFSET = 1104
+_DESCRIPTION_OFFSET = 1156
+
+
+def _wstr(raw):
+    """
+    Decode a NUL-terminated UTF-16LE ``wchar_t`` array, the same way ctypes
+    does for ``c_wchar`` arrays under Windows.
+
+    :param raw: raw array content
+    :type raw: str
+    :rtype: unicode
+    """
+    start = 0
+    while True:
+        end = raw.find(b'\x00\x00', start)
+        if end == -1:
+            end = len(raw)
+            break
+        if end % 2 == 0:
+            break
+        start = end + 1
+    return raw[:end].decode('utf-16-le')
+
+
+class LinkDecoder(object):
+    """
+    Decode the MumbleLink shared memory with precompiled
+    :py:class:`struct.Struct` instances, reading fields directly from the
+    mmap (or any buffer) with ``unpack_from`` rather than copying the whole
+    map and casting it to :py:class:`~.Link`. Produces the same dict as
+    :py:meth:`~.Link.as_dict`.
+
+    The string fields rarely change, so their decoded values (including the
+    parsed ``identity`` JSON) are cached and reused while the raw bytes are
+    unchanged.
+    """
+
+    def __init__(self):
+        self._name = (None, None)
+        self._identity = (None, None)
+        self._description = (None, None)
+
+    @staticmethod
+    def tick(buf):
+        """
+        Read only the header of the map.
+
+        :param buf: mmap or other buffer
+        :return: 2-tuple of (uiVersion, uiTick)
+        :rtype: tuple
+        """
+        return _TICK.unpack_from(buf, 0)
+
+    def decode(self, buf):
+        """
+        Decode the whole map.
+
+        :param buf: mmap or other buffer of at least :py:data:`~.LINK_SIZE`
+          bytes
+        :return: map contents, as returned by :py:meth:`~.Link.as_dict`
+        :rtype: dict
+        """
+        version, tick = _TICK.unpack_from(buf, 0)
+        av = _AVATAR.unpack_from(buf, 8)
+        cam = _CAMERA.unpack_from(buf, _CAMERA_OFFSET)
+        (ctx_len, family, port, addr, map_id, map_type, shard, instance,
+         build) = _CONTEXT.unpack_from(buf, _CONTEXT_OFFSET)
+        identity = self._cached_identity(
+            _IDENTITY.unpack_from(buf, _IDENTITY_OFFSET)[0])
+        if isinstance(identity, dict):
+            # callers may modify it; don't hand out the cached copy
+            identity = dict(identity)
+        return {
+            'uiVersion': version,
+            'uiTick': tick,
+            'fAvatarPosition': list(av[0:3]),
+            'fAvatarFront': list(av[3:6]),
+            'fAvatarTop': list(av[6:9]),
+            'name': self._cached_str(
+                '_name', _NAME.unpack_from(buf, _NAME_OFFSET)[0]),
+            'fCameraPosition': list(cam[0:3]),
+            'fCameraFront': list(cam[3:6]),
+            'fCameraTop': list(cam[6:9]),
+            'identity': identity,
+            'context_len': ctx_len,
+            'context': {
+                'mapId': map_id,
+                'mapType': map_type,
+                'shardId': shard,
+                'instance': instance,
+                'buildId': build,
+                'serverAddress': {
+                    'sin_family': family,
+                    'sin_port': port,
+                    'sin_addr': inet_ntoa(addr)
+                }
+            },
+            'description': self._cached_str(
+                '_description',
+                _DESCRIPTION.unpack_from(buf, _DESCRIPTION_OFFSET)[0])
+        }
+
+    def _cached_str(self, attr, raw):
+        """
+        Return the decoded value of a string field, reusing the last decoded
+        value if ``raw`` is unchanged.
+
+        :param attr: name of the cache attribute for this field
+        :type attr: str
+        :param raw: raw field content
+        :type raw: str
+        :rtype: unicode
+        """
+        prev_raw, value = getattr(self, attr)
+        if raw != prev_raw:
+            value = _wstr(raw)
+            setattr(self, attr, (raw, value))
+        return value
+
+    def _cached_identity(self, raw):
+        """
+        Return the parsed ``identity`` JSON (or the raw string if it isn't
+        valid JSON), reusing the last result if ``raw`` is unchanged.
+
+        :param raw: raw field content
+        :type raw: str
+        :rtype: dict
+        """
+        prev_raw, value = self._identity
+        if raw == prev_raw:
+            return value
+        value = _wstr(raw)
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        self._identity = (raw, value)
+        return value
+
+
+def pack_link(uiVersion=2, uiTick=0, fAvatarPosition=(0.0, 0.0, 0.0),
+              fAvatarFront=(0.0, 0.0, 0.0), fAvatarTop=(0.0, 0.0, 0.0),
+              name=u'', fCameraPosition=(0.0, 0.0, 0.0),
+              fCameraFront=(0.0, 0.0, 0.0), fCameraTop=(0.0, 0.0, 0.0),
+              identity=u'', context_len=48, context=None, description=u''):
+    """
+    Build the binary content of the MumbleLink shared memory, as GW2 would
+    write it; the inverse of :py:meth:`~.LinkDecoder.decode`. Used to
+    initialize an empty map, and for tests and benchmarks.
+
+    Arguments are the keys of the dict returned by
+    :py:meth:`~.LinkDecoder.decode`; ``identity`` may be a dict (which will be
+    JSON-encoded) or a string, and ``context`` a dict like the decoded one.
+
+    :return: :py:data:`~.LINK_SIZE` bytes
+    :rtype: str
+    """
+    if isinstance(identity, dict):
+        identity = json.dumps(identity)
+    if context is None:
+        context = {}
+    addr = context.get('serverAddress', {})
+    buf = bytearray(LINK_SIZE)
+    _TICK.pack_into(buf, 0, uiVersion, uiTick)
+    _AVATAR.pack_into(buf, 8, *(
+        tuple(fAvatarPosition) + tuple(fAvatarFront) + tuple(fAvatarTop)))
+    _NAME.pack_into(buf, _NAME_OFFSET, name.encode('utf-16-le'))
+    _CAMERA.pack_into(buf, _CAMERA_OFFSET, *(
+        tuple(fCameraPosition) + tuple(fCameraFront) + tuple(fCameraTop)))
+    _IDENTITY.pack_into(buf, _IDENTITY_OFFSET,
+                        u'{0}'.format(identity).encode('utf-16-le'))
+    _CONTEXT.pack_into(
+        buf, _CONTEXT_OFFSET, context_len, addr.get('sin_family', 0),
+        addr.get('sin_port', 0), inet_aton(addr.get('sin_addr', '0.0.0.0')),
+        context.get('mapId', 0), context.get('mapType', 0),
+        context.get('shardId', 0), context.get('instance', 0),
+        context.get('buildId', 0))
+    _DESCRIPTION.pack_into(buf, _DESCRIPTION_OFFSET,
+                           description.encode('utf-16-le'))
+    return bytes(buf)
+
+
+#: default number of frames between keyframes in delta mode
+DEFAULT_KEYFRAME_INTERVAL = 100
+
+
+class DeltaEncoder(object):
+    """
+    Turn a stream of full MumbleLink dicts (from
+    :py:meth:`~.GW2MumbleLinkReader.read`) into keyframes, containing every
+    field, and deltas, containing only the top-level fields whose values
+    changed since the previous frame. Most fields (``identity``, ``context``,
+    ``name``, ``description``) rarely change between ticks.
+
+    Frames are dicts with a ``frame`` key of ``key`` or ``delta``, and a
+    ``data`` key holding the (full or partial) MumbleLink dict.
+    """
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        """
+        :param keyframe_interval: emit a keyframe every this many frames, so
+          a reader that missed a frame resynchronizes
+        :type keyframe_interval: int
+        """
+        self.keyframe_interval = keyframe_interval
+        self._last = None
+        self._since_keyframe = 0
+
+    def encode(self, data):
+        """
+        Return the frame to send for ``data``.
+
+        :param data: full MumbleLink dict
+        :type data: dict
+        :return: frame dict
+        :rtype: dict
+        """
+        if (self._last is None or
+                self._since_keyframe >= self.keyframe_interval - 1):
+            self._last = data
+            self._since_keyframe = 0
+            return {'frame': 'key', 'data': data}
+        last = self._last
+        delta = dict(
+            (k, v) for k, v in data.items()
+            if k not in last or last[k] != v
+        )
+        self._last = data
+        self._since_keyframe += 1
+        return {'frame': 'delta', 'data': delta}
+
+
+#: binary frame header: payload length, frame type
+FRAME_HEADER = struct.Struct('<IB')
+#: binary frame type: all fields
+FRAME_KEY = 1
+#: binary frame type: numeric fields, plus strings that changed
+FRAME_DELTA = 2
+#: binary frame type: JSON-encoded error dict
+FRAME_ERROR = 3
+#: largest binary frame payload accepted by :py:class:`~.BinaryFramer`
+MAX_FRAME_SIZE = 65536
+
+#: binary frame numeric fields: uiVersion, uiTick, avatar and camera vectors,
+#: context_len, serverAddress family, port and address, mapId, mapType,
+#: shardId, instance, buildId, then a bitmask of the string fields that
+#: follow (see :py:data:`~._FRAME_STRINGS`)
+_FRAME_NUMERIC = struct.Struct('<II9f9fIhH4s5IB')
+#: length prefix of each string field in a binary frame
+_FRAME_STRLEN = struct.Struct('<H')
+#: string fields in a binary frame, in order, and their bitmask values;
+#: ``identity`` is sent JSON-encoded
+_FRAME_STRINGS = (('name', 1), ('identity', 2), ('description', 4))
+
+
+class BinaryFrameEncoder(object):
+    """
+    Encode MumbleLink dicts (from :py:meth:`~.GW2MumbleLinkReader.read`) as
+    length-prefixed binary frames: a :py:data:`~.FRAME_HEADER` followed by
+    the numeric fields packed with :py:data:`~._FRAME_NUMERIC`, and then
+    UTF-8 string fields, which are only included when they changed (or in
+    keyframes). Decoded by :py:class:`~.BinaryFramer` and
+    :py:func:`~.decode_frame`.
+    """
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        """
+        :param keyframe_interval: emit a keyframe every this many frames
+        :type keyframe_interval: int
+        """
+        self.keyframe_interval = keyframe_interval
+        self._strings = {}
+        self._since_keyframe = None
+
+    def encode(self, data):
+        """
+        Return the frame to send for ``data``.
+
+        :param data: full MumbleLink dict
+        :type data: dict
+        :return: binary frame
+        :rtype: str
+        """
+        key = (self._since_keyframe is None or
+               self._since_keyframe >= self.keyframe_interval - 1)
+        self._since_keyframe = 0 if key else self._since_keyframe + 1
+        ctx = data['context']
+        addr = ctx['serverAddress']
+        mask = 0
+        strings = []
+        for name, bit in _FRAME_STRINGS:
+            value = data[name]
+            if not key and self._strings.get(name) == value:
+                continue
+            self._strings[name] = value
+            if name == 'identity':
+                value = json.dumps(value)
+            raw = value.encode('utf-8')
+            strings.append(_FRAME_STRLEN.pack(len(raw)) + raw)
+            mask |= bit
+        payload = _FRAME_NUMERIC.pack(*(
+            [data['uiVersion'], data['uiTick']] +
+            data['fAvatarPosition'] + data['fAvatarFront'] +
+            data['fAvatarTop'] + data['fCameraPosition'] +
+            data['fCameraFront'] + data['fCameraTop'] +
+            [data['context_len'], addr['sin_family'], addr['sin_port'],
+             inet_aton(addr['sin_addr']), ctx['mapId'], ctx['mapType'],
+             ctx['shardId'], ctx['instance'], ctx['buildId'], mask]
+        )) + b''.join(strings)
+        return FRAME_HEADER.pack(
+            len(payload), FRAME_KEY if key else FRAME_DELTA) + payload
+
+    @staticmethod
+    def encode_error(err):
+        """
+        Return an error frame.
+
+        :param err: error dict
+        :type err: dict
+        :return: binary frame
+        :rtype: str
+        """
+        payload = json.dumps(err).encode('utf-8')
+        return FRAME_HEADER.pack(len(payload), FRAME_ERROR) + payload
+
+
+def decode_frame(frame_type, payload):
+    """
+    Decode the payload of a binary frame from :py:class:`~.BinaryFramer`.
+
+    For :py:data:`~.FRAME_KEY` this returns a full MumbleLink dict, for
+    :py:data:`~.FRAME_DELTA` a partial one (without unchanged strings), and
+    for :py:data:`~.FRAME_ERROR` the error dict.
+
+    :param frame_type: frame type
+    :type frame_type: int
+    :param payload: frame payload
+    :type payload: str
+    :rtype: dict
+    :raises: ValueError on an unknown frame type
+    """
+    if frame_type == FRAME_ERROR:
+        return json.loads(payload.decode('utf-8'))
+    if frame_type not in (FRAME_KEY, FRAME_DELTA):
+        raise ValueError('Unknown MumbleLink frame type: %r' % frame_type)
+    v = _FRAME_NUMERIC.unpack_from(payload, 0)
+    data = {
+        'uiVersion': v[0],
+        'uiTick': v[1],
+        'fAvatarPosition': list(v[2:5]),
+        'fAvatarFront': list(v[5:8]),
+        'fAvatarTop': list(v[8:11]),
+        'fCameraPosition': list(v[11:14]),
+        'fCameraFront': list(v[14:17]),
+        'fCameraTop': list(v[17:20]),
+        'context_len': v[20],
+        'context': {
+            'mapId': v[24],
+            'mapType': v[25],
+            'shardId': v[26],
+            'instance': v[27],
+            'buildId': v[28],
+            'serverAddress': {
+                'sin_family': v[21],
+                'sin_port': v[22],
+                'sin_addr': inet_ntoa(v[23])
+            }
+        }
+    }
+    mask = v[29]
+    offset = _FRAME_NUMERIC.size
+    for name, bit in _FRAME_STRINGS:
+        if not mask & bit:
+            continue
+        length = _FRAME_STRLEN.unpack_from(payload, offset)[0]
+        offset += _FRAME_STRLEN.size
+        value = payload[offset:offset + length].decode('utf-8')
+        offset += length
+        if name == 'identity':
+            value = json.loads(value)
+        data[name] = value
+    return data
+
+
+class BinaryFramer(object):
+    """
+    Incrementally split a byte stream of binary frames (as written by
+    :py:class:`~.BinaryFrameEncoder`) into ``(frame_type, payload)`` tuples,
+    regardless of how the stream was chunked when read.
+    """
+
+    def __init__(self):
+        self._buf = b''
+
+    def feed(self, data):
+        """
+        Add data read from the stream; return any frames it completed.
+
+        :param data: bytes read
+        :type data: str
+        :return: list of ``(frame_type, payload)`` tuples
+        :rtype: list
+        :raises: ValueError if a frame header claims a payload longer than
+          :py:data:`~.MAX_FRAME_SIZE`; the stream can't be resynchronized
+        """
+        buf = self._buf + data
+        frames = []
+        offset = 0
+        hsize = FRAME_HEADER.size
+        while len(buf) - offset >= hsize:
+            length, frame_type = FRAME_HEADER.unpack_from(buf, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError('MumbleLink frame length %d exceeds '
+                                 'maximum of %d' % (length, MAX_FRAME_SIZE))
+            end = offset + hsize + length
+            if end > len(buf):
+                break
+            frames.append((frame_type, buf[offset + hsize:end]))
+            offset = end
+        self._buf = buf[offset:]
+        return frames
+
+
+class LineFramer(object):
+    """
+    Incrementally split a byte stream into newline-terminated lines (the
+    JSON output mode), regardless of how it was chunked when read.
+    """
+
+    def __init__(self):
+        self._buf = b''
+
+    def feed(self, data):
+        """
+        Add data read from the stream; return any lines it completed.
+
+        :param data: bytes read
+        :type data: str
+        :return: list of complete lines, without line endings; blank lines
+          are skipped
+        :rtype: list
+        """
+        lines = (self._buf + data).split(b'\n')
+        self._buf = lines.pop()
+        return [l.strip() for l in lines if l.strip()]
+
+
+#: default number of unacknowledged frames allowed in push mode
+DEFAULT_PUSH_WINDOW = 4
+
+
+class FlowControl(object):
+    """
+    Credit-based flow control for push mode. The process starts with
+    ``window`` credits and spends one per frame written; the parent returns
+    credits by writing the number of frames it has processed, one count per
+    line, to our STDIN. While we're out of credits we stop reading
+    MumbleLink, so frames don't queue up in the pipe (adding latency) when
+    the parent falls behind; the next frame sent is the current state.
+    """
+
+    def __init__(self, window, stream):
+        """
+        Start the thread that reads acknowledgements from ``stream``.
+
+        :param window: maximum number of unacknowledged frames
+        :type window: int
+        :param stream: stream to read acknowledgement counts from
+        :type stream: file
+        """
+        self._credits = threading.Semaphore(window)
+        self._stream = stream
+        #: set when ``stream`` is closed, i.e. the parent went away
+        self.closed = threading.Event()
+        self._thread = threading.Thread(target=self._read_acks,
+                                        name='mumble-acks')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def take(self):
+        """
+        Take a credit to send a frame, if there is one.
+
+        :return: whether a credit was taken
+        :rtype: bool
+        """
+        return self._credits.acquire(False)
+
+    def give_back(self):
+        """Return a credit that was taken but not used to send a frame."""
+        self._credits.release()
+
+    def _read_acks(self):
+        """Thread target; add credits for each acknowledgement read."""
+        while True:
+            line = self._stream.readline()
+            if not line:
+                break
+            try:
+                count = int(line)
+            except ValueError:
+                logger.warning('Ignoring invalid acknowledgement: %r', line)
+                continue
+            for _ in range(count):
+                self._credits.release()
+        logger.debug('STDIN closed')
+        self.closed.set()
+
+
+def open_link_file(path, size=LINK_SIZE):
+    """
+    Memory-map a file-backed MumbleLink segment (such as
+    ``/dev/shm/MumbleLink``) for reading and writing, creating the file or
+    extending it to ``size`` bytes if needed.
+
+    :param path: path to the file
+    :type path: str
+    :param size: size of the map
+    :type size: int
+    :return: the memory map
+    :rtype: mmap.mmap
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        # the map keeps its own reference to the file
+        os.close(fd)
+
 
 class GW2MumbleLinkReader(object):
     """
@@ -70,15 +630,29 @@ class GW2MumbleLinkReader(object):
     MumbleLink file.
     """
 
-    def __init__(self):
-        """open the memory-mapped file and prepare for reading"""
-        self.fname = "MumbleLink"
-        self.map_size = ctypes.sizeof(Link)
+    def __init__(self, path=None, name="MumbleLink"):
+        """
+        open the memory-mapped file and prepare for reading
+
+        :param path: if not None, map this file-backed segment (see
+          :py:func:`~.open_link_file`) instead of the Windows named shared
+          memory
+        :type path: str
+        :param name: name of the Windows named shared memory; the game's
+          ``-mumble`` argument, if it was started with one
+        :type name: str
+        """
+        self.fname = name if path is None else path
+        self.map_size = LINK_SIZE
         logger.debug("Initializing mmap(0, %d, %s)", self.map_size, self.fname)
-        self.memfile = mmap.mmap(0, self.map_size, self.fname)
+        if path is None:
+            self.memfile = mmap.mmap(0, self.map_size, self.fname)
+        else:
+            self.memfile = open_link_file(path, self.map_size)
         logger.debug("memfile initialized")
         self.first = True
         self.previous_tick = 0
+        self.decoder = LinkDecoder()
 
     def read(self):
         """
@@ -145,31 +719,35 @@ class GW2MumbleLinkReader(object):
         :return: dict of map contents, or None if no changes
         :rtype: dict
         """
-        self.memfile.seek(0)
-        logger.debug("Reading memfile; previous_tick=%s first=%s",
-                     self.previous_tick, self.first)
-        data = self.memfile.read(self.map_size)
-        logger.debug("Read data: 0x%s", binascii.b2a_hex(data))
-        result = Unpack(Link, data)
-        if result.uiVersion == 0 and result.uiTick == 0:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Reading memfile; previous_tick=%s first=%s",
+                         self.previous_tick, self.first)
+        # only the header is read until we know the game has written to it
+        version, tick = self.decoder.tick(self.memfile)
+        if version == 0 and tick == 0:
             logger.info("MumbleLink contains no data, setting up and waiting")
             try:
-                init = Link(2, name="Guild Wars 2")
                 self.memfile.seek(0)
-                self.memfile.write(init)
+                self.memfile.write(pack_link(2, name=u"Guild Wars 2"))
                 logger.debug("Init struct written")
             except Exception:
                 logger.exception("Error writing init data")
-        if result.uiTick != self.previous_tick:
-            if self.first:
-                logger.info("MumbleLink seems to be active, hope for the best")
-                self.first = False
-            self.previous_tick = result.uiTick
+        if tick == self.previous_tick:
+            if debug:
+                logger.debug("No data change")
+            return None
+        if self.first:
+            logger.info("MumbleLink seems to be active, hope for the best")
+            self.first = False
+        if debug:
+            logger.debug("Read data: 0x%s", binascii.b2a_hex(
+                self.memfile[:self.map_size]))
+        self.previous_tick = tick
+        result = self.decoder.decode(self.memfile)
+        if debug:
             logger.debug("Returning dict; new tick=%s", self.previous_tick)
-            return result.as_dict()
-        # else
-        logger.debug("No data change")
-        return None
+        return result
 
 
 def console_entry_point(argv):
@@ -185,35 +763,84 @@ def console_entry_point(argv):
         set_log_debug()
     elif args.verbose > 0:
         set_log_info()
+    out = sys.stdout
+    if args.binary:
+        out = _binary_stdout()
     try:
-        m = GW2MumbleLinkReader()
+        m = GW2MumbleLinkReader(name=args.name)
     except Exception as ex:
-        print(json.dumps({
-            'error': True,
-            'exception': str(ex),
-            'traceback': str(format_exc())
-        }))
+        _write_error(out, args.binary, ex)
         raise SystemExit(1)
-    while True:
+    flow = None
+    if args.push:
+        flow = FlowControl(args.window, sys.stdin)
+    encoder = None
+    if args.binary:
+        encoder = BinaryFrameEncoder(args.keyframe_interval)
+    elif args.delta:
+        encoder = DeltaEncoder(args.keyframe_interval)
+    while flow is None or not flow.closed.is_set():
+        if flow is not None and not flow.take():
+            time.sleep(args.sleep_sec)
+            continue
+        sent = True
         try:
             res = m.read()
+            if res is not None and encoder is not None:
+                res = encoder.encode(res)
             if res is not None:
-                sys.stdout.write(json.dumps(res) + "\n")
-                sys.stdout.flush()
+                out.write(res if args.binary else json.dumps(res) + "\n")
+                out.flush()
+            else:
+                sent = False
         except Exception as ex:
-            sys.stdout.write(json.dumps({
-                'error': True,
-                'exception': str(ex),
-                'traceback': str(format_exc())
-            }) + "\n")
-            sys.stdout.flush()
-        if args.pause_in:
+            _write_error(out, args.binary, ex)
+        if flow is not None and not sent:
+            flow.give_back()
+        if args.pause_in and flow is None:
             logger.debug("Pausing until newline on STDIN...")
             sys.stdin.readline()
         else:
             time.sleep(args.sleep_sec)
 
 
+def _binary_stdout():
+    """
+    Return STDOUT as a binary stream; under Windows (and so wine) it is
+    otherwise opened in text mode, which would translate newlines in frames.
+
+    :return: binary STDOUT
+    :rtype: file
+    """
+    if sys.platform == 'win32':
+        import msvcrt
+        msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
+    return getattr(sys.stdout, 'buffer', sys.stdout)
+
+
+def _write_error(out, binary, ex):
+    """
+    Write an error message for the current exception to ``out``.
+
+    :param out: stream to write to
+    :type out: file
+    :param binary: whether to write a binary frame instead of JSON
+    :type binary: bool
+    :param ex: the exception
+    :type ex: Exception
+    """
+    err = {
+        'error': True,
+        'exception': str(ex),
+        'traceback': str(format_exc())
+    }
+    if binary:
+        out.write(BinaryFrameEncoder.encode_error(err))
+    else:
+        out.write(json.dumps(err) + "\n")
+    out.flush()
+
+
 def parse_args(argv):
     """
     Console entry point called when this is exec'ed as a standalone Python
@@ -237,6 +864,35 @@ def parse_args(argv):
                    default=False,
                    help='instead of sleeping for a specified time between '
                         'reads, sleep until a newline is received on STDIN')
+    p.add_argument('-n', '--name', dest='name', action='store',
+                   default='MumbleLink',
+                   help='shared memory name; the -mumble argument GW2 was '
+                        'started with, if any (default: MumbleLink)')
+    p.add_argument('-p', '--push', dest='push', action='store_true',
+                   default=False,
+                   help='poll every --sleep seconds and write a frame '
+                        'whenever uiTick changes, with no more than --window '
+                        'frames outstanding; the number of frames processed '
+                        'is acknowledged on STDIN, one count per line. '
+                        'Overrides --input.')
+    p.add_argument('-w', '--window', dest='window', type=int,
+                   action='store', default=DEFAULT_PUSH_WINDOW,
+                   help='in push mode, maximum number of unacknowledged '
+                        'frames (default: %d)' % DEFAULT_PUSH_WINDOW)
+    p.add_argument('-d', '--delta', dest='delta', action='store_true',
+                   default=False,
+                   help='write keyframes and deltas (changed fields only) '
+                        'instead of the full data for every change')
+    p.add_argument('-b', '--binary', dest='binary', action='store_true',
+                   default=False,
+                   help='write length-prefixed binary frames (see '
+                        'BinaryFrameEncoder) instead of JSON; implies --delta')
+    p.add_argument('-k', '--keyframe-interval', dest='keyframe_interval',
+                   type=int, action='store',
+                   default=DEFAULT_KEYFRAME_INTERVAL,
+                   help='in delta or binary mode, write a keyframe every '
+                        'this many frames (default: %d)' %
+                        DEFAULT_KEYFRAME_INTERVAL)
     args = p.parse_args(argv)
     return args
 
@@ -397,7 +1053,11 @@ class GW2context(ctypes.Structure):
 
 
 class Link(ctypes.Structure):
-    """ctypes Structure for MumbleLink memory map"""
+    """
+    ctypes Structure for MumbleLink memory map. No longer used for reading
+    (see :py:class:`~.LinkDecoder`); kept as the reference definition of the
+    layout.
+    """
     # see: https://wiki.guildwars2.com/wiki/API:MumbleLink
 
     _fields_ = [
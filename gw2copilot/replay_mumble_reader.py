@@ -0,0 +1,121 @@
+"""
+gw2copilot/replay_mumble_reader.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+
+from .mumble_recording import iter_recording
+
+logger = logging.getLogger(__name__)
+
+#: in as-fast-as-possible mode, number of frames replayed before returning
+#: control to the reactor
+REPLAY_BATCH = 100
+
+
+class ReplayMumbleLinkReader(object):
+    """
+    Class to play back a MumbleLink recording made with
+    :py:class:`~.MumbleRecorder` (``gw2copilot --record``) through
+    :py:meth:`~.TwistedServer.update_mumble_data`, in real time, at a
+    multiple of real time, or as fast as possible. This gives a reproducible
+    stream of real game data for benchmarks and testing.
+    """
+
+    def __init__(self, parent_server, path, speed=1.0):
+        """
+        Initialize the class and start playback once the reactor runs.
+
+        :param parent_server: the TwistedServer instance that started this
+        :type parent_server: :py:class:`~.TwistedServer`
+        :param path: path to the recording
+        :type path: str
+        :param speed: playback speed as a multiple of real time; 0 to play
+          back as fast as possible
+        :type speed: float
+        """
+        logger.warning('Replaying MumbleLink recording %s at %s', path,
+                       ('%sx' % speed) if speed > 0 else 'maximum speed')
+        self.server = parent_server
+        self.path = path
+        self.speed = speed
+        self.frames = 0
+        #: set to True when playback has finished
+        self.finished = False
+        self._records = iter_recording(path)
+        self._pending = next(self._records, None)
+        self._first_ts = None
+        self._start = None
+        self.server.reactor.callLater(0, self._play)
+
+    def _play(self):
+        """
+        Send due frames to the server, then schedule the next call.
+        """
+        reactor = self.server.reactor
+        if self._start is None:
+            self._start = reactor.seconds()
+            if self._pending is not None:
+                self._first_ts = self._pending[0]
+        count = 0
+        while self._pending is not None:
+            ts, data, partial = self._pending
+            if self.speed > 0:
+                # schedule from the start of playback, so delays don't drift
+                due = self._start + (ts - self._first_ts) / self.speed
+                delay = due - reactor.seconds()
+                if delay > 0:
+                    reactor.callLater(delay, self._play)
+                    return
+            elif count >= REPLAY_BATCH:
+                reactor.callLater(0, self._play)
+                return
+            self.server.update_mumble_data(data, partial=partial)
+            self.frames += 1
+            count += 1
+            self._pending = next(self._records, None)
+        self._finish()
+
+    def _finish(self):
+        """Log a summary when playback is done."""
+        self.finished = True
+        elapsed = self.server.reactor.seconds() - self._start
+        logger.warning(
+            'Finished replaying %d MumbleLink frames from %s in %.3fs '
+            '(%.1f frames/s)', self.frames, self.path, elapsed,
+            self.frames / elapsed if elapsed > 0 else 0.0)
@@ -44,7 +44,7 @@ import argparse
 import logging
 
 from .version import VERSION, PROJECT_URL
-from .server import TwistedServer
+from .utils import PhaseTimer
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger()
@@ -55,6 +55,24 @@ requests_log.setLevel(logging.WARNING)
 requests_log.propagate = True
 
 
+def webp_tier(spec):
+    """
+    argparse type for ``--webp-tier``; parse ``NAME=QUALITY``.
+
+    :param spec: option value
+    :type spec: str
+    :return: 2-tuple of tier name, integer quality
+    :rtype: tuple
+    """
+    name, sep, quality = spec.partition('=')
+    if sep == '' or name == '' or not quality.isdigit() or not (
+            0 <= int(quality) <= 100):
+        raise argparse.ArgumentTypeError(
+            'invalid tier "%s"; must be NAME=QUALITY with QUALITY '
+            '0-100' % spec)
+    return name, int(quality)
+
+
 class Runner(object):
     """command-line entry point for the main TwistedServer"""
 
@@ -80,8 +98,18 @@ class Runner(object):
         p.add_argument('-V', '--version', action='version', version=ver_str)
         p.add_argument('-p', '--poll-interval', dest='poll_interval',
                        default=2.0, action='store', type=float,
-                       help='MumbleLink polling interval in seconds '
-                       '(default: 2.0)')
+                       help='initial MumbleLink polling interval in seconds; '
+                       'it is adjusted between --poll-min and --poll-max '
+                       'depending on movement (default: 2.0)')
+        p.add_argument('--poll-min', dest='poll_min', default=0.1,
+                       action='store', type=float, metavar='SECONDS',
+                       help='shortest MumbleLink polling interval, used while '
+                       'the player or camera moves (default: 0.1)')
+        p.add_argument('--poll-max', dest='poll_max', default=5.0,
+                       action='store', type=float, metavar='SECONDS',
+                       help='longest MumbleLink polling interval, backed off '
+                       'to while nothing moves or the game is not updating '
+                       'MumbleLink (default: 5.0)')
         p.add_argument('-P', '--port', dest='bind_port', action='store',
                        type=int, default=8080,
                        help='Port number to listen on (default 8080)')
@@ -113,6 +141,89 @@ class Runner(object):
                        help='API Key; exporting this as the GW2_API_KEY '
                             'environment variable is preferred over specifying '
                             'it on the command line')
+        p.add_argument('--gw2timer-refresh', dest='gw2timer_refresh',
+                       action='store', type=int, default=86400,
+                       help='interval in seconds at which to re-download '
+                            'gw2timer.com data in the background '
+                            '(default: 86400)')
+        p.add_argument('--profile-startup', dest='profile_startup',
+                       action='store_true', default=False,
+                       help='log a per-phase timing breakdown of startup '
+                            'once cache warm-up is complete')
+        p.add_argument('--webp-tiles', dest='webp_tiles', action='store_true',
+                       default=False,
+                       help='transcode map tiles to WebP for clients that '
+                            'accept it (requires PIL with WebP support)')
+        p.add_argument('--webp-tier', dest='webp_tiers', action='append',
+                       type=webp_tier, default=None, metavar='NAME=QUALITY',
+                       help='WebP quality tier, selectable with the "tier" '
+                            'tile query parameter; may be specified multiple '
+                            'times (default: high=80 and low=50)')
+        p.add_argument('--tile-threads', dest='tile_threads',
+                       action='store', type=int, default=2,
+                       help='number of threads for tile image processing '
+                            '(WebP transcoding and synthesis) (default: 2)')
+        p.add_argument('--no-tile-synthesis', dest='tile_synthesis',
+                       action='store_false', default=True,
+                       help='do not serve provisional tiles built from '
+                            'cached neighboring zoom levels while a tile is '
+                            'retrieved')
+        p.add_argument('--mumble-push-rate', dest='mumble_push_rate',
+                       action='store', type=float, default=50.0,
+                       metavar='HZ',
+                       help='on Linux, have the wine MumbleLink reader poll '
+                            'this many times per second and push each '
+                            'change; 0 to instead request data every '
+                            '--poll-interval seconds (default: 50)')
+        p.add_argument('--mumble-shm', dest='mumble_shm', action='store',
+                       nargs='?', const='/dev/shm/MumbleLink', default=None,
+                       metavar='PATH',
+                       help='read MumbleLink directly from a file-backed '
+                            'shared memory segment (default path: '
+                            '/dev/shm/MumbleLink) instead of through wine; '
+                            'see gw2copilot-mumble-writer for testing')
+        p.add_argument('--mumble-name', dest='mumble_names',
+                       action='append', default=None, metavar='NAME',
+                       help='MumbleLink name of a game client (its -mumble '
+                            'argument) to follow; may be given multiple '
+                            'times to follow several clients, the first '
+                            'being the default (default: MumbleLink)')
+        p.add_argument('--record', dest='record', action='store', type=str,
+                       default=None, metavar='FILE',
+                       help='record every MumbleLink update to FILE, for '
+                            'playback with --replay')
+        p.add_argument('--replay', dest='replay', action='store', type=str,
+                       default=None, metavar='FILE',
+                       help='play back a MumbleLink recording made with '
+                            '--record instead of reading MumbleLink')
+        p.add_argument('--replay-speed', dest='replay_speed', action='store',
+                       type=float, default=1.0, metavar='N',
+                       help='--replay playback speed as a multiple of real '
+                            'time; 0 for as fast as possible (default: 1)')
+        p.add_argument('--no-trails', dest='trails', action='store_false',
+                       default=True,
+                       help='do not record each character\'s position trail '
+                            'under the cache directory')
+        p.add_argument('--no-prefetch', dest='prefetch',
+                       action='store_false', default=True,
+                       help='do not retrieve tiles for each map the player '
+                            'enters, or the maps reachable from it, in the '
+                            'background')
+        p.add_argument('--mumble-json', dest='mumble_json',
+                       action='store_true', default=False,
+                       help='debugging: have the wine MumbleLink reader '
+                            'process write JSON instead of binary frames')
+        p.add_argument('--export-cache', dest='export_cache', action='store',
+                       type=str, default=None, metavar='FILE',
+                       help='write the contents of the cache directory to a '
+                            'compressed, checksummed bundle at FILE and exit')
+        p.add_argument('--import-cache', dest='import_cache', action='store',
+                       type=str, default=None, metavar='FILE',
+                       help='validate and unpack a bundle written with '
+                            '--export-cache into the cache directory and exit')
+        p.add_argument('--bundle-tiles', dest='bundle_tiles',
+                       action='store_true', default=False,
+                       help='include map tiles in --export-cache bundle')
         lf = os.path.abspath(
             os.path.expanduser('~/.gw2copilot/logs/')
         )
@@ -120,6 +231,17 @@ class Runner(object):
                        default=lf, help='directory to write log files in; '
                        'set to "none" to disable writing log files')
         args = p.parse_args(argv)
+        if args.export_cache is not None and args.import_cache is not None:
+            p.error('--export-cache and --import-cache are mutually exclusive')
+        if args.poll_min > args.poll_max:
+            p.error('--poll-min must not be greater than --poll-max')
+        if args.replay_speed < 0:
+            p.error('--replay-speed must not be negative')
+        if args.mumble_push_rate < 0:
+            p.error('--mumble-push-rate must not be negative')
+        if args.import_cache is not None:
+            # no API access needed
+            return args
         if args.api_key is None:
             k = os.environ.get('GW2_API_KEY', None)
             if k is None:
@@ -138,17 +260,92 @@ class Runner(object):
             set_log_debug()
         if args.logpath != 'none':
             set_log_file(args.logpath, args.verbose)
+        if args.export_cache is not None:
+            self.export_cache(args)
+            return
+        if args.import_cache is not None:
+            self.import_cache(args)
+            return
+        profiler = PhaseTimer() if args.profile_startup else None
+        timer = profiler if profiler is not None else PhaseTimer()
+        # twisted, klein, jinja2 and autobahn are only imported once we know
+        # we're actually going to run the server
+        with timer.phase('imports'):
+            from .server import TwistedServer
 
         s = TwistedServer(
             poll_interval=args.poll_interval,
+            poll_min=args.poll_min,
+            poll_max=args.poll_max,
+            mumble_shm=args.mumble_shm,
+            mumble_names=args.mumble_names,
+            trails=args.trails,
+            prefetch=args.prefetch,
+            record=args.record,
+            replay=args.replay,
+            replay_speed=args.replay_speed,
             bind_port=args.bind_port,
             test=args.test_mumble,
             cache_dir=args.cache_dir,
             ws_port=args.ws_port,
-            api_key=args.api_key
+            api_key=args.api_key,
+            gw2timer_refresh=args.gw2timer_refresh,
+            profiler=profiler,
+            webp_tiers=self._webp_tiers(args),
+            tile_threads=args.tile_threads,
+            tile_synthesis=args.tile_synthesis,
+            mumble_json=args.mumble_json,
+            mumble_push_rate=(args.mumble_push_rate or None)
         )
         s.run()
 
+    def _webp_tiers(self, args):
+        """
+        Return the WebP tiers to pass to :py:class:`~.TwistedServer`; None if
+        tile transcoding is disabled.
+
+        :param args: parsed arguments
+        :type args: :py:class:`argparse.Namespace`
+        :rtype: dict
+        """
+        if args.webp_tiers is not None:
+            return dict(args.webp_tiers)
+        if args.webp_tiles:
+            from .tile_transcoder import DEFAULT_WEBP_TIERS
+            return DEFAULT_WEBP_TIERS
+        return None
+
+    def export_cache(self, args):
+        """
+        Handle ``--export-cache``; write a cache bundle.
+
+        :param args: parsed arguments
+        :type args: :py:class:`argparse.Namespace`
+        """
+        from .caching_api_client import CachingAPIClient
+        from .cache_bundle import export_cache_bundle
+        client = CachingAPIClient(args.cache_dir, api_key=args.api_key)
+        manifest = export_cache_bundle(
+            args.cache_dir, args.export_cache, build_id=client.build_id(),
+            include_tiles=args.bundle_tiles
+        )
+        print('Exported %d files (game build %s) to %s' % (
+            len(manifest['files']), manifest['build_id'], args.export_cache))
+
+    def import_cache(self, args):
+        """
+        Handle ``--import-cache``; unpack a cache bundle.
+
+        :param args: parsed arguments
+        :type args: :py:class:`argparse.Namespace`
+        """
+        from .cache_bundle import import_cache_bundle
+        if not os.path.exists(args.cache_dir):
+            os.makedirs(args.cache_dir, 0700)
+        manifest = import_cache_bundle(args.import_cache, args.cache_dir)
+        print('Imported %d files (game build %s) into %s' % (
+            len(manifest['files']), manifest['build_id'], args.cache_dir))
+
 
 def set_log_file(logdir, verbosity):
     """
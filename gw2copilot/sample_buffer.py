@@ -0,0 +1,260 @@
+"""
+gw2copilot/sample_buffer.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import math
+from array import array
+from collections import namedtuple
+
+#: default number of samples kept by :py:class:`~.SampleBuffer`
+DEFAULT_CAPACITY = 512
+
+#: one player sample; ``x`` and ``y`` are continent coordinates and
+#: ``heading`` is the facing direction in degrees
+Sample = namedtuple(
+    'Sample', ['timestamp', 'tick', 'x', 'y', 'elevation', 'heading', 'map_id']
+)
+
+
+def _angle_diff(a, b):
+    """
+    Return the signed difference ``b - a`` between two angles in degrees,
+    in the range [-180, 180).
+
+    :rtype: float
+    """
+    return (b - a + 180.0) % 360.0 - 180.0
+
+
+class SampleBuffer(object):
+    """
+    Fixed-size ring buffer of timestamped player samples, fed by
+    :py:meth:`~.PlayerInfo.update_mumble_link`. Each field is stored in its
+    own preallocated :py:class:`array.array`, so appending is O(1) and
+    allocates nothing; once full, the oldest sample is overwritten.
+
+    Samples are indexed like a list, oldest first (``buf[-1]`` is the latest
+    one), and returned as :py:class:`~.Sample` tuples.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        :param capacity: maximum number of samples kept
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self._timestamp = array('d', [0.0]) * capacity
+        self._tick = array('L', [0]) * capacity
+        self._x = array('d', [0.0]) * capacity
+        self._y = array('d', [0.0]) * capacity
+        self._elevation = array('d', [0.0]) * capacity
+        self._heading = array('d', [0.0]) * capacity
+        self._map_id = array('l', [0]) * capacity
+        # index the next sample will be written at
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, timestamp, tick, x, y, elevation, heading, map_id):
+        """
+        Add a sample, overwriting the oldest one if the buffer is full.
+
+        :param timestamp: time of the sample, in seconds since the epoch
+        :type timestamp: float
+        :param tick: MumbleLink ``uiTick``
+        :type tick: int
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :param elevation: elevation
+        :type elevation: float
+        :param heading: facing direction in degrees
+        :type heading: float
+        :param map_id: map ID
+        :type map_id: int
+        """
+        i = self._next
+        self._timestamp[i] = timestamp
+        self._tick[i] = tick
+        self._x[i] = x
+        self._y[i] = y
+        self._elevation[i] = elevation
+        self._heading[i] = heading
+        self._map_id[i] = map_id
+        self._next = (i + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+    def clear(self):
+        """Remove all samples."""
+        self._next = 0
+        self._len = 0
+
+    def _index(self, i):
+        """
+        Return the array index of the ``i``-th oldest sample; negative ``i``
+        count back from the latest one.
+
+        :rtype: int
+        :raises: IndexError if out of range
+        """
+        if i < 0:
+            i += self._len
+        if i < 0 or i >= self._len:
+            raise IndexError('sample index out of range')
+        return (self._next - self._len + i) % self.capacity
+
+    def __getitem__(self, i):
+        j = self._index(i)
+        return Sample(
+            self._timestamp[j], self._tick[j], self._x[j], self._y[j],
+            self._elevation[j], self._heading[j], self._map_id[j]
+        )
+
+    @property
+    def latest(self):
+        """
+        Return the latest sample.
+
+        :return: latest sample, or None if there are none
+        :rtype: :py:class:`~.Sample`
+        """
+        if self._len == 0:
+            return None
+        return self[-1]
+
+    def _window_start(self, seconds):
+        """
+        Return the position (as for ``__getitem__``) of the oldest sample in
+        the window of ``seconds`` ending at the latest sample, not going back
+        past a map change.
+
+        :param seconds: window length
+        :type seconds: float
+        :return: start position; ``len(self)`` if the buffer is empty
+        :rtype: int
+        """
+        if self._len == 0:
+            return 0
+        last = self._index(-1)
+        cutoff = self._timestamp[last] - seconds
+        map_id = self._map_id[last]
+        start = self._len - 1
+        while start > 0:
+            j = self._index(start - 1)
+            if self._timestamp[j] < cutoff or self._map_id[j] != map_id:
+                break
+            start -= 1
+        return start
+
+    def window(self, seconds):
+        """
+        Return the samples from the last ``seconds`` seconds (relative to the
+        latest sample) on the current map, oldest first.
+
+        :param seconds: window length
+        :type seconds: float
+        :return: list of :py:class:`~.Sample`
+        :rtype: list
+        """
+        return [self[i] for i in range(self._window_start(seconds), self._len)]
+
+    def velocity(self, seconds=1.0):
+        """
+        Return the average velocity over the window of ``seconds`` seconds
+        ending at the latest sample, in continent units per second.
+
+        :param seconds: window length
+        :type seconds: float
+        :return: 2-tuple of (x, y) velocity, (0.0, 0.0) if there are not
+          enough samples
+        :rtype: tuple
+        """
+        if self._len < 2:
+            return 0.0, 0.0
+        first = self._index(self._window_start(seconds))
+        last = self._index(-1)
+        dt = self._timestamp[last] - self._timestamp[first]
+        if dt <= 0:
+            return 0.0, 0.0
+        return (
+            (self._x[last] - self._x[first]) / dt,
+            (self._y[last] - self._y[first]) / dt
+        )
+
+    def speed(self, seconds=1.0):
+        """
+        Return the average speed over the window of ``seconds`` seconds
+        ending at the latest sample, in continent units per second.
+
+        :param seconds: window length
+        :type seconds: float
+        :rtype: float
+        """
+        vx, vy = self.velocity(seconds)
+        return math.hypot(vx, vy)
+
+    def heading_rate(self, seconds=1.0):
+        """
+        Return the average rate of turning over the window of ``seconds``
+        seconds ending at the latest sample, in degrees per second; positive
+        when the heading is increasing.
+
+        :param seconds: window length
+        :type seconds: float
+        :rtype: float
+        """
+        if self._len < 2:
+            return 0.0
+        start = self._window_start(seconds)
+        first = self._index(start)
+        last = self._index(-1)
+        dt = self._timestamp[last] - self._timestamp[first]
+        if dt <= 0:
+            return 0.0
+        # sum successive differences, so turns of over 180 degrees count
+        total = 0.0
+        prev = self._heading[first]
+        for i in range(start + 1, self._len):
+            cur = self._heading[self._index(i)]
+            total += _angle_diff(prev, cur)
+            prev = cur
+        return total / dt
@@ -42,20 +42,24 @@ import logging
 import platform
 import os
 import json
-from datetime import datetime
+from functools import partial
 from twisted.web.server import Site
 from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread, deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 from twisted.python import log
 from autobahn.twisted.websocket import listenWS
-from versionfinder import find_version
 
 import gw2copilot.site
 import gw2copilot.api
-from .wine_mumble_reader import WineMumbleLinkReader
-from .native_mumble_reader import NativeMumbleLinkReader
-from .test_mumble_reader import TestMumbleLinkReader
-from .playerinfo import PlayerInfo
+from .sessions import SessionManager, DEFAULT_LINK_NAME
 from .caching_api_client import CachingAPIClient
+from .warmup import CacheWarmer
+from .poll_scheduler import PollScheduler
+from .prefetch import ZonePrefetcher
+from .trail import TrailStore, FLUSH_INTERVAL as TRAIL_FLUSH_INTERVAL
+from .utils import PhaseTimer
 from .websockets import BroadcastServerFactory, BroadcastServerProtocol
 
 logger = logging.getLogger(__name__)
@@ -76,7 +80,12 @@ class TwistedServer(object):
     """
 
     def __init__(self, poll_interval=5.0, bind_port=8080, test=None,
-                 cache_dir=None, ws_port=8081, api_key=None):
+                 cache_dir=None, ws_port=8081, api_key=None,
+                 gw2timer_refresh=86400, profiler=None, webp_tiers=None,
+                 tile_threads=2, tile_synthesis=True, mumble_json=False,
+                 mumble_push_rate=None, poll_min=0.1, poll_max=5.0,
+                 mumble_shm=None, record=None, replay=None, replay_speed=1.0,
+                 mumble_names=None, trails=True, prefetch=True):
         """
         Initialize the Twisted Server, the heart of the application...
 
@@ -94,13 +103,78 @@ class TwistedServer(object):
         :type ws_port: int
         :param api_key: GW2 API Key
         :type api_key: str
+        :param gw2timer_refresh: interval in seconds at which to re-download
+          gw2timer.com data in the background
+        :type gw2timer_refresh: int
+        :param profiler: if not None, record startup phase timings in this
+          PhaseTimer and log a report once cache warm-up is complete
+        :type profiler: :py:class:`~.PhaseTimer`
+        :param webp_tiers: if not None, transcode tiles to WebP for clients
+          that accept it; dict of tier name to WebP quality
+        :type webp_tiers: dict
+        :param tile_threads: number of tile worker threads (WebP transcoding
+          and tile synthesis)
+        :type tile_threads: int
+        :param tile_synthesis: whether to serve provisional tiles synthesized
+          from cached neighboring zoom levels on tile cache misses
+        :type tile_synthesis: bool
+        :param mumble_json: have the wine MumbleLink reader process write JSON
+          instead of binary frames, for debugging
+        :type mumble_json: bool
+        :param mumble_push_rate: if not None, have the wine MumbleLink reader
+          process poll this many times per second and push each change,
+          rather than polling every ``poll_interval`` seconds
+        :type mumble_push_rate: float
+        :param poll_min: shortest adaptive MumbleLink poll interval in seconds,
+          used while the player or camera is moving
+        :type poll_min: float
+        :param poll_max: longest adaptive MumbleLink poll interval in seconds,
+          backed off to while nothing moves
+        :type poll_max: float
+        :param mumble_shm: if not None, read MumbleLink from this file-backed
+          shared memory segment with :py:class:`~.ShmMumbleLinkReader`
+          instead of the platform default reader
+        :type mumble_shm: str
+        :param record: if not None, record all MumbleLink updates to this
+          file with :py:class:`~.MumbleRecorder`
+        :type record: str
+        :param replay: if not None, play back this MumbleLink recording with
+          :py:class:`~.ReplayMumbleLinkReader` instead of reading MumbleLink
+        :type replay: str
+        :param replay_speed: playback speed for ``replay``, as a multiple of
+          real time; 0 for as fast as possible
+        :type replay_speed: float
+        :param mumble_names: MumbleLink names (the game's ``-mumble``
+          argument) to read, one :py:class:`~.MumbleSession` per game client;
+          defaults to just :py:data:`~.DEFAULT_LINK_NAME`
+        :type mumble_names: list
+        :param trails: whether to record each character's position trail
+          (see :py:class:`~.TrailStore`) under ``cache_dir``
+        :type trails: bool
+        :param prefetch: whether to warm the cache with the tiles of each map
+          a player enters, and with the maps reachable from it (see
+          :py:class:`~.ZonePrefetcher`); the map's own data is always
+          retrieved in the background
+        :type prefetch: bool
         """
-        self.ver_info = find_version('gw2copilot')
+        self._profile_startup = profiler is not None
+        self._profiler = profiler
+        if profiler is None:
+            # still time phases, just don't report them
+            self._profiler = PhaseTimer()
+        with self._profiler.phase('version lookup'):
+            # versionfinder is slow to import and only needed here
+            from versionfinder import find_version
+            self.ver_info = find_version('gw2copilot')
         logger.info('Installed version: %s', self.ver_info.long_str)
         self._poll_interval = poll_interval
+        self._poll_min = poll_min
+        self._poll_max = poll_max
         self._bind_port = bind_port
         self._api_key = api_key
         self._ws_port = ws_port
+        self._gw2timer_refresh = gw2timer_refresh
+        self._gw2timer_loop = None
         self.reactor = reactor
         self._site = None
         self._api = None
@@ -112,50 +186,306 @@ class TwistedServer(object):
             cache_dir = cd
         self._cache_dir = cache_dir
         self.cache = CachingAPIClient(cache_dir, api_key=api_key)
-        self.cache.fill_persistent_cache()
-        # saved state:
-        self._mumble_link_data = None
-        self._mumble_update_datetime = None
-        self._mumble_reader = None
+        # image processing for tiles is done in its own thread pool
+        self._tile_pool = ThreadPool(minthreads=0, maxthreads=tile_threads,
+                                     name='tile-workers')
+        self.tile_transcoder = None
+        if webp_tiers is not None:
+            self._setup_tile_transcoder(webp_tiers)
+        self.tile_synthesizer = None
+        if tile_synthesis:
+            from .tile_synth import TileSynthesizer
+            self.tile_synthesizer = TileSynthesizer(
+                self.reactor, self._tile_pool, self.cache)
+        self._tile_fetches = set()
+        #: background cache warmer for maps players enter; with prefetch
+        #: disabled, it only retrieves the map data PlayerInfo needs
+        self.prefetcher = ZonePrefetcher(
+            self.cache,
+            partial(deferToThreadPool, self.reactor, self._tile_pool),
+            neighbors=prefetch, tiles=prefetch)
+        # the persistent cache is filled in the background after we start
+        # listening; see _setup_warmup()
+        self.warmer = CacheWarmer(self)
+        self._setup_warmup()
         self._test = test
-        self.playerinfo = PlayerInfo(self.cache)
-        self._pi_position = None
-        self._pi_player_dict = None
+        self._mumble_json = mumble_json
+        self._mumble_push_rate = mumble_push_rate
+        self._mumble_shm = mumble_shm
+        self._replay = replay
+        self._replay_speed = replay_speed
+        self._recorder = None
+        if record is not None:
+            from .mumble_recording import MumbleRecorder
+            self._recorder = MumbleRecorder(record)
+        #: position trail store; None if disabled
+        self.trails = None
+        if trails:
+            self.trails = TrailStore(os.path.join(cache_dir, 'trails'),
+                                     run=deferToThread)
+        if not mumble_names:
+            mumble_names = [DEFAULT_LINK_NAME]
+        #: one MumbleSession per game client
+        self.sessions = SessionManager(self, mumble_names,
+                                       recorder=self._recorder,
+                                       trails=self.trails,
+                                       prefetcher=self.prefetcher)
+
+    def _setup_tile_transcoder(self, tiers):
+        """
+        Set ``self.tile_transcoder`` to a :py:class:`~.TileTranscoder`, if
+        PIL supports WebP.
+
+        :param tiers: dict of tier name to WebP quality
+        :type tiers: dict
+        """
+        from .tile_transcoder import TileTranscoder, webp_supported
+        if not webp_supported():
+            logger.error('PIL/Pillow was built without WebP support; tiles '
+                         'will not be transcoded')
+            return
+        self.tile_transcoder = TileTranscoder(
+            self.reactor, self._tile_pool, tiers=tiers)
+
+    def _start_tile_pool(self):
+        """
+        Start the tile worker thread pool, and arrange for it to be stopped
+        at reactor shutdown.
+        """
+        self._tile_pool.start()
+        self.reactor.addSystemEventTrigger(
+            'before', 'shutdown', self._tile_pool.stop)
+
+    def fetch_tile_in_background(self, continent, floor, zoom, x, y):
+        """
+        Retrieve a tile from the tile service into the cache in a thread (if
+        it isn't already being retrieved), and send a ``tile_ready``
+        websocket message when it's available. Used after serving a
+        provisional tile from :py:class:`~.TileSynthesizer`.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        :param x: x coordinate
+        :type x: int
+        :param y: y coordinate
+        :type y: int
+        """
+        key = (continent, floor, zoom, x, y)
+        if key in self._tile_fetches:
+            return
+        self._tile_fetches.add(key)
+        d = deferToThread(self.cache.tile, *key)
+        d.addCallback(self._tile_fetched, key)
+        d.addErrback(self._tile_fetch_failed, key)
+
+    def _tile_fetched(self, data, key):
+        """
+        Callback for :py:meth:`~.fetch_tile_in_background`; tell clients the
+        real tile is available.
+
+        :param data: tile content, or None if unavailable
+        :type data: str
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        """
+        self._tile_fetches.discard(key)
+        if data is None:
+            return
+        self._ws_send('tile_ready', dict(zip(
+            ['continent', 'floor', 'zoom', 'x', 'y'], key)))
+
+    def _tile_fetch_failed(self, failure, key):
+        """
+        Errback for :py:meth:`~.fetch_tile_in_background`.
+
+        :param failure: the failure
+        :type failure: twisted.python.failure.Failure
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        """
+        self._tile_fetches.discard(key)
+        logger.error('Background fetch of tile %s failed: %s', key,
+                     failure.getErrorMessage())
 
-    def update_mumble_data(self, mumble_data):
+    def update_mumble_data(self, mumble_data, partial=False):
         """
-        Process an update to the MumbleLink data. This should be called by
-        MumbleLink readers to pass back data; they should NOT write directly
-        to instance variables.
+        Process an update to the default session's MumbleLink data; see
+        :py:meth:`~.MumbleSession.update_mumble_data`.
 
         :param mumble_data: Raw data received from GW2 via MumbleLink
         :type mumble_data: dict
+        :param partial: if True, ``mumble_data`` only contains some fields,
+          to be merged into the current state
+        :type partial: bool
+        :return: set of top-level MumbleLink fields that changed, or None if
+          the update was ignored
+        :rtype: set
         """
-        logger.debug("Updating mumble data: %s", mumble_data)
-        self._mumble_link_data = mumble_data
-        self._mumble_update_datetime = datetime.now()
-        self.playerinfo.update_mumble_link(mumble_data)
-        if self.playerinfo.player_dict != self._pi_player_dict:
-            logger.debug('player_dict changed')
-            self._pi_player_dict = self.playerinfo.player_dict
-            self._ws_send('player_dict', self._pi_player_dict)
-        if self.playerinfo.position != self._pi_position:
-            logger.debug('position changed')
-            self._pi_position = self.playerinfo.position
-            self._ws_send('position', self._pi_position)
-
-    def _ws_send(self, msg_type, data):
+        return self.sessions.default.update_mumble_data(
+            mumble_data, partial=partial)
+
+    @property
+    def playerinfo(self):
+        """
+        Return the default session's :py:class:`~.PlayerInfo`.
+
+        :rtype: :py:class:`~.PlayerInfo`
+        """
+        return self.sessions.default.playerinfo
+
+    def _ws_send(self, msg_type, data, session=None):
         """
         Send the given data to all clients via websocket broadcast.
 
-        :param msg_type: type of message; "tick", "position", "player_dict"
+        :param msg_type: type of message; "tick", "player_dict", "motion",
+          "gw2timer_data", "warmup", "tile_ready"
         :type msg_type: str
         :param data: JSON-serializable data dict
         :type data: dict
+        :param session: for messages about one game client, the name of its
+          :py:class:`~.MumbleSession`; sent as the message's ``session`` key
+        :type session: str
         """
-        msg = json.dumps({'type': msg_type, 'data': data})
+        if self._ws_broadcast is None:
+            return
+        msg = {'type': msg_type, 'data': data}
+        if session is not None:
+            msg['session'] = session
+        msg = json.dumps(msg)
         self._ws_broadcast.broadcast(msg)
 
+    def _setup_warmup(self):
+        """
+        Add the cache warm-up steps to ``self.warmer``, in priority order:
+        the map catalog (needed to compute positions and by the live map),
+        map icon assets, and then third-party gw2timer.com data (whose travel
+        paths need the map catalog).
+        """
+        self.warmer.add_step(
+            'map_catalog', 'Map catalog', self.cache.fill_map_catalog)
+        self.warmer.add_step(
+            'assets', 'Map icon assets', self.cache.get_gw2_api_files)
+        self.warmer.add_step(
+            'gw2timer', 'gw2timer.com data',
+            lambda _: self._refresh_gw2timer_data(ttl=self._gw2timer_refresh),
+            threaded=False
+        )
+
+    def _start_warmup(self):
+        """
+        Start the cache warm-up; once finished, start the periodic gw2timer
+        data refresh.
+        """
+        d = self.warmer.start()
+        d.addCallback(lambda _: self._warmup_finished())
+        d.addErrback(logger.error)
+
+    def _warmup_finished(self):
+        """
+        Called when the cache warm-up is complete; start the periodic gw2timer
+        refresh and, if requested, report startup phase timings.
+        """
+        self._profiler.record('cache warm-up', self.warmer.duration)
+        for step in self.warmer.status['steps']:
+            self._profiler.record(
+                'cache warm-up: %s' % step['name'], step['duration'])
+        if self._profile_startup:
+            logger.warning(self._profiler.report())
+        self._schedule_gw2timer_refresh()
+
+    def _schedule_gw2timer_refresh(self):
+        """
+        Refresh gw2timer.com data unconditionally every
+        ``self._gw2timer_refresh`` seconds. The initial refresh is done as
+        part of the cache warm-up.
+        """
+        logger.info('Refreshing gw2timer data every %s seconds',
+                    self._gw2timer_refresh)
+        l = LoopingCall(self._refresh_gw2timer_data, ttl=0)
+        l.clock = self.reactor
+        self._gw2timer_loop = l
+        d = l.start(self._gw2timer_refresh, now=False)
+        d.addErrback(logger.error)
+
+    def _schedule_trail_flush(self):
+        """
+        Flush position trails to disk every :py:data:`~.trail.FLUSH_INTERVAL`
+        seconds, so little is lost if the process is killed.
+        """
+        l = LoopingCall(self.trails.flush)
+        l.clock = self.reactor
+        self._trail_flush_loop = l
+        d = l.start(TRAIL_FLUSH_INTERVAL, now=False)
+        d.addErrback(logger.error)
+
+    def _refresh_gw2timer_data(self, ttl):
+        """
+        Run :py:meth:`~.CachingAPIClient.refresh_gw2timer_data` in a thread,
+        and notify websocket clients of any files that changed.
+
+        :param ttl: re-download files at least this many seconds old
+        :type ttl: int
+        :return: Deferred that fires when the refresh is complete
+        :rtype: twisted.internet.defer.Deferred
+        """
+        d = deferToThread(self.cache.refresh_gw2timer_data, ttl=ttl)
+        d.addCallback(self._gw2timer_data_refreshed)
+        # never errback, or the LoopingCall would stop
+        d.addErrback(lambda f: logger.error(
+            'Error refreshing gw2timer data: %s', f.getTraceback()))
+        return d
+
+    def _gw2timer_data_refreshed(self, changed):
+        """
+        Callback for :py:meth:`~._refresh_gw2timer_data`; tell websocket
+        clients to reload changed files.
+
+        :param changed: list of changed gw2timer cache keys
+        :type changed: list
+        """
+        if len(changed) == 0:
+            logger.debug('gw2timer data unchanged')
+            return
+        logger.info('gw2timer data changed: %s', changed)
+        self._ws_send('gw2timer_data', {'files': changed})
+
+    @property
+    def poll_interval(self):
+        """
+        Return the MumbleLink poll interval in seconds.
+
+        :return: MumbleLink poll interval
+        :rtype: float
+        """
+        return self._poll_interval
+
+    def make_poll_scheduler(self, poll):
+        """
+        Return a :py:class:`~.PollScheduler` for a MumbleLink reader, using
+        our poll interval settings. The reader must start it.
+
+        :param poll: callable to poll MumbleLink
+        :type poll: callable
+        :return: poll scheduler
+        :rtype: :py:class:`~.PollScheduler`
+        """
+        return PollScheduler(self.reactor, poll, self._poll_interval,
+                             self._poll_min, self._poll_max)
+
+    @property
+    def mumble_poll_status(self):
+        """
+        Return the default session's MumbleLink poll rate information; see
+        :py:attr:`~.MumbleSession.poll_status`.
+
+        :rtype: dict
+        """
+        return self.sessions.default.poll_status
+
     @property
     def ws_port(self):
         """
@@ -171,20 +501,21 @@ class TwistedServer(object):
         """
         Return the datetime when mumble link data was last updated.
 
-        :return: datetime when mumble link data was last updated
+        :return: datetime when the default session's mumble link data was last
+          updated
         :rtype: datetime.datetime
         """
-        return self._mumble_update_datetime
+        return self.sessions.default.mumble_update_datetime
 
     @property
     def raw_mumble_link_data(self):
         """
         Return the current raw mumble link data.
 
-        :return: current raw MumbleLink data
+        :return: the default session's current raw MumbleLink data
         :rtype: dict
         """
-        return self._mumble_link_data
+        return self.sessions.default.raw_mumble_link_data
 
     def _run_reactor(self):
         """Method to run the Twisted reactor; mock point for testing"""
@@ -212,24 +543,53 @@ class TwistedServer(object):
     def _add_mumble_reader(self):
         """
         Figure out what platform we're on, and instantiate the right
-        MumbleReader class for it.
+        MumbleReader class for each session.
+        """
+        for session in self.sessions:
+            session.reader = self._make_mumble_reader(session)
+
+    def _make_mumble_reader(self, session):
+        """
+        Instantiate the right MumbleReader class for a session.
+
+        :param session: the session the reader will feed
+        :type session: :py:class:`~.MumbleSession`
+        :return: MumbleLink reader
         """
+        # reader modules are imported here, as only one is needed per run
         if self._test:
             logger.warning('Using TestMumbleLinkReader - TEST DATA ONLY')
-            self._mumble_reader = TestMumbleLinkReader(
-                self, self._poll_interval, self._test)
-        elif platform.system() == 'Linux':
+            from .test_mumble_reader import TestMumbleLinkReader
+            return TestMumbleLinkReader(
+                session, self._poll_interval, self._test)
+        if self._replay is not None:
+            if session is not self.sessions.default:
+                logger.warning('Not replaying into session %s; only the '
+                               'default session is replayed', session.name)
+                return None
+            from .replay_mumble_reader import ReplayMumbleLinkReader
+            return ReplayMumbleLinkReader(
+                session, self._replay, speed=self._replay_speed)
+        if self._mumble_shm is not None:
+            logger.debug("Using ShmMumbleLinkReader")
+            from .shm_mumble_reader import ShmMumbleLinkReader, shm_path
+            return ShmMumbleLinkReader(
+                session, self._poll_interval,
+                path=shm_path(self._mumble_shm, session.name))
+        if platform.system() == 'Linux':
             logger.debug("Using WineMumbleLinkReader on Linux platform")
-            self._mumble_reader = WineMumbleLinkReader(
-                self, self._poll_interval)
-        elif platform.system() == 'Windows':
+            from .wine_mumble_reader import WineMumbleLinkReader
+            return WineMumbleLinkReader(
+                session, self._poll_interval, json_frames=self._mumble_json,
+                push_rate=self._mumble_push_rate, name=session.name)
+        if platform.system() == 'Windows':
             logger.debug("Using NativeMumbleLinkReader on Windows platform")
-            self._mumble_reader = NativeMumbleLinkReader(
-                self, self._poll_interval)
-        else:
-            raise NotImplementedError("ERROR: don't know how to read"
-                                      "MumbleLink on unsupported platform "
-                                      "%s" % platform.system())
+            from .native_mumble_reader import NativeMumbleLinkReader
+            return NativeMumbleLinkReader(
+                session, self._poll_interval, name=session.name)
+        raise NotImplementedError("ERROR: don't know how to read"
+                                  "MumbleLink on unsupported platform "
+                                  "%s" % platform.system())
 
     def _setup_klein(self):
         """
@@ -259,12 +619,25 @@ class TwistedServer(object):
         """setup the web Site, start listening on port, setup the MumbleLink
         reader, and start the Twisted reactor"""
         # setup the web Site and HTTP listener
-        self._setup_klein()
-        self._setup_websockets()
-        self._listentcp(Site(self._site.resource))
-        self._listenWS()
+        with self._profiler.phase('route setup'):
+            self._setup_klein()
+            self._setup_websockets()
+        with self._profiler.phase('listener bind'):
+            self._listentcp(Site(self._site.resource))
+            self._listenWS()
         # setup the MumbleLink reader
-        self._add_mumble_reader()
+        with self._profiler.phase('MumbleLink reader setup'):
+            self._add_mumble_reader()
+        self.reactor.callWhenRunning(self._start_tile_pool)
+        # fill the cache in the background once the reactor is running
+        self.reactor.callWhenRunning(self._start_warmup)
+        if self._recorder is not None:
+            self.reactor.addSystemEventTrigger(
+                'before', 'shutdown', self._recorder.close)
+        if self.trails is not None:
+            self.reactor.callWhenRunning(self._schedule_trail_flush)
+            self.reactor.addSystemEventTrigger(
+                'before', 'shutdown', self.trails.close)
         # run the main reactor event loop
         logger.warning('Starting Twisted reactor (event loop)')
         self._run_reactor()
@@ -0,0 +1,441 @@
+"""
+gw2copilot/sessions.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from .playerinfo import PlayerInfo
+
+logger = logging.getLogger(__name__)
+
+#: MumbleLink shared memory name used by the game unless started with
+#: ``-mumble <name>``
+DEFAULT_LINK_NAME = 'MumbleLink'
+
+#: window, in seconds, of recent samples used to compute ``motion`` messages
+MOTION_WINDOW = 0.5
+
+#: shortest time, in seconds, between ``motion`` messages while the player
+#: moves; clients extrapolate in between
+MOTION_INTERVAL = 0.2
+
+#: while the current map's data isn't cached, how often (in seconds) to
+#: check the cache again and restart the prefetch job that should retrieve it
+MAP_RETRY_INTERVAL = 10.0
+
+
+class MumbleSession(object):
+    """
+    MumbleLink state for one game client: the latest data, a
+    :py:class:`~.PlayerInfo` and the MumbleLink reader. Readers are given the
+    session as their parent server; it provides the parts of the
+    :py:class:`~.TwistedServer` interface they use (``reactor``, ``warmer``,
+    ``playerinfo``, :py:meth:`~.update_mumble_data` and
+    :py:meth:`~.make_poll_scheduler`), delegating to the real server where
+    state is shared. Every session shares the server's
+    :py:class:`~.CachingAPIClient`, and with it the map catalog.
+    """
+
+    def __init__(self, server, name, recorder=None, trails=None,
+                 prefetcher=None):
+        """
+        :param server: the server this session belongs to
+        :type server: :py:class:`~.TwistedServer`
+        :param name: MumbleLink name (the game's ``-mumble`` argument)
+        :type name: str
+        :param recorder: if not None, record every update with this
+        :type recorder: :py:class:`~.MumbleRecorder`
+        :param trails: if not None, record the player's position trail in
+          this
+        :type trails: :py:class:`~.TrailStore`
+        :param prefetcher: if not None, warm the cache for each map the
+          player enters with this
+        :type prefetcher: :py:class:`~.ZonePrefetcher`
+        """
+        self.server = server
+        self.name = name
+        self.playerinfo = PlayerInfo(server.cache)
+        #: the MumbleLink reader feeding this session
+        self.reader = None
+        self._recorder = recorder
+        self._trails = trails
+        self._prefetcher = prefetcher
+        #: the running :py:class:`~.PrefetchJob` for the current map
+        self.prefetch_job = None
+        # the prefetch job whose map data PlayerInfo last checked for, and
+        # when; see _check_pending_map
+        self._map_checked_job = None
+        self._map_checked_at = 0
+        self._mumble_link_data = None
+        self._mumble_update_datetime = None
+        self._pi_moving = False
+        # position changed since the last motion message
+        self._motion_due = False
+        self._motion_sent_at = 0
+        self._motion_map_id = None
+
+    @property
+    def reactor(self):
+        """
+        Return the server's reactor.
+
+        :rtype: twisted.internet.reactor
+        """
+        return self.server.reactor
+
+    @property
+    def warmer(self):
+        """
+        Return the server's :py:class:`~.CacheWarmer`.
+
+        :rtype: :py:class:`~.CacheWarmer`
+        """
+        return self.server.warmer
+
+    def make_poll_scheduler(self, poll):
+        """
+        Return a :py:class:`~.PollScheduler` for this session's reader; see
+        :py:meth:`~.TwistedServer.make_poll_scheduler`.
+
+        :param poll: callable to poll MumbleLink
+        :type poll: callable
+        :rtype: :py:class:`~.PollScheduler`
+        """
+        return self.server.make_poll_scheduler(poll)
+
+    def update_mumble_data(self, mumble_data, partial=False):
+        """
+        Process an update to the MumbleLink data. This should be called by
+        MumbleLink readers to pass back data; they should NOT write directly
+        to instance variables.
+
+        The merged MumbleLink state is kept here; the set of top-level fields
+        that changed is passed on to
+        :py:meth:`~.PlayerInfo.update_mumble_link` so that it can skip work
+        that doesn't depend on them.
+
+        :param mumble_data: Raw data received from GW2 via MumbleLink
+        :type mumble_data: dict
+        :param partial: if True, ``mumble_data`` only contains some fields
+          (a delta frame from :py:class:`~.DeltaEncoder` or
+          :py:class:`~.BinaryFrameEncoder`), to be merged into the current
+          state
+        :type partial: bool
+        :return: set of top-level MumbleLink fields that changed, or None if
+          the update was ignored
+        :rtype: set
+        """
+        logger.debug("Updating mumble data for %s (partial=%s): %s",
+                     self.name, partial, mumble_data)
+        prev = self._mumble_link_data
+        if partial and prev is None:
+            logger.warning('Ignoring MumbleLink delta received before any '
+                           'keyframe')
+            return None
+        if prev is None:
+            changed = set(mumble_data.keys())
+        else:
+            changed = set(
+                k for k in mumble_data
+                if k not in prev or prev[k] != mumble_data[k]
+            )
+        if partial:
+            merged = dict(prev)
+            merged.update(mumble_data)
+            mumble_data = merged
+        self._mumble_link_data = mumble_data
+        self._mumble_update_datetime = datetime.now()
+        if self._recorder is not None:
+            self._recorder.record(mumble_data)
+        if self.playerinfo.map_pending:
+            self._check_pending_map()
+        self.playerinfo.update_mumble_link(mumble_data, changed=changed)
+        if self.playerinfo.map_changed and self._prefetcher is not None:
+            self._prefetch()
+        if self.playerinfo.player_changed:
+            logger.debug('player_dict changed')
+            self._ws_send('player_dict', self.playerinfo.player_dict)
+        if self.playerinfo.position_changed:
+            logger.debug('position changed')
+            latest = self.playerinfo.samples.latest
+            if self._trails is not None:
+                self._trails.record(
+                    self.character_name, latest.timestamp, latest.map_id,
+                    latest.x, latest.y)
+            self._motion_due = True
+            if latest.map_id != self._motion_map_id or \
+                    time.time() - self._motion_sent_at >= MOTION_INTERVAL:
+                self._send_motion(True)
+        elif self._pi_moving or self._motion_due:
+            # send the final position, and tell clients to stop
+            # extrapolating
+            self._send_motion(False)
+        return changed
+
+    def _prefetch(self):
+        """
+        Cancel prefetching for the previous map, and start it for the
+        current one.
+        """
+        if self.prefetch_job is not None:
+            self.prefetch_job.cancel()
+        position = None
+        if not self.playerinfo.map_pending:
+            position = self.playerinfo.position['position']
+        self.prefetch_job = self._prefetcher.prefetch(
+            self.playerinfo.map_id, position=position)
+
+    def _check_pending_map(self):
+        """
+        Called before each update while the current map's data isn't cached
+        (see :py:attr:`~.PlayerInfo.map_pending`). Once the prefetch job has
+        retrieved the map, have the :py:class:`~.PlayerInfo` check the cache
+        again. If it still isn't there (e.g. the GW2 API request failed),
+        retry every :py:data:`~.MAP_RETRY_INTERVAL` seconds, restarting the
+        prefetch job.
+        """
+        job = self.prefetch_job
+        if job is not None and not job.map_done:
+            return
+        now = time.time()
+        if job is not None and job is not self._map_checked_job:
+            self._map_checked_job = job
+        elif now - self._map_checked_at < MAP_RETRY_INTERVAL:
+            return
+        elif self._prefetcher is not None:
+            self._prefetch()
+            return
+        self._map_checked_at = now
+        self.playerinfo.retry_map()
+
+    def _send_motion(self, moved):
+        """
+        Send a ``motion`` websocket message, from which clients can animate
+        the player marker between position updates: the map ID, the latest
+        position (continent coordinates) and its server timestamp (seconds
+        since the epoch), along with the velocity (continent units per
+        second) and heading rate (degrees per second) over the last
+        :py:data:`~.MOTION_WINDOW` seconds of samples.
+
+        This is the only message sent for position changes. While the player
+        moves, it is sent at most every :py:data:`~.MOTION_INTERVAL` seconds
+        (and at once on a map change); when they stop, once more with the
+        final position.
+
+        :param moved: whether the position changed in this update; if not,
+          velocity and heading rate are sent as zero
+        :type moved: bool
+        """
+        samples = self.playerinfo.samples
+        latest = samples.latest
+        if latest is None:
+            return
+        velocity = [0.0, 0.0]
+        heading_rate = 0.0
+        if moved:
+            velocity = list(samples.velocity(MOTION_WINDOW))
+            heading_rate = samples.heading_rate(MOTION_WINDOW)
+        self._pi_moving = moved
+        self._motion_due = False
+        self._motion_sent_at = time.time()
+        self._motion_map_id = latest.map_id
+        self._ws_send('motion', {
+            'map_id': latest.map_id,
+            'position': [latest.x, latest.y],
+            'timestamp': latest.timestamp,
+            'velocity': velocity,
+            'heading': latest.heading,
+            'heading_rate': heading_rate
+        })
+
+    def _ws_send(self, msg_type, data):
+        """
+        Broadcast a websocket message for this session; see
+        :py:meth:`~.TwistedServer._ws_send`.
+
+        :param msg_type: type of message
+        :type msg_type: str
+        :param data: JSON-serializable data dict
+        :type data: dict
+        """
+        self.server._ws_send(msg_type, data, session=self.name)
+
+    @property
+    def mumble_update_datetime(self):
+        """
+        Return the datetime when mumble link data was last updated.
+
+        :return: datetime when mumble link data was last updated
+        :rtype: datetime.datetime
+        """
+        return self._mumble_update_datetime
+
+    @property
+    def character_name(self):
+        """
+        Return the name of the character currently playing in this session.
+
+        :return: character name, or None if no data has been received yet
+        :rtype: str
+        """
+        if self._mumble_link_data is None:
+            return None
+        return self._mumble_link_data['identity']['name']
+
+    @property
+    def raw_mumble_link_data(self):
+        """
+        Return the current raw mumble link data.
+
+        :return: current raw MumbleLink data
+        :rtype: dict
+        """
+        return self._mumble_link_data
+
+    @property
+    def poll_status(self):
+        """
+        Return the current MumbleLink poll rate information, for the status
+        page.
+
+        :return: dict with ``rate`` in Hz and ``interval`` in seconds, plus
+          ``min_interval`` and ``max_interval`` for the adaptive scheduler or
+          ``push`` for the wine reader's push mode; None if the reader isn't
+          polling
+        :rtype: dict
+        """
+        sched = getattr(self.reader, 'poll_scheduler', None)
+        if sched is not None:
+            return sched.status
+        push_rate = getattr(self.reader, 'push_rate', None)
+        if push_rate is not None:
+            return {
+                'rate': push_rate,
+                'interval': 1.0 / push_rate,
+                'push': True
+            }
+        return None
+
+
+class SessionManager(object):
+    """
+    The :py:class:`~.MumbleSession` for each game client, by MumbleLink
+    name. The first one is the default, used when a request doesn't name a
+    session.
+    """
+
+    def __init__(self, server, names, recorder=None, trails=None,
+                 prefetcher=None):
+        """
+        :param server: the server the sessions belong to
+        :type server: :py:class:`~.TwistedServer`
+        :param names: MumbleLink names, one per game client
+        :type names: list
+        :param recorder: if not None, record the default session's updates
+          with this
+        :type recorder: :py:class:`~.MumbleRecorder`
+        :param trails: if not None, record every session's position trail in
+          this
+        :type trails: :py:class:`~.TrailStore`
+        :param prefetcher: if not None, warm the cache for each map a player
+          enters with this
+        :type prefetcher: :py:class:`~.ZonePrefetcher`
+        """
+        if len(names) == 0:
+            raise ValueError('At least one MumbleLink name is required')
+        self._sessions = OrderedDict()
+        for name in names:
+            if name in self._sessions:
+                raise ValueError('Duplicate MumbleLink name: %s' % name)
+            self._sessions[name] = MumbleSession(
+                server, name,
+                recorder=(recorder if len(self._sessions) == 0 else None),
+                trails=trails, prefetcher=prefetcher)
+
+    def __iter__(self):
+        return iter(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def names(self):
+        """
+        Return the session names, default first.
+
+        :rtype: list
+        """
+        return list(self._sessions.keys())
+
+    @property
+    def default(self):
+        """
+        Return the default session.
+
+        :rtype: :py:class:`~.MumbleSession`
+        """
+        return next(iter(self._sessions.values()))
+
+    def get(self, name=None):
+        """
+        Return the named session, or the default one.
+
+        :param name: session name, or None for the default session
+        :type name: str
+        :return: the session, or None if there is no session of that name
+        :rtype: :py:class:`~.MumbleSession`
+        """
+        if name is None:
+            return self.default
+        return self._sessions.get(name, None)
+
+    def for_request(self, request):
+        """
+        Return the session named by the ``session`` query parameter of an
+        HTTP request, or the default session if there is none.
+
+        :param request: incoming HTTP request
+        :type request: :py:class:`twisted.web.server.Request`
+        :return: the session, or None if the named session does not exist
+        :rtype: :py:class:`~.MumbleSession`
+        """
+        name = request.args.get('session', [None])[0]
+        return self.get(name)
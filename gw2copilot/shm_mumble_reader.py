@@ -0,0 +1,230 @@
+"""
+gw2copilot/shm_mumble_reader.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+
+from .native_mumble_reader import NativeMumbleLinkReader
+from .read_mumble_link import LinkDecoder, open_link_file, pack_link, LINK_SIZE
+
+logger = logging.getLogger(__name__)
+
+#: default path of the file-backed MumbleLink segment
+DEFAULT_SHM_PATH = '/dev/shm/MumbleLink'
+
+
+def shm_path(path, name):
+    """
+    Return the segment path for a MumbleLink name: ``path`` itself for the
+    default ``MumbleLink`` name, otherwise a file named ``name`` in the same
+    directory (e.g. ``/dev/shm/MyAlt`` for a game started with
+    ``-mumble MyAlt``).
+
+    :param path: configured segment path
+    :type path: str
+    :param name: MumbleLink name
+    :type name: str
+    :rtype: str
+    """
+    if name == 'MumbleLink':
+        return path
+    return os.path.join(os.path.dirname(path), name)
+
+
+class ShmMumbleLinkReader(NativeMumbleLinkReader):
+    """
+    Class to handle reading MumbleLink from a file-backed shared memory
+    segment on Linux, such as one exported from the game's wine prefix by a
+    helper, or written by :py:class:`~.LinkWriter`. The segment is mapped and
+    decoded in-process, exactly like :py:class:`~.NativeMumbleLinkReader`
+    does under Windows; no wine subprocess is needed.
+    """
+
+    def __init__(self, parent_server, poll_interval, path=DEFAULT_SHM_PATH):
+        """
+        Initialize the class.
+
+        :param parent_server: the TwistedServer instance that started this
+        :type parent_server: :py:class:`~.TwistedServer`
+        :param poll_interval: interval in seconds to poll MumbleLink
+        :type poll_interval: float
+        :param path: path to the file-backed MumbleLink segment; it is
+          created if it does not exist yet
+        :type path: str
+        """
+        logger.info('Reading MumbleLink from %s', path)
+        super(ShmMumbleLinkReader, self).__init__(
+            parent_server, poll_interval, path=path)
+
+
+class LinkWriter(object):
+    """
+    Write MumbleLink data to a file-backed segment, as the game would. Used
+    to test :py:class:`~.ShmMumbleLinkReader` against synthetic data.
+    """
+
+    def __init__(self, path=DEFAULT_SHM_PATH):
+        """
+        :param path: path to the file-backed MumbleLink segment; it is
+          created if it does not exist yet
+        :type path: str
+        """
+        self.memfile = open_link_file(path)
+        self.tick = LinkDecoder.tick(self.memfile)[1]
+
+    def write(self, **fields):
+        """
+        Write one update, incrementing ``uiTick``. The header (including
+        ``uiTick``) is written last, so a reader never sees a new tick with
+        old data.
+
+        :param fields: keyword arguments for :py:func:`~.pack_link`; any
+          ``uiTick`` is ignored
+        """
+        self.tick += 1
+        fields['uiTick'] = self.tick
+        buf = pack_link(**fields)
+        self.memfile[8:LINK_SIZE] = buf[8:]
+        self.memfile[0:8] = buf[:8]
+
+    def close(self):
+        """Unmap the segment."""
+        self.memfile.close()
+
+
+def synthetic_frames(map_id=15, name='Synthetic', radius=50.0, steps=600):
+    """
+    Generator of :py:func:`~.pack_link` keyword arguments for a character
+    running in a circle of ``radius`` meters around the origin of a map,
+    taking ``steps`` updates per lap.
+
+    :param map_id: map ID
+    :type map_id: int
+    :param name: character name
+    :type name: str
+    :param radius: radius of the circle in meters
+    :type radius: float
+    :param steps: updates per lap
+    :type steps: int
+    """
+    identity = {
+        'name': name,
+        'profession': 1,
+        'race': 1,
+        'map_id': map_id,
+        'world_id': 1001,
+        'team_color_id': 0,
+        'commander': False,
+        'fov': 0.873
+    }
+    context = {
+        'mapId': map_id,
+        'mapType': 5,
+        'shardId': 1001,
+        'instance': 0,
+        'buildId': 1,
+        'serverAddress': {
+            'sin_family': 2, 'sin_port': 0, 'sin_addr': '127.0.0.1'
+        }
+    }
+    step = 0
+    while True:
+        angle = 2 * math.pi * step / steps
+        pos = [radius * math.cos(angle), 0.0, radius * math.sin(angle)]
+        front = [-math.sin(angle), 0.0, math.cos(angle)]
+        camera = [pos[0] - 5 * front[0], 2.0, pos[2] - 5 * front[2]]
+        yield dict(
+            uiVersion=2,
+            fAvatarPosition=pos,
+            fAvatarFront=front,
+            name=u'Guild Wars 2',
+            fCameraPosition=camera,
+            fCameraFront=front,
+            identity=identity,
+            context=context
+        )
+        step = (step + 1) % steps
+
+
+def writer_entry_point(argv=None):
+    """
+    Console entry point for ``gw2copilot-mumble-writer``; write synthetic
+    MumbleLink data (see :py:func:`~.synthetic_frames`) to a file-backed
+    segment until interrupted.
+
+    :param argv: command line arguments; defaults to ``sys.argv[1:]``
+    :type argv: list
+    """
+    p = argparse.ArgumentParser(
+        description='Write synthetic GW2 MumbleLink data to a file-backed '
+                    'shared memory segment, for testing gw2copilot '
+                    '--mumble-shm on Linux')
+    p.add_argument('-f', '--path', dest='path', action='store',
+                   default=DEFAULT_SHM_PATH,
+                   help='segment path (default: %s)' % DEFAULT_SHM_PATH)
+    p.add_argument('-r', '--rate', dest='rate', action='store', type=float,
+                   default=60.0, help='updates per second (default: 60)')
+    p.add_argument('-m', '--map-id', dest='map_id', action='store', type=int,
+                   default=15, help='map ID (default: 15, Queensdale)')
+    p.add_argument('-n', '--name', dest='name', action='store',
+                   default='Synthetic', help='character name')
+    p.add_argument('-c', '--count', dest='count', action='store', type=int,
+                   default=0, help='stop after this many updates; 0 to run '
+                                   'until interrupted (default: 0)')
+    args = p.parse_args(sys.argv[1:] if argv is None else argv)
+    writer = LinkWriter(args.path)
+    frames = synthetic_frames(map_id=args.map_id, name=args.name)
+    written = 0
+    try:
+        while args.count == 0 or written < args.count:
+            writer.write(**next(frames))
+            written += 1
+            time.sleep(1.0 / args.rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    writer_entry_point()
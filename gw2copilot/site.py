@@ -41,17 +41,39 @@ import logging
 import json
 from datetime import datetime, timedelta
 from twisted.web._responses import OK
-from twisted.web.static import File
 from jinja2 import Environment, PackageLoader
 from klein import Klein
 import os
 
-from .utils import make_response, set_headers, log_request
+from .utils import (
+    make_response, set_headers, log_request, unavailable_response,
+    not_found_response
+)
 from .route_helpers import classroute, ClassRouteMixin
+from .caching_file import CachingFile
 from .version import VERSION, PROJECT_URL
 
 logger = logging.getLogger(__name__)
 
+#: Retry-After value (seconds) for pages requested before cache warm-up has
+#: finished the data they need
+WARMUP_RETRY_AFTER = 5
+
+#: Map of first path component under ``/cache/`` to the name of the
+#: :py:class:`~.CacheWarmer` step that generates those files
+CACHE_DIR_WARMUP_STEPS = {
+    'mapdata': 'map_catalog',
+    'assets': 'assets',
+    'gw2timer': 'gw2timer'
+}
+
+#: Cache-Control header for ``/static/``; these only change on upgrade
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
+
+#: Cache-Control header for ``/cache/``; these can be regenerated at any
+#: time, so clients must always revalidate (cheap, with ETag/Last-Modified)
+CACHE_DIR_CACHE_CONTROL = 'no-cache'
+
 
 class GW2CopilotSite(ClassRouteMixin):
     """
@@ -81,6 +103,15 @@ class GW2CopilotSite(ClassRouteMixin):
             loader=PackageLoader('gw2copilot', 'templates'),
             extensions=['jinja2.ext.loopcontrols']
         )
+        # one File resource per root; these create per-request children
+        self._static_resource = CachingFile(
+            os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static'),
+            cache_control=STATIC_CACHE_CONTROL
+        )
+        self._cache_resource = CachingFile(
+            os.path.abspath(self.parent_server.cache.cache_dir),
+            cache_control=CACHE_DIR_CACHE_CONTROL
+        )
         self._add_routes()
 
     @property
@@ -142,12 +173,12 @@ class GW2CopilotSite(ClassRouteMixin):
         Meta-endpoint for serving static files from the ``static/`` directory.
 
         This serves the :http:get:`/static/` endpoint via
-        :py:class:`twisted.web.static.File`
+        :py:class:`~.CachingFile`
 
         :param request: incoming HTTP request
         :type request: :py:class:`twisted.web.server.Request`
         :return: Twisted File resource
-        :rtype: twisted.web.static.File
+        :rtype: :py:class:`~.CachingFile`
 
         <HTTPAPI>
         Serve a static file from the source package, under ``/static/``.
@@ -167,18 +198,21 @@ class GW2CopilotSite(ClassRouteMixin):
 
           HTTP/1.1 200 OK
           Content-Type: text/javascript
+          Cache-Control: public, max-age=3600
+          ETag: "158a3c1e7d8-1f2a"
+          Last-Modified: Sun, 20 Nov 2016 16:38:20 GMT
 
           <content of file here>
 
+        :reqheader If-None-Match: ETag of a previously-retrieved copy
+        :reqheader If-Modified-Since: Last-Modified of a previously-retrieved
+          copy
         :statuscode 200: successfully returned result
+        :statuscode 304: file has not changed
         """
         log_request(request)
-        path = os.path.join(
-            os.path.abspath(os.path.dirname(__file__)),
-            'static'
-        )
         set_headers(request)
-        return File(path)
+        return self._static_resource
 
     @classroute('cache/', branch=True)
     def cache_files(self, request):
@@ -189,12 +223,12 @@ class GW2CopilotSite(ClassRouteMixin):
         :py:class:`~.CachingAPIClient`.
 
         This serves the :http:get:`/cache/` endpoint via
-        :py:class:`twisted.web.static.File`
+        :py:class:`~.CachingFile`
 
         :param request: incoming HTTP request
         :type request: :py:class:`twisted.web.server.Request`
         :return: Twisted File resource
-        :rtype: twisted.web.static.File
+        :rtype: :py:class:`~.CachingFile`
 
         <HTTPAPI>
         Serve a cache file written to disk by :py:class:`~.CachingAPIClient`.
@@ -214,22 +248,39 @@ class GW2CopilotSite(ClassRouteMixin):
 
           HTTP/1.1 200 OK
           Content-Type: text/javascript
+          Cache-Control: no-cache
+          ETag: "158a3c1e7d8-1f2a"
+          Last-Modified: Sun, 20 Nov 2016 16:38:20 GMT
 
           <content of file here>
 
+        :reqheader If-None-Match: ETag of a previously-retrieved copy
+        :reqheader If-Modified-Since: Last-Modified of a previously-retrieved
+          copy
         :statuscode 200: successfully returned result
+        :statuscode 304: file has not changed
+        :statuscode 503: the requested file has not been generated yet by the
+          startup cache warm-up; retry after the number of seconds in the
+          ``Retry-After`` header
         """
         log_request(request)
-        path = os.path.abspath(self.parent_server.cache.cache_dir)
         set_headers(request)
-        return File(path)
+        if len(request.postpath) > 0:
+            step = CACHE_DIR_WARMUP_STEPS.get(request.postpath[0], None)
+            if (step is not None and
+                    not self.parent_server.warmer.is_ready(step)):
+                return unavailable_response(
+                    request, WARMUP_RETRY_AFTER,
+                    'Cache warm-up in progress (%s)' % step)
+        return self._cache_resource
 
     @classroute('status')
     def status(self, request):
         """
         Generate the end-user Status page.
 
-        This serves the ``/status`` UI page.
+        This serves the ``/status`` UI page, for the MumbleLink session
+        named by the ``session`` query parameter (default: the first one).
 
         :param request: incoming HTTP request
         :type request: :py:class:`twisted.web.server.Request`
@@ -238,27 +289,40 @@ class GW2CopilotSite(ClassRouteMixin):
         """
         log_request(request)
         set_headers(request)
+        session = self.parent_server.sessions.for_request(request)
+        if session is None:
+            return not_found_response(request, 'Unknown session')
         statuscode = OK
         msg = make_response('OK')
         request.setResponseCode(statuscode, message=msg)
-        mumble_dt = self.parent_server.mumble_update_datetime
-        mumble_td = (datetime.now() - mumble_dt)
-        if mumble_td < timedelta(seconds=4):
-            mumble_td = 'less than 4 seconds'
+        mumble_dt = session.mumble_update_datetime
+        if mumble_dt is None:
+            mumble_td = 'never'
+        else:
+            mumble_td = (datetime.now() - mumble_dt)
+            if mumble_td < timedelta(seconds=4):
+                mumble_td = 'less than 4 seconds'
+        playerinfo = None
+        if session.raw_mumble_link_data is not None:
+            playerinfo = session.playerinfo.as_dict
         return make_response(
             self._render_template(
                 'status.html',
                 request,
                 playerinfo=json.dumps(
-                    self.parent_server.playerinfo.as_dict,
+                    playerinfo,
                     sort_keys=True, indent=4, separators=(',', ': ')
                 ),
                 mumble_data=json.dumps(
-                    self.parent_server.raw_mumble_link_data,
+                    session.raw_mumble_link_data,
                     sort_keys=True, indent=4, separators=(',', ': ')
                 ),
                 mumble_time=mumble_dt,
-                mumble_td=mumble_td
+                mumble_td=mumble_td,
+                mumble_poll=session.poll_status,
+                session=session.name,
+                sessions=self.parent_server.sessions.names,
+                warmup=self.parent_server.warmer.status
             )
         )
 
@@ -291,7 +355,10 @@ class GW2CopilotSite(ClassRouteMixin):
         """
         Generate the end-user "Live" page.
 
-        This serves the ``/live`` UI page.
+        This serves the ``/live`` UI page. Until the map catalog and
+        gw2timer.com data have been warmed up, this returns a 503 with a
+        Retry-After header. The ``session`` query parameter selects the
+        MumbleLink session to follow (default: the first one).
 
         :param request: incoming HTTP request
         :type request: :py:class:`twisted.web.server.Request`
@@ -300,6 +367,18 @@ class GW2CopilotSite(ClassRouteMixin):
         """
         log_request(request)
         set_headers(request)
+        for step in ['map_catalog', 'gw2timer']:
+            if not self.parent_server.warmer.is_ready(step):
+                return unavailable_response(
+                    request, WARMUP_RETRY_AFTER,
+                    'Cache warm-up in progress (%s); see /status' % step)
+        session = self.parent_server.sessions.for_request(request)
+        if session is None:
+            return not_found_response(request, 'Unknown session')
+        if session.raw_mumble_link_data is None:
+            return unavailable_response(
+                request, WARMUP_RETRY_AFTER,
+                'No data received from MumbleLink yet; see /status')
         statuscode = OK
         msg = make_response('OK')
         request.setResponseCode(statuscode, message=msg)
@@ -307,7 +386,8 @@ class GW2CopilotSite(ClassRouteMixin):
             self._render_template(
                 'live.html',
                 request,
-                playerinfo=self.parent_server.playerinfo.as_dict
+                playerinfo=session.playerinfo.as_dict,
+                session=session.name
             )
         )
 
@@ -5,7 +5,7 @@ gw2copilot/js/gw2timer_data.js
 We're using resource data from gw2timer.com; see
 https://github.com/jantman/gw2copilot/issues/4 and
 https://github.com/jantman/gw2copilot/issues/19 and
-gw2copilot.caching_api_client.CachingAPIClient._get_gw2timer_data()
+gw2copilot.caching_api_client.CachingAPIClient.refresh_gw2timer_data()
 
 That data is a JavaScript source file. This serves to manipulate the data
 for our purposes.
@@ -249,4 +249,43 @@ function gw2timer_add_markers_for_resource(group_name, res_list, title, icon) {
             );
         }
     }
-}
\ No newline at end of file
+}
+
+/**
+ * Reload gw2timer data files that the server has regenerated, and rebuild the
+ * layers built from them. Called when a "gw2timer_data" websocket message is
+ * received.
+ *
+ * @param {Array} files - names of the changed files ("resource", "travel")
+ */
+function gw2timer_reload(files) {
+    var stamp = new Date().getTime();
+    if ( files.indexOf("travel") > -1 ) {
+        $.getScript("/cache/gw2timer/travel.js?_=" + stamp, function() {
+            console.log("reloaded gw2timer travel data");
+            if(map.hasLayer(m.travelLayer)) {
+                map.removeLayer(m.travelLayer);
+            }
+            gw2timer_add_travel();
+            showHideLayers();
+        });
+    }
+    if ( files.indexOf("resource") > -1 ) {
+        $.getScript("/cache/gw2timer/resource.js?_=" + stamp, function() {
+            console.log("reloaded gw2timer resource data");
+            var hidden = {};
+            for(var i =0; i < m.ResourceLayers.length; i++) {
+                hidden[m.ResourceLayers[i]] = m.hidden[m.ResourceLayers[i]];
+                if(map.hasLayer(m.resourceGroups[m.ResourceLayers[i]])) {
+                    map.removeLayer(m.resourceGroups[m.ResourceLayers[i]]);
+                }
+            }
+            gw2timer_add_resource_markers();
+            // gw2timer_add_resource_markers() hides everything; restore state
+            for(var i =0; i < m.ResourceLayers.length; i++) {
+                m.hidden[m.ResourceLayers[i]] = hidden[m.ResourceLayers[i]];
+            }
+            showHideLayers();
+        });
+    }
+}
@@ -48,9 +48,19 @@ var P = {
     map_id: null,
     /* object with keys of map_id, values list of string zone reminders */
     /* updated by live_edit_modal.js makeZoneRemindersCache() */
-    zone_reminders: {}
+    zone_reminders: {},
+    /* latest motion message and animation state; see handleMotion() */
+    motion: null
 };
 
+/* longest time (ms) to extrapolate the marker past the last motion message */
+var MOTION_MAX_EXTRAPOLATE_MS = 1000;
+/* bounds (ms) on the time taken to blend to a newly received motion */
+var MOTION_MIN_BLEND_MS = 50;
+var MOTION_MAX_BLEND_MS = 1000;
+/* how often (ms) to fetch newly recorded trail points */
+var TRAIL_REFRESH_MS = 10000;
+
 /**
  * Setup websocket server and hook in message handler.
  */
@@ -92,6 +102,7 @@ window.onload = function() {
     }
 
     getInitialData();
+    window.setInterval(function() { loadTrail(false); }, TRAIL_REFRESH_MS);
 };
 
 /**
@@ -102,10 +113,20 @@ window.onload = function() {
  */
 function handleWebSocketMessage(data) {
     //console.log("handleWebSocketMessage(" + JSON.stringify(data) + ")");
-    if ( data.type == "position") {
-        handleUpdatePosition(data.data);
-    } else if ( data.type == "player_dict" ) {
+    if ( data.session !== undefined && data.session != session ) {
+        // per-character message for a different MumbleLink session
+        return;
+    }
+    if ( data.type == "player_dict" ) {
         handleUpdatePlayerDict(data.data);
+    } else if ( data.type == "gw2timer_data" ) {
+        gw2timer_reload(data.data["files"]);
+    } else if ( data.type == "warmup" ) {
+        handleWarmup(data.data);
+    } else if ( data.type == "tile_ready" ) {
+        handleTileReady(data.data);
+    } else if ( data.type == "motion" ) {
+        handleMotion(data.data);
     } else {
         console.log("handleWebSocketMessage got message of unknown type: "
             + JSON.stringify(data) + ")"
@@ -121,12 +142,14 @@ function handleWebSocketMessage(data) {
 function getInitialData() {
     console.log("Getting initial data.");
     $.ajax({
-        url: "/api/player_dict"
+        url: "/api/player_dict",
+        data: { session: session }
     }).done(function( data ){
         handleUpdatePlayerDict(data);
     });
     $.ajax({
-        url: "/api/position"
+        url: "/api/position",
+        data: { session: session }
     }).done(function( data ){
         handleUpdatePosition(data);
     });
@@ -152,20 +175,100 @@ function handleUpdatePlayerDict(data) {
 }
 
 /**
- * Handle an update to the position data
+ * Handle a "motion" websocket message, sent a few times a second while the
+ * player moves (and once when they stop) with the map ID, position, its
+ * server timestamp and the current velocity; it replaces the "position"
+ * message. The player marker is moved smoothly from where it is now toward
+ * the extrapolated position, over about the time between motion messages,
+ * and then keeps extrapolating (for up to MOTION_MAX_EXTRAPOLATE_MS) until
+ * the next one arrives.
+ *
+ * @param {object} data - motion data
+ */
+function handleMotion(data) {
+    handleUpdatePosition(data);
+    if ( m.playerMarker === null ) {
+        return;
+    }
+    var now = window.performance.now();
+    var blend = MOTION_MAX_BLEND_MS;
+    if ( P.motion !== null && P.motion.map_id == data["map_id"] ) {
+        blend = (data["timestamp"] - P.motion.timestamp) * 1000;
+        blend = Math.min(Math.max(blend, MOTION_MIN_BLEND_MS),
+                         MOTION_MAX_BLEND_MS);
+    } else {
+        // first message, or changed maps; don't animate from the old spot
+        blend = 0;
+    }
+    var shown = latlon2gw(m.playerMarker.getLatLng());
+    var animating = P.motion !== null && P.motion.frame !== null;
+    P.motion = {
+        map_id: data["map_id"],
+        timestamp: data["timestamp"],
+        position: data["position"],
+        velocity: data["velocity"],
+        received: now,
+        from: [shown.x, shown.y],
+        blend: blend,
+        frame: animating ? P.motion.frame : null
+    };
+    if ( ! animating ) {
+        P.motion.frame = window.requestAnimationFrame(animateMotion);
+    }
+}
+
+/**
+ * requestAnimationFrame callback; move the player marker according to
+ * ``P.motion`` (see handleMotion()), and request another frame while it is
+ * still moving.
  *
- * @param {array} data - position data
+ * @param {number} now - current time in ms, from requestAnimationFrame
+ */
+function animateMotion(now) {
+    var mo = P.motion;
+    var elapsed = Math.max(now - mo.received, 0);
+    var t = Math.min(elapsed, MOTION_MAX_EXTRAPOLATE_MS) / 1000;
+    var target = [
+        mo.position[0] + mo.velocity[0] * t,
+        mo.position[1] + mo.velocity[1] * t
+    ];
+    var f = mo.blend > 0 ? Math.min(elapsed / mo.blend, 1) : 1;
+    var pos = [
+        mo.from[0] + (target[0] - mo.from[0]) * f,
+        mo.from[1] + (target[1] - mo.from[1]) * f
+    ];
+    m.playerLatLng = gw2latlon(pos);
+    m.playerMarker.setLatLng(m.playerLatLng);
+    if ( m.followPlayer === true ) {
+        map.panTo(m.playerLatLng, {animate: false});
+    }
+    var moving = mo.velocity[0] != 0 || mo.velocity[1] != 0;
+    if ( f < 1 || (moving && elapsed < MOTION_MAX_EXTRAPOLATE_MS) ) {
+        mo.frame = window.requestAnimationFrame(animateMotion);
+    } else {
+        mo.frame = null;
+    }
+}
+
+/**
+ * Handle an update to the position data, from /api/position or a motion
+ * message
+ *
+ * @param {object} data - position data
  */
 function handleUpdatePosition(data) {
     //console.log("handleUpdatePosition(" + JSON.stringify(data) + ")");
     P.position = data["position"];
-    m.playerLatLng = gw2latlon(P.position);
     if ( m.playerMarker === null ) {
+        m.playerLatLng = gw2latlon(P.position);
         addPlayerMarker(m.playerLatLng);
-    } else {
+    } else if ( P.motion === null ) {
+        // without motion messages, jump to the new position; otherwise
+        // animateMotion() moves the marker
+        m.playerLatLng = gw2latlon(P.position);
         m.playerMarker.setLatLng(m.playerLatLng);
     }
-    if ( m.followPlayer === true ) {
+    if ( m.followPlayer === true && P.motion === null ) {
         map.panTo(m.playerLatLng);
     }
     if ( P.map_id === null || P.map_id != data["map_id"] ) {
@@ -181,6 +284,72 @@ function handleUpdatePosition(data) {
             MAP_INFO[P.map_id]["continent_name"]
         );
         doZoneReminder(P.map_id);
+        loadTrail(true);
+    }
+}
+
+/**
+ * Request the player's trail on the current map, simplified for the current
+ * zoom level, from /api/trail and draw it as polylines.
+ *
+ * @param {boolean} reload - if true, replace the whole trail (e.g. after a
+ *   map or zoom change); otherwise only fetch points newer than those shown
+ */
+function loadTrail(reload) {
+    if ( P.map_id === null ) {
+        return;
+    }
+    if ( m.trailLayer === null ) {
+        m.trailLayer = L.layerGroup().addTo(map);
+    }
+    var params = { session: session, map_id: P.map_id, zoom: map.getZoom() };
+    if ( ! reload && m.trailLatest !== null ) {
+        params.since = m.trailLatest;
+    }
+    $.ajax({
+        url: "/api/trail",
+        data: params
+    }).done(function( data ){
+        if ( data.map_id != P.map_id ) {
+            return;
+        }
+        if ( reload || params.since === undefined ) {
+            m.trailLayer.clearLayers();
+        }
+        for ( var i = 0; i < data.segments.length; i++ ) {
+            var latlngs = [];
+            for ( var j = 0; j < data.segments[i].length; j++ ) {
+                latlngs.push(gw2latlon(data.segments[i][j]));
+            }
+            L.polyline(latlngs, {color: "#3388ff", weight: 3, opacity: 0.6})
+                .addTo(m.trailLayer);
+        }
+        m.trailLatest = data.latest;
+    }).fail(function( jqXHR ){
+        if ( jqXHR.status == 503 ) {
+            // i.e. the trail is still being read from disk
+            var retry = parseInt(jqXHR.getResponseHeader("Retry-After")) || 1;
+            setTimeout(function(){ loadTrail(reload); }, retry * 1000);
+        }
+    });
+}
+
+/**
+ * Handle a cache warm-up progress message. The live page is only served once
+ * the data it needs has been warmed up, so this is informational.
+ *
+ * @param {object} data - warm-up status, see CacheWarmer.status
+ */
+function handleWarmup(data) {
+    for(var i = 0; i < data.steps.length; i++) {
+        var step = data.steps[i];
+        if ( step.state == "running" ) {
+            console.log("cache warm-up: " + step.title + " (" + step.done +
+                "/" + step.total + ")");
+        }
+    }
+    if ( data.state == "done" ) {
+        console.log("cache warm-up complete");
     }
 }
 
@@ -38,12 +38,15 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 */
 
 var map;
+var tile_layer;
 var popup = L.popup();
 var m = {
     WORLD_ZOOM: 2,
     WORLD_COORDS: [-152, 126],
     playerMarker: null,
     playerLatLng: null,
+    trailLayer: null, // player trail polylines; see loadTrail()
+    trailLatest: null, // timestamp of the newest trail point shown
     followPlayer: false,
     zones: {},
     resourceGroups: {},
@@ -202,7 +205,7 @@ $(document).ready(function () {
         contextmenuItems: []
     }).setView(m.WORLD_COORDS, m.WORLD_ZOOM);
 
-    L.tileLayer("/api/tiles?continent=1&floor=1&zoom={z}&x={x}&y={y}", {
+    tile_layer = L.tileLayer("/api/tiles?continent=1&floor=1&zoom={z}&x={x}&y={y}", {
         attribution: "Map Data and Imagery &copy; " +
             "<a href=\"https://wiki.guildwars2.com/wiki/API:Main\">GuildWars2/ArenaNet</a>; " +
             "some data from <a href=\"http://gw2timer.com/\">gw2timer.com</a>" +
@@ -216,6 +219,25 @@ $(document).ready(function () {
     map.on("zoomend", onZoomChange);
 });
 
+/**
+ * Handle a "tile_ready" websocket message, sent when the real version of a
+ * tile that was served provisionally (synthesized from other zoom levels) has
+ * been retrieved; reload that tile if it's currently displayed.
+ *
+ * @param {object} data - tile continent, floor, zoom, x and y
+ */
+function handleTileReady(data) {
+    if ( tile_layer === undefined || data.continent != 1 || data.floor != 1 ) {
+        return;
+    }
+    var tile = tile_layer._tiles[data.x + ":" + data.y + ":" + data.zoom];
+    if ( tile === undefined ) {
+        return;
+    }
+    // the provisional tile may be in the browser cache for a short while
+    tile.el.src = tile_layer.getTileUrl(tile.coords) + "&r=" + Date.now();
+}
+
 /******************************************************
  Binding functions for map-related buttons and clicks
  ******************************************************/
@@ -241,6 +263,7 @@ function onMapClick(e) {
  */
 function onZoomChange(e) {
     showHideLayers();
+    loadTrail(true);
 }
 
 //
@@ -38,7 +38,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from twisted.internet.task import LoopingCall
+import time
+from copy import deepcopy
+
+from .coords import INCHES_PER_METER
 
 logger = logging.getLogger(__name__)
 
@@ -115,14 +118,19 @@ class TestMumbleLinkReader(object):
         self.server = parent_server
         self._poll_interval = poll_interval
         self.uiTick = 2
-        self._looping_deferred = None
+        self.poll_scheduler = None
         # vars for loop movement tests
         self._loop_movement = False
-        self.x_step = 0  # how far to move every _read()
-        self.y_step = 0  # how far to move every _read()
+        # how far to move every poll_interval seconds; the PollScheduler
+        # polls more often than that while moving, so each move is scaled
+        # by the time since the last one
+        self.x_step = 0
+        self.y_step = 0
+        self._last_move = None
         # these values are world coordinates and need to be run through
         # self.parent_server.playerinfo._map_coords_from_position()
-        # and then divided by 39.3701 before being returned as MumbleLink data
+        # and then divided by INCHES_PER_METER before being returned as
+        # MumbleLink data
         self.min_x = 1100.8
         self.max_x = 30976
         self.min_y = 14976
@@ -148,45 +156,59 @@ class TestMumbleLinkReader(object):
         else:
             raise Exception("Invalid test type: %s" % test_type)
 
-    def _looping_test(self):
+    def _looping_test(self, scale=None):
         """
         Setup a looping test that moves the player position along a defined path
 
-        :param test_type: type of test to run
-        :type test_type: str
+        :param scale: multiple of the step to move by; if None, the time
+          since the last move divided by the poll interval
+        :type scale: float
         """
+        if not self.server.warmer.is_ready('map_catalog'):
+            # finding maps for positions needs the full map catalog
+            logger.debug('Map catalog not loaded yet; not moving')
+            return
+        if scale is None:
+            now = time.time()
+            scale = 1.0
+            if self._last_move is not None:
+                scale = (now - self._last_move) / self._poll_interval
+            self._last_move = now
         logger.debug('curr_x=%s curr_y=%s', self.curr_x, self.curr_y)
-        self.curr_x = self._step('x')
-        self.curr_y = self._step('y')
+        self.curr_x = self._step('x', scale)
+        self.curr_y = self._step('y', scale)
         try:
             map_id, map_x, map_y = \
                 self.server.playerinfo._map_coords_from_position(
                     (self.curr_x, self.curr_y))
             # meters to inches
-            map_x /= 39.3701
-            map_y /= 39.3701
+            map_x /= INCHES_PER_METER
+            map_y /= INCHES_PER_METER
             logger.debug('new_x=%s new_y=%s map_id=%d map_x=%s map_y=%s',
                          self.curr_x, self.curr_y, map_id, map_x, map_y)
             self.mumble_data['fAvatarPosition'][0] = map_x
             self.mumble_data['fAvatarPosition'][2] = map_y
             self.mumble_data['context']['mapId'] = map_id
         except Exception:
-            self._looping_test()
+            # not on a map; move on by a whole step
+            self._looping_test(1.0)
 
-    def _step(self, axis):
+    def _step(self, axis, scale=1.0):
         """
         Step a value by the step amount; if we run over max or under min,
         reverse direction.
 
         :param axis: the axis to step, "x" or "y"
         :type axis: str
+        :param scale: multiple of the step amount to move by
+        :type scale: float
         :return: new value
         :rtype: float
         """
         curr = getattr(self, 'curr_%s' % axis)
         min_v = getattr(self, 'min_%s' % axis)
         max_v = getattr(self, 'max_%s' % axis)
-        step_amt = getattr(self, '%s_step' % axis)
+        step_amt = getattr(self, '%s_step' % axis) * scale
         direction = getattr(self, '%s_direction' % axis)
         step = step_amt * direction
         if (curr + step) > max_v:
@@ -202,25 +224,26 @@ class TestMumbleLinkReader(object):
 
     def _add_update_loop(self):
         """
-        Setup the LoopingCall to return data every ``self.poll_interval``;
-        helper for testing. The LoopingCall will simply call :py:meth:`~._read`.
+        Setup the :py:class:`~.PollScheduler` to return data; helper for
+        testing. The scheduler will simply call :py:meth:`~._read`.
         """
-        logger.debug("Creating LoopingCall")
-        l = LoopingCall(self._read)
-        l.clock = self.server.reactor
-        logger.info('Setting poll interval to %s seconds',
-                    self._poll_interval)
-        self._looping_deferred = l.start(self._poll_interval)
-        self._looping_deferred.addErrback(logger.error)
+        logger.debug("Creating PollScheduler")
+        self.poll_scheduler = self.server.make_poll_scheduler(self._read)
+        self.poll_scheduler.start()
 
     def _read(self):
         """
         Update the server with a static dict of data that looks like what
         :py:meth:`~.GW2MumbleLinkReader.read` would return.
+
+        :return: set of MumbleLink fields that changed
+        :rtype: set
         """
         logger.warning("STATIC TEST DATA ONLY - not actually from game!")
         self.uiTick += 1
         self.mumble_data['uiTick'] = self.uiTick
         if self._loop_movement:
             self._looping_test()
-        self.server.update_mumble_data(self.mumble_data)
+        # self.mumble_data is modified in place; the server keeps what it's
+        # given to detect changes
+        return self.server.update_mumble_data(deepcopy(self.mumble_data))
@@ -0,0 +1,221 @@
+"""
+gw2copilot/tests/fakes.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+from twisted.internet.defer import Deferred
+
+from gw2copilot.coords import MapTransform
+from gw2copilot.poll_scheduler import PollScheduler
+
+
+class FakeCall(object):
+    """Stand-in for the ``IDelayedCall`` returned by ``callLater``."""
+
+    def __init__(self, delay, func, args):
+        self.delay = delay
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def active(self):
+        return not self.cancelled
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeReactor(object):
+    """
+    Stand-in for the Twisted reactor. Scheduled calls (including
+    ``callFromThread``) are kept in ``calls`` and only run when a test says
+    so; ``now`` is the fake clock.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+        self.calls = []
+
+    def seconds(self):
+        return self.now
+
+    def callLater(self, delay, func, *args):
+        c = FakeCall(delay, func, args)
+        self.calls.append(c)
+        return c
+
+    def callFromThread(self, func, *args):
+        self.callLater(0, func, *args)
+
+    def run_next(self):
+        """
+        Run the most recently scheduled call, as a self-rescheduling loop
+        would see it; return the delay of the call scheduled after it.
+        """
+        c = self.calls[-1]
+        self.now += c.delay
+        c.func(*c.args)
+        return self.calls[-1].delay
+
+    def run(self):
+        """Run scheduled calls in order until there are none left."""
+        while self.calls:
+            c = self.calls.pop(0)
+            if c.cancelled:
+                continue
+            self.now += c.delay
+            c.func(*c.args)
+
+
+class FakeThreads(object):
+    """
+    Stand-in for ``deferToThread`` (or a ``run(func, *args)`` callable built
+    on a thread pool). Calls are kept in ``pending`` and only run, firing
+    their Deferreds, when a test says so.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.calls = []
+
+    def __call__(self, func, *args):
+        d = Deferred()
+        self.pending.append((d, func, args))
+        self.calls.append(args)
+        return d
+
+    def run_next(self):
+        d, func, args = self.pending.pop(0)
+        try:
+            result = func(*args)
+        except Exception as ex:
+            d.errback(ex)
+        else:
+            d.callback(result)
+
+    def run(self, limit=None):
+        """
+        Run pending calls in order, including ones queued meanwhile, until
+        there are none left or ``limit`` have run.
+        """
+        count = 0
+        while self.pending and (limit is None or count < limit):
+            self.run_next()
+            count += 1
+
+
+class FakeCache(object):
+    """
+    Stand-in for :py:class:`~.CachingAPIClient`, with the same data for
+    every map; maps in ``uncached`` behave as if they weren't cached yet.
+    Tiles in ``tiles``, a dict of (continent, floor, zoom, x, y) to path,
+    are cached.
+    """
+
+    def __init__(self):
+        self.char_calls = 0
+        self.uncached = set()
+        self.tiles = {}
+
+    def map_data(self, map_id, fetch=True):
+        if map_id in self.uncached and not fetch:
+            return None
+        return {
+            'continent_id': 1,
+            'continent_name': 'Tyria',
+            'region_id': 4,
+            'region_name': 'Kryta',
+            'map_name': 'Map %d' % map_id,
+            'min_level': 1,
+            'max_level': 15,
+            'map_rect': [[-10000, -10000], [10000, 10000]],
+            'continent_rect': [[0, 0], [2000, 2000]]
+        }
+
+    def map_transform(self, map_id, fetch=True):
+        mapdata = self.map_data(map_id, fetch=fetch)
+        if mapdata is None:
+            return None
+        return MapTransform.from_map_data(mapdata, map_id)
+
+    def character_info(self, name):
+        self.char_calls += 1
+        return {'name': name, 'level': 80}
+
+    def tile_path(self, continent, floor, zoom, x, y):
+        return self.tiles.get((continent, floor, zoom, x, y))
+
+
+class FakeServer(object):
+    """
+    Stand-in for :py:class:`~.TwistedServer`. Websocket messages are
+    recorded in ``sent`` (session, type) and ``data``; MumbleLink updates in
+    ``updates`` (time, data, partial) and the resulting full data in
+    ``states``.
+    """
+
+    def __init__(self, reactor=None):
+        self.reactor = FakeReactor() if reactor is None else reactor
+        self.cache = FakeCache()
+        self.warmer = None
+        self.sent = []
+        self.data = []
+        self.updates = []
+        self.states = []
+
+    def make_poll_scheduler(self, poll):
+        return PollScheduler(self.reactor, poll, 1.0, 0.1, 5.0)
+
+    def _ws_send(self, msg_type, data, session=None):
+        self.sent.append((session, msg_type))
+        self.data.append(data)
+
+    def update_mumble_data(self, data, partial=False):
+        state = dict(self.states[-1], **data) if partial else data
+        self.updates.append((self.reactor.seconds(), data, partial))
+        self.states.append(state)
+        return set(data.keys())
+
+
+def mumble_data(name='Foo', map_id=15, x=1.0, front=(1.0, 0.0, 0.0)):
+    """Return decoded MumbleLink data, as a reader would pass it on."""
+    return {
+        'uiTick': 1,
+        'identity': {'name': name, 'profession': 1, 'race': 0},
+        'context': {'mapId': map_id},
+        'fAvatarPosition': [x, 2.0, 3.0],
+        'fAvatarFront': list(front)
+    }
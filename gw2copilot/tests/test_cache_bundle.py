@@ -0,0 +1,140 @@
+"""
+gw2copilot/tests/test_cache_bundle.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import io
+import os
+import json
+import tarfile
+
+import pytest
+
+from gw2copilot.cache_bundle import (
+    export_cache_bundle, import_cache_bundle, MANIFEST_NAME
+)
+
+
+def _write(base, rel, data):
+    path = os.path.join(str(base), *rel.split('/'))
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    return path
+
+
+def _make_cache(base):
+    _write(base, 'mapdata/15.json', b'{"name": "Queensdale"}')
+    _write(base, 'assets/map_poi.png', b'\x89PNG fake')
+    _write(base, 'tiles/1_1_3_2_2.jpg', b'\xff\xd8 fake jpeg')
+    _write(base, 'user_settings/zone_reminders.json', b'[]')
+    _write(base, 'mapdata/ids.json.123.456.tmp', b'partial')
+
+
+class TestCacheBundle(object):
+
+    def test_round_trip(self, tmpdir):
+        src = tmpdir.mkdir('src')
+        dest = tmpdir.mkdir('dest')
+        _make_cache(src)
+        bundle = str(tmpdir.join('bundle.tar.gz'))
+        manifest = export_cache_bundle(str(src), bundle, build_id=12345)
+        assert sorted(manifest['files'].keys()) == [
+            'assets/map_poi.png', 'mapdata/15.json'
+        ]
+        res = import_cache_bundle(bundle, str(dest))
+        assert res['build_id'] == 12345
+        assert dest.join('mapdata', '15.json').read() == \
+            '{"name": "Queensdale"}'
+        assert dest.join('assets', 'map_poi.png').check()
+        assert not dest.join('tiles').check()
+        assert not dest.join('user_settings').check()
+        assert os.listdir(str(dest.join('mapdata'))) == ['15.json']
+
+    def test_include_tiles(self, tmpdir):
+        src = tmpdir.mkdir('src')
+        _make_cache(src)
+        bundle = str(tmpdir.join('bundle.tar.gz'))
+        manifest = export_cache_bundle(str(src), bundle, include_tiles=True)
+        assert 'tiles/1_1_3_2_2.jpg' in manifest['files']
+
+    def _bundle(self, path, manifest, members):
+        with tarfile.open(path, 'w:gz') as tar:
+            for name, data in [
+                (MANIFEST_NAME, json.dumps(manifest).encode('utf-8'))
+            ] + members:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    def test_bad_checksum_leaves_cache_untouched(self, tmpdir):
+        src = tmpdir.mkdir('src')
+        dest = tmpdir.mkdir('dest')
+        _make_cache(src)
+        bundle = str(tmpdir.join('bundle.tar.gz'))
+        manifest = export_cache_bundle(str(src), bundle)
+        manifest['files']['mapdata/15.json']['sha256'] = '0' * 64
+        with open(str(src.join('mapdata', '15.json')), 'rb') as fh:
+            good = fh.read()
+        with open(str(src.join('assets', 'map_poi.png')), 'rb') as fh:
+            asset = fh.read()
+        self._bundle(bundle, manifest, [
+            ('assets/map_poi.png', asset), ('mapdata/15.json', good)
+        ])
+        with pytest.raises(ValueError) as excinfo:
+            import_cache_bundle(bundle, str(dest))
+        assert 'Checksum mismatch' in str(excinfo.value)
+        # no files, temporary or otherwise, were left behind
+        for d in dest.listdir():
+            assert d.listdir() == []
+
+    def test_rejects_path_traversal(self, tmpdir):
+        bundle = str(tmpdir.join('bundle.tar.gz'))
+        manifest = {'schema_version': 1, 'files': {}}
+        self._bundle(bundle, manifest, [('mapdata/../../evil', b'x')])
+        with pytest.raises(ValueError) as excinfo:
+            import_cache_bundle(bundle, str(tmpdir.mkdir('dest')))
+        assert 'Invalid path' in str(excinfo.value)
+        assert not tmpdir.join('evil').check()
+
+    def test_rejects_bad_schema(self, tmpdir):
+        bundle = str(tmpdir.join('bundle.tar.gz'))
+        self._bundle(bundle, {'schema_version': 99, 'files': {}}, [])
+        with pytest.raises(ValueError) as excinfo:
+            import_cache_bundle(bundle, str(tmpdir.mkdir('dest')))
+        assert 'schema version' in str(excinfo.value)
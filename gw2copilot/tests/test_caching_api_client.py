@@ -0,0 +1,240 @@
+"""
+gw2copilot/tests/test_caching_api_client.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+import sys
+import json
+import time
+
+from gw2copilot import caching_api_client
+from gw2copilot.caching_api_client import (
+    CachingAPIClient, GW2TIMER_URL, TTL_1DAY
+)
+
+if sys.version_info[0] < 3:
+    from mock import patch, Mock
+else:
+    from unittest.mock import patch, Mock
+
+RESOURCE = 'var GW2T_RESOURCE_DATA = {};\n'
+
+GENERAL = (
+    'var GW2T_GATEWAY_CONNECTION = {\n'
+    '    interborders: [],\n'
+    '    interzones: [],\n'
+    '    intrazones: [],\n'
+    '    launchpads: []\n'
+    '};\n'
+)
+
+EMPTY_PATHS = {
+    'interborders': [], 'interzones': [], 'intrazones': [], 'launchpads': []
+}
+
+
+QUEENSDALE = {
+    'continent_rect': [[42624, 28032], [46752, 30912]],
+    'map_rect': [[-43008, -27648], [43008, 30720]],
+    'points_of_interest': {
+        'waypoint': [
+            {'name': 'Shaemoor Waypoint', 'coord': [44000, 29000],
+             'chat_link': '[&BPoAAAA=]'}
+        ]
+    }
+}
+
+
+def load_map_catalog(cache):
+    """load a one-map catalog into ``cache`` without the network"""
+    cache._cache_set('mapdata', 'ids', [15])
+    cache._cache_set('mapdata', 15, QUEENSDALE)
+    return cache.all_maps
+
+
+class FakeUpstream(object):
+    """stand-in for ``requests.get`` serving gw2timer data files"""
+
+    def __init__(self):
+        self.files = {'resource': RESOURCE, 'general': GENERAL}
+        self.status_code = 200
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        name = url.rsplit('/', 1)[1][:-3]
+        return Mock(status_code=self.status_code, content=self.files[name])
+
+
+class TestRefreshGW2TimerData(object):
+
+    def setup_method(self):
+        self.upstream = FakeUpstream()
+        self.patcher = patch.object(caching_api_client.requests, 'get',
+                                    self.upstream)
+        self.patcher.start()
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def cache(self, tmpdir):
+        return CachingAPIClient(str(tmpdir.join('cache')))
+
+    def path(self, tmpdir, name, extn='js'):
+        return str(tmpdir.join('cache', 'gw2timer', '%s.%s' % (name, extn)))
+
+    def read(self, tmpdir, name, extn='js'):
+        with open(self.path(tmpdir, name, extn), 'r') as fh:
+            return fh.read()
+
+    def expire(self, tmpdir, *names):
+        old = time.time() - TTL_1DAY - 60
+        for name in names:
+            os.utime(self.path(tmpdir, name), (old, old))
+
+    def test_initial(self, tmpdir):
+        c = self.cache(tmpdir)
+        assert c.refresh_gw2timer_data() == ['resource', 'general', 'travel']
+        assert self.upstream.urls == [
+            GW2TIMER_URL % 'resource', GW2TIMER_URL % 'general']
+        res = self.read(tmpdir, 'resource')
+        assert res.startswith('// generated by gw2copilot ')
+        assert res.endswith(RESOURCE)
+        assert c._strip_gw2timer_header(res) == RESOURCE
+        assert json.loads(self.read(tmpdir, 'travel', 'json')) == EMPTY_PATHS
+        assert 'GW2T_TRAVEL_PATHS' in self.read(tmpdir, 'travel')
+        assert c.travel_paths == EMPTY_PATHS
+
+    def test_ttl(self, tmpdir):
+        c = self.cache(tmpdir)
+        c.refresh_gw2timer_data()
+        del self.upstream.urls[:]
+        assert c.refresh_gw2timer_data() == []
+        assert self.upstream.urls == []
+        # only the expired file is re-checked
+        self.expire(tmpdir, 'general')
+        assert c.refresh_gw2timer_data() == []
+        assert self.upstream.urls == [GW2TIMER_URL % 'general']
+
+    def test_unchanged_upstream(self, tmpdir):
+        c = self.cache(tmpdir)
+        c.refresh_gw2timer_data()
+        before = self.read(tmpdir, 'general')
+        travel = self.read(tmpdir, 'travel')
+        self.expire(tmpdir, 'resource', 'general')
+        del self.upstream.urls[:]
+        assert c.refresh_gw2timer_data() == []
+        assert len(self.upstream.urls) == 2
+        # the file is kept as-is, but its age is reset
+        assert self.read(tmpdir, 'general') == before
+        assert self.read(tmpdir, 'travel') == travel
+        assert time.time() - os.stat(self.path(tmpdir, 'general')).st_mtime \
+            < 60
+        del self.upstream.urls[:]
+        assert c.refresh_gw2timer_data() == []
+        assert self.upstream.urls == []
+
+    def test_http_error_keeps_stale(self, tmpdir):
+        c = self.cache(tmpdir)
+        c.refresh_gw2timer_data()
+        before = self.read(tmpdir, 'general')
+        self.expire(tmpdir, 'resource', 'general')
+        self.upstream.status_code = 503
+        self.upstream.files['general'] = GENERAL + '// changed\n'
+        assert c.refresh_gw2timer_data() == []
+        assert self.read(tmpdir, 'general') == before
+        # still expired, so the next refresh tries again
+        self.upstream.status_code = 200
+        assert c.refresh_gw2timer_data() == ['general', 'travel']
+        assert self.read(tmpdir, 'general').endswith('// changed\n')
+
+    def test_request_exception_keeps_stale(self, tmpdir):
+        c = self.cache(tmpdir)
+        c.refresh_gw2timer_data()
+        before = self.read(tmpdir, 'resource')
+        self.expire(tmpdir, 'resource')
+        with patch.object(caching_api_client.requests, 'get',
+                          Mock(side_effect=RuntimeError('no network'))):
+            assert c.refresh_gw2timer_data() == []
+        assert self.read(tmpdir, 'resource') == before
+
+    def test_no_data(self, tmpdir):
+        self.upstream.status_code = 404
+        c = self.cache(tmpdir)
+        assert c.refresh_gw2timer_data() == []
+        assert not os.path.exists(self.path(tmpdir, 'travel'))
+        assert c.travel_paths is None
+
+    def test_travel_regenerated(self, tmpdir):
+        c = self.cache(tmpdir)
+        c.refresh_gw2timer_data()
+        # no map catalog yet, so no graph
+        assert c.travel_graph is None
+        load_map_catalog(c)
+        graph = c.travel_graph
+        assert graph is not None
+        self.expire(tmpdir, 'general')
+        self.upstream.files['general'] = GENERAL + '// changed\n'
+        assert c.refresh_gw2timer_data() == ['general', 'travel']
+        # the refresh rebuilds the graph
+        assert c.travel_graph is not None
+        assert c.travel_graph is not graph
+        # missing travel files are regenerated even if general.js hasn't
+        # changed
+        os.unlink(self.path(tmpdir, 'travel', 'json'))
+        assert c.refresh_gw2timer_data() == ['travel']
+        assert json.loads(self.read(tmpdir, 'travel', 'json')) == EMPTY_PATHS
+
+    def test_travel_parse_error(self, tmpdir):
+        self.upstream.files['general'] = 'var foo = 1;\n'
+        c = self.cache(tmpdir)
+        assert c.refresh_gw2timer_data() == ['resource', 'general']
+        assert not os.path.exists(self.path(tmpdir, 'travel'))
+        assert not os.path.exists(self.path(tmpdir, 'travel', 'json'))
+
+
+class TestTravelGraph(object):
+
+    def test_built_with_map_catalog(self, tmpdir):
+        c = CachingAPIClient(str(tmpdir))
+        assert c.travel_graph is None
+        load_map_catalog(c)
+        graph = c.travel_graph
+        assert graph is not None
+        assert graph.map_at(44000, 29000) == 15
+        # reading it doesn't rebuild it
+        assert c.travel_graph is graph
@@ -0,0 +1,155 @@
+"""
+gw2copilot/tests/test_caching_file.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+import sys
+from twisted.web import http
+from twisted.web.http_headers import Headers
+from twisted.web.server import Request
+from twisted.web.test.requesthelper import DummyChannel
+
+from gw2copilot.caching_file import CachingFile, file_etag
+from gw2copilot.site import (
+    GW2CopilotSite, STATIC_CACHE_CONTROL, CACHE_DIR_CACHE_CONTROL
+)
+
+if sys.version_info[0] < 3:
+    from mock import patch, Mock, MagicMock
+else:
+    from unittest.mock import patch, Mock, MagicMock
+
+
+def make_request(method='GET', headers=None):
+    req = Request(DummyChannel(), False)
+    req.method = method
+    req.uri = '/foo'
+    req.clientproto = 'HTTP/1.1'
+    if headers is not None:
+        req.requestHeaders = Headers(
+            dict((k, [v]) for k, v in headers.items()))
+    return req
+
+
+def test_file_etag():
+    assert file_etag(1.5, 10) == '"5dc-a"'
+    assert file_etag(1.5, 10) != file_etag(1.501, 10)
+    assert file_etag(1.5, 10) != file_etag(1.5, 11)
+
+
+class TestCachingFile(object):
+
+    def write_file(self, tmpdir):
+        p = tmpdir.join('foo.js')
+        p.write('var foo = 1;')
+        p.setmtime(1479659900)
+        return str(p)
+
+    def test_headers(self, tmpdir):
+        path = self.write_file(tmpdir)
+        f = CachingFile(path, cache_control='public, max-age=60')
+        req = make_request()
+        f.render(req)
+        assert req.code == http.OK
+        assert req.etag == file_etag(1479659900, 12)
+        assert req.lastModified == 1479659900
+        assert req.responseHeaders.getRawHeaders('cache-control') == [
+            'public, max-age=60']
+
+    def test_default_cache_control(self, tmpdir):
+        f = CachingFile(self.write_file(tmpdir))
+        req = make_request(method='HEAD')
+        f.render(req)
+        assert req.responseHeaders.getRawHeaders('cache-control') == [
+            'no-cache']
+        assert req.etag == file_etag(1479659900, 12)
+
+    def test_explicit_etag(self, tmpdir):
+        f = CachingFile(self.write_file(tmpdir), etag='"abc"')
+        req = make_request()
+        f.render(req)
+        assert req.etag == '"abc"'
+
+    def test_if_none_match(self, tmpdir):
+        f = CachingFile(self.write_file(tmpdir))
+        etag = file_etag(1479659900, 12)
+        req = make_request(headers={'If-None-Match': etag})
+        assert f.render(req) == ''
+        assert req.code == http.NOT_MODIFIED
+        req = make_request(headers={'If-None-Match': '"other"'})
+        f.render(req)
+        assert req.code == http.OK
+
+    def test_changed_file(self, tmpdir):
+        path = self.write_file(tmpdir)
+        f = CachingFile(path)
+        etag = file_etag(1479659900, 12)
+        tmpdir.join('foo.js').write('var foo = 12;')
+        req = make_request(headers={'If-None-Match': etag})
+        f.render(req)
+        assert req.code == http.OK
+        assert req.etag != etag
+
+    def test_child_inherits_cache_control(self, tmpdir):
+        self.write_file(tmpdir)
+        root = CachingFile(str(tmpdir), cache_control='public',
+                           etag='"root"')
+        child = root.getChild('foo.js', make_request())
+        assert isinstance(child, CachingFile)
+        assert child.cache_control == 'public'
+        assert child.etag is None
+
+
+class TestSiteResources(object):
+
+    def test_one_resource_per_root(self, tmpdir):
+        server = Mock()
+        server.cache.cache_dir = str(tmpdir)
+        # routes aren't needed, and Mock attributes look like routes
+        with patch.object(GW2CopilotSite, '_add_routes'):
+            site = GW2CopilotSite(server)
+        req = MagicMock(postpath=['mapdata', 'mapdata.js'])
+        static = site.static_files(req)
+        assert isinstance(static, CachingFile)
+        assert static.cache_control == STATIC_CACHE_CONTROL
+        assert site.static_files(req) is static
+        cache = site.cache_files(req)
+        assert isinstance(cache, CachingFile)
+        assert cache.cache_control == CACHE_DIR_CACHE_CONTROL
+        assert cache.path == os.path.abspath(str(tmpdir))
+        assert site.cache_files(req) is cache
+        assert cache is not static
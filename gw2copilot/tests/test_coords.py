@@ -0,0 +1,99 @@
+"""
+gw2copilot/tests/test_coords.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import pytest
+
+from gw2copilot.coords import (
+    MapTransform, build_transforms, INCHES_PER_METER
+)
+
+# Queensdale
+MAP_RECT = [[-43008, -27648], [43008, 30720]]
+CONTINENT_RECT = [[42624, 28032], [46752, 30720]]
+
+
+def reference(x, y):
+    # the original PlayerInfo._continent_coords calculation
+    map_rect = MAP_RECT
+    con_rect = CONTINENT_RECT
+    con_x = (x - map_rect[0][0]) / (map_rect[1][0] - map_rect[0][0]) * \
+        (con_rect[1][0] - con_rect[0][0]) + con_rect[0][0]
+    con_y = ((-1 * y) - map_rect[0][1]) / \
+        (map_rect[1][1] - map_rect[0][1]) * \
+        (con_rect[1][1] - con_rect[0][1]) + con_rect[0][1]
+    return con_x, con_y
+
+
+class TestMapTransform(object):
+
+    def setup_method(self):
+        self.t = MapTransform(15, MAP_RECT, CONTINENT_RECT)
+
+    def test_matches_reference(self):
+        for x, y in [(0.0, 0.0), (-43008.0, 27648.0), (1234.5, -9876.5)]:
+            assert self.t.map_to_continent(x, y) == pytest.approx(
+                reference(x, y))
+
+    def test_round_trips(self):
+        cx, cy = self.t.map_to_continent(1234.5, -9876.5)
+        assert self.t.continent_to_map(cx, cy) == pytest.approx(
+            (1234.5, -9876.5))
+        cx, cy = self.t.mumble_to_continent(100.0, -50.0)
+        assert (cx, cy) == pytest.approx(
+            reference(100.0 * INCHES_PER_METER, -50.0 * INCHES_PER_METER))
+        assert self.t.continent_to_mumble(cx, cy) == pytest.approx(
+            (100.0, -50.0))
+
+    def test_contains(self):
+        assert self.t.contains(44000, 29000)
+        assert not self.t.contains(40000, 29000)
+
+    def test_empty_map_rect(self):
+        with pytest.raises(ValueError):
+            MapTransform(1, [[0, 0], [0, 10]], CONTINENT_RECT)
+
+
+def test_build_transforms():
+    maps = {
+        15: {'map_rect': MAP_RECT, 'continent_rect': CONTINENT_RECT},
+        16: {'map_rect': [[0, 0], [0, 0]], 'continent_rect': CONTINENT_RECT},
+        17: {'name': 'no rects'}
+    }
+    result = build_transforms(maps)
+    assert list(result.keys()) == [15]
+    assert result[15].map_id == 15
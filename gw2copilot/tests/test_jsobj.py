@@ -0,0 +1,121 @@
+"""
+gw2copilot/tests/test_jsobj.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+
+from gw2copilot.jsobj import parse_js_object, tokenize_js
+from gw2copilot.utils import extract_js_var
+
+GATEWAY_SRC = """
+// comment before the variable
+var GW2T_GATEWAY_CONNECTION = {
+    interborders: [
+        [[16024, 14752], [16312, 14720]], /* inline comment */
+        [[.5, 1e2], [0x10, -3]],
+    ],
+    "launchpads": [
+        {c: [[1, 2], [3, 4]], label: "Launch" + " Pad"}
+    ],
+    flags: {on: true, off: false, none: null, ref: SOME_CONST},
+    sum: 1 + 2,
+    'quoted key': 'it\\'s'
+};
+var OTHER = [1];
+"""
+
+
+class TestTokenizeJS(object):
+
+    def test_skips_whitespace_and_comments(self):
+        toks = list(tokenize_js('var x = /* c */ 1; // trailing'))
+        assert [(t[0], t[1]) for t in toks] == [
+            ('name', 'var'), ('name', 'x'), ('punct', '='),
+            ('number', '1'), ('punct', ';')
+        ]
+
+    def test_bad_character(self):
+        with pytest.raises(ValueError):
+            list(tokenize_js('var x = #;'))
+
+
+class TestParseJSObject(object):
+
+    def test_gateway_connection(self):
+        res = parse_js_object(GATEWAY_SRC)
+        assert res['OTHER'] == [1]
+        data = res['GW2T_GATEWAY_CONNECTION']
+        assert data['interborders'] == [
+            [[16024, 14752], [16312, 14720]],
+            [[0.5, 100.0], [16, -3]]
+        ]
+        assert data['launchpads'] == [
+            {'c': [[1, 2], [3, 4]], 'label': 'Launch Pad'}
+        ]
+        assert data['flags'] == {
+            'on': True, 'off': False, 'none': None, 'ref': 'SOME_CONST'
+        }
+        assert data['sum'] == 3
+        assert data['quoted key'] == "it\\'s"
+
+    def test_extracted_var(self):
+        src = extract_js_var(GATEWAY_SRC, 'GW2T_GATEWAY_CONNECTION')
+        assert src.startswith('var GW2T_GATEWAY_CONNECTION = {')
+        assert src.endswith('};\n')
+        res = parse_js_object(src)
+        assert list(res.keys()) == ['GW2T_GATEWAY_CONNECTION']
+
+    def test_memoized(self):
+        assert parse_js_object(GATEWAY_SRC) is parse_js_object(GATEWAY_SRC)
+
+    def test_use_unicode(self):
+        res = parse_js_object('var x = "caf\\u00e9";', use_unicode=True)
+        assert res['x'] == u'caf\u00e9'
+
+    def test_not_var_statement(self):
+        with pytest.raises(ValueError) as excinfo:
+            parse_js_object('x = 1;')
+        assert 'var statements' in str(excinfo.value)
+
+    def test_mixed_plus(self):
+        with pytest.raises(ValueError):
+            parse_js_object('var x = "a" + 1;')
+
+    def test_unterminated(self):
+        with pytest.raises(ValueError):
+            parse_js_object('var x = {a: [1, 2};')
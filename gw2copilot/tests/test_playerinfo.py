@@ -0,0 +1,141 @@
+"""
+gw2copilot/tests/test_playerinfo.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+from gw2copilot.playerinfo import PlayerInfo
+from gw2copilot.tests.fakes import FakeCache, mumble_data
+
+
+class TestPlayerInfo(object):
+
+    def setup_method(self):
+        self.cache = FakeCache()
+        self.pi = PlayerInfo(self.cache)
+        self.pi.update_mumble_link(mumble_data())
+
+    def test_first_update(self):
+        assert self.pi.position_changed is True
+        assert self.pi.player_changed is True
+        assert self.pi.player_dict == {
+            'name': 'Foo', 'profession': 'Guardian', 'race': 'Asura',
+            'level': 80
+        }
+        assert self.pi.as_dict['map_level_range'] == '1-15'
+
+    def test_views_cached_until_inputs_change(self):
+        pos = self.pi.position
+        player = self.pi.player_dict
+        full = self.pi.as_dict
+        assert self.pi.position is pos
+        self.pi.update_mumble_link(
+            mumble_data(front=(0.0, 0.0, 1.0)), changed=set(['fAvatarFront']))
+        assert self.pi.position_changed is False
+        assert self.pi.player_changed is False
+        assert self.pi.position is pos
+        assert self.pi.player_dict is player
+        assert self.pi.as_dict is not full
+        assert self.pi.as_dict['facing_direction'] == 270
+        assert self.cache.char_calls == 1
+
+    def test_position_change(self):
+        pos = self.pi.position
+        self.pi.update_mumble_link(
+            mumble_data(x=50.0), changed=set(['fAvatarPosition']))
+        assert self.pi.position_changed is True
+        assert self.pi.position is not pos
+        assert self.pi.position['position'] != pos['position']
+        # same coordinates again
+        self.pi.update_mumble_link(
+            mumble_data(x=50.0), changed=set(['fAvatarPosition']))
+        assert self.pi.position_changed is False
+
+    def test_identity_change(self):
+        player = self.pi.player_dict
+        self.pi.update_mumble_link(mumble_data(), changed=set(['identity']))
+        assert self.pi.player_changed is False
+        assert self.pi.player_dict is player
+        self.pi.update_mumble_link(mumble_data(name='Bar'),
+                                   changed=set(['identity']))
+        assert self.pi.player_changed is True
+        assert self.pi.player_dict['name'] == 'Bar'
+
+    def test_uncached_map(self):
+        self.cache.uncached.add(50)
+        pos = self.pi.position
+        samples = len(self.pi.samples)
+        self.pi.update_mumble_link(
+            mumble_data(map_id=50, x=50.0),
+            changed=set(['context', 'fAvatarPosition']))
+        assert self.pi.map_changed is True
+        assert self.pi.map_pending is True
+        assert self.pi.map_id == 50
+        # the views still describe the previous map and position
+        assert self.pi.position_changed is False
+        assert self.pi.position is pos
+        assert self.pi.as_dict['map_name'] == 'Map 15'
+        assert len(self.pi.samples) == samples
+        # cached now, but the miss is remembered until retry_map()
+        self.cache.uncached.discard(50)
+        self.pi.update_mumble_link(
+            mumble_data(map_id=50, x=60.0),
+            changed=set(['context', 'fAvatarPosition']))
+        assert self.pi.map_changed is False
+        assert self.pi.map_pending is True
+        assert self.pi.position is pos
+        assert len(self.pi.samples) == samples
+        self.pi.retry_map()
+        self.pi.update_mumble_link(mumble_data(map_id=50, x=60.0),
+                                   changed=set(['uiTick']))
+        assert self.pi.map_pending is False
+        assert self.pi.map_changed is False
+        assert self.pi.position_changed is True
+        assert self.pi.position['map_id'] == 50
+        assert self.pi.position['position'] != pos['position']
+        assert self.pi.as_dict['map_name'] == 'Map 50'
+        assert len(self.pi.samples) == samples + 1
+        assert self.pi.samples.latest.map_id == 50
+
+    def test_uncached_map_and_back(self):
+        self.cache.uncached.add(50)
+        self.pi.update_mumble_link(mumble_data(map_id=50),
+                                   changed=set(['context']))
+        assert self.pi.map_pending is True
+        self.pi.update_mumble_link(mumble_data(map_id=15),
+                                   changed=set(['context']))
+        assert self.pi.map_changed is True
+        assert self.pi.map_pending is False
+        assert self.pi.map_id == 15
@@ -0,0 +1,125 @@
+"""
+gw2copilot/tests/test_poll_scheduler.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+
+from gw2copilot.poll_scheduler import PollScheduler
+from gw2copilot.sessions import MumbleSession
+from gw2copilot.shm_mumble_reader import (
+    ShmMumbleLinkReader, LinkWriter, synthetic_frames
+)
+from gw2copilot.tests.fakes import FakeReactor, FakeServer
+
+
+class TestPollScheduler(object):
+
+    def setup_method(self, _):
+        self.reactor = FakeReactor()
+        self.results = []
+        self.sched = PollScheduler(self.reactor, self.poll, 1.0, 0.1, 5.0)
+
+    def poll(self):
+        return self.results.pop(0)
+
+    def test_backoff_and_speedup(self):
+        self.sched.start()
+        assert self.reactor.calls[0].delay == 0
+        self.results = [None, set(['uiTick']), None, None,
+                        set(['uiTick', 'fAvatarPosition']), set(['uiTick'])]
+        assert self.reactor.run_next() == 2.0
+        # tick advanced but nothing moved
+        assert self.reactor.run_next() == 4.0
+        assert self.reactor.run_next() == 5.0
+        assert self.reactor.run_next() == 5.0
+        assert self.reactor.run_next() == 0.1
+        assert self.sched.rate == 10.0
+        assert self.reactor.run_next() == pytest.approx(0.2)
+
+    def test_async_observe(self):
+        self.sched.start()
+        self.results = [None, None]
+        self.sched.observe(set(['fCameraFront']))
+        assert self.reactor.run_next() == 0.1
+        assert self.reactor.run_next() == pytest.approx(0.2)
+
+    def test_poll_exception(self):
+        self.sched.start()
+        # poll raises IndexError; polling continues
+        assert self.reactor.run_next() == 2.0
+        self.sched.stop()
+        assert self.reactor.calls[-1].cancelled is True
+
+    def test_limits(self):
+        with pytest.raises(ValueError):
+            PollScheduler(self.reactor, self.poll, 1.0, 6.0, 5.0)
+        sched = PollScheduler(self.reactor, self.poll, 10.0, 0.1, 5.0)
+        assert sched.interval == 5.0
+        assert sched.status == {
+            'rate': 0.2, 'interval': 5.0, 'min_interval': 0.1,
+            'max_interval': 5.0
+        }
+
+
+class TestPollSchedulerWithReader(object):
+
+    def test_reader_session_and_scheduler(self, tmpdir):
+        path = str(tmpdir.join('MumbleLink'))
+        writer = LinkWriter(path)
+        frames = synthetic_frames(steps=8)
+        server = FakeServer()
+        reactor = server.reactor
+        session = MumbleSession(server, 'MumbleLink')
+        reader = ShmMumbleLinkReader(session, 1.0, path=path)
+        assert isinstance(reader.poll_scheduler, PollScheduler)
+        # running around; update_mumble_data reports the movement
+        for _ in range(3):
+            writer.write(**next(frames))
+            assert reactor.run_next() == 0.1
+        assert session.raw_mumble_link_data['uiTick'] == 3
+        # standing still, then uiTick stalled
+        frame = next(frames)
+        writer.write(**frame)
+        assert reactor.run_next() == 0.1
+        writer.write(**frame)
+        assert reactor.run_next() == pytest.approx(0.2)
+        assert reactor.run_next() == pytest.approx(0.4)
+        # moving again
+        writer.write(**next(frames))
+        assert reactor.run_next() == 0.1
+        writer.close()
@@ -0,0 +1,155 @@
+"""
+gw2copilot/tests/test_prefetch.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+from gw2copilot.prefetch import ZonePrefetcher, tiles_for_rect
+from gw2copilot.tests.fakes import FakeCache, FakeThreads
+
+
+class FakeTileStore(object):
+
+    def __init__(self):
+        self.cached = set([(1, 1, 3, 0, 0)])
+
+    def lookup(self, key):
+        return 'abc' if key in self.cached else None
+
+
+class PrefetchCache(FakeCache):
+    """:py:class:`~.FakeCache` with per-map data, recording retrievals"""
+
+    maps = {
+        15: {'continent_id': 1, 'default_floor': 1,
+             'continent_rect': [[0, 0], [4096, 2048]]},
+        16: {'continent_id': 1, 'default_floor': 1,
+             'continent_rect': [[4096, 0], [6144, 2048]]},
+        99: {'continent_id': 2, 'default_floor': 1,
+             'continent_rect': [[0, 0], [2048, 2048]]}
+    }
+
+    def __init__(self):
+        super(PrefetchCache, self).__init__()
+        self.calls = []
+        self.tile_store = FakeTileStore()
+
+    def map_data(self, map_id, fetch=True):
+        self.calls.append(('map', map_id))
+        if map_id == 50:
+            raise RuntimeError('API error')
+        return self.maps[map_id]
+
+    def map_neighbors(self, map_id):
+        return {15: [16, 50, 99]}.get(map_id, [])
+
+    def map_floor(self, continent, floor):
+        self.calls.append(('floor', continent, floor))
+
+    def tile(self, *key):
+        self.calls.append(('tile',) + key)
+
+
+def test_tiles_for_rect():
+    # zoom 3 tiles are 4096 continent units across
+    assert tiles_for_rect([[0, 0], [4096, 2048]], 3) == [(0, 0)]
+    assert tiles_for_rect([[4000, 0], [8200, 100]], 3) == [
+        (0, 0), (1, 0), (2, 0)]
+    assert tiles_for_rect([[0, 0], [12288, 100]], 3,
+                          center=(9000, 50)) == [(2, 0), (1, 0), (0, 0)]
+    assert len(tiles_for_rect([[0, 0], [81920, 114688]], 7, limit=10)) == 10
+
+
+class TestZonePrefetcher(object):
+
+    def setup_method(self):
+        self.cache = PrefetchCache()
+        self.run = FakeThreads()
+        self.p = ZonePrefetcher(self.cache, self.run)
+        self.p.note_tile(1, 1, 3)
+
+    def test_priority_order(self):
+        job = self.p.prefetch(15, position=(100, 100))
+        self.run.run()
+        assert self.cache.calls == [
+            ('map', 15),
+            ('floor', 1, 1),
+            # (0, 0) is already cached
+            ('map', 16),
+            ('map', 50),
+            ('map', 99),
+            ('tile', 1, 1, 3, 1, 0),
+            # map 99 is on another continent; no tiles
+            ('floor', 2, 1)
+        ]
+        assert job.finished is True
+        assert job.map_done is True
+        assert job.failed == 1
+        assert job.completed == 8
+
+    def test_map_only(self):
+        p = ZonePrefetcher(self.cache, self.run, neighbors=False,
+                           tiles=False)
+        job = p.prefetch(15)
+        assert job.map_done is False
+        self.run.run(limit=1)
+        assert job.map_done is True
+        self.run.run()
+        assert self.cache.calls == [('map', 15), ('floor', 1, 1)]
+
+    def test_map_failed(self):
+        job = self.p.prefetch(50)
+        self.run.run()
+        assert job.map_done is True
+        assert job.failed == 1
+
+    def test_cancel(self):
+        job = self.p.prefetch(15)
+        self.run.run(limit=2)
+        assert job.pending > 0
+        job.cancel()
+        assert job.pending == 0
+        # the task already running completes; nothing more is started
+        self.run.run()
+        assert job.finished is True
+        assert self.cache.calls == [('map', 15), ('floor', 1, 1)]
+
+    def test_concurrency(self):
+        p = ZonePrefetcher(self.cache, self.run, concurrency=2,
+                           neighbors=False)
+        p.prefetch(15)
+        assert len(self.run.pending) == 1
+        self.run.run(limit=1)
+        assert len(self.run.pending) == 2
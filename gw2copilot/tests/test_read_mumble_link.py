@@ -0,0 +1,245 @@
+"""
+gw2copilot/tests/test_read_mumble_link.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import mmap
+import struct
+import threading
+
+from gw2copilot.read_mumble_link import (
+    LinkDecoder, DeltaEncoder, BinaryFrameEncoder, BinaryFramer, LineFramer,
+    FlowControl, decode_frame, pack_link, LINK_SIZE, FRAME_KEY, FRAME_DELTA,
+    FRAME_ERROR, _wstr
+)
+
+IDENTITY = {
+    "name": "Jantman",
+    "profession": 4,
+    "race": 3,
+    "map_id": 50,
+    "world_id": 268435465,
+    "team_color_id": 0,
+    "commander": False,
+    "fov": 0.873
+}
+
+CONTEXT = {
+    "buildId": 68550,
+    "mapId": 50,
+    "shardId": 268435465,
+    "instance": 0,
+    "mapType": 5,
+    "serverAddress": {
+        "sin_port": 27999,
+        "sin_addr": "97.105.110.95",
+        "sin_family": 2
+    }
+}
+
+
+def sample(tick=124):
+    return dict(
+        uiVersion=2, uiTick=tick,
+        fAvatarPosition=[-33.5, 25.5, 316.75],
+        fAvatarFront=[0.125, 0.0, -0.5],
+        fAvatarTop=[0.0, 0.0, 0.0],
+        name=u'Guild Wars 2',
+        fCameraPosition=[-33.75, 27.5, 318.25],
+        fCameraFront=[0.25, -0.25, -0.75],
+        fCameraTop=[0.0, 0.0, 0.0],
+        identity=IDENTITY,
+        context_len=48,
+        context=CONTEXT,
+        description=u''
+    )
+
+
+class TestLinkDecoder(object):
+
+    def test_round_trip_from_mmap(self):
+        buf = pack_link(**sample())
+        assert len(buf) == LINK_SIZE
+        mm = mmap.mmap(-1, LINK_SIZE)
+        mm.write(buf)
+        dec = LinkDecoder()
+        assert dec.tick(mm) == (2, 124)
+        assert dec.decode(mm) == sample()
+
+    def test_identity_cache(self):
+        dec = LinkDecoder()
+        first = dec.decode(pack_link(**sample(1)))
+        first['identity']['name'] = 'changed'
+        second = dec.decode(pack_link(**sample(2)))
+        assert second['identity'] == IDENTITY
+        assert second['uiTick'] == 2
+
+    def test_invalid_identity(self):
+        data = sample()
+        data['identity'] = u'not json'
+        res = LinkDecoder().decode(pack_link(**data))
+        assert res['identity'] == u'not json'
+
+    def test_wstr(self):
+        # a NUL high byte must not be taken as the terminator
+        raw = u'\u0100a'.encode('utf-16-le') + b'\x00' * 8
+        assert _wstr(raw) == u'\u0100a'
+        assert _wstr(u'abc'.encode('utf-16-le')) == u'abc'
+
+    def test_layout(self):
+        buf = pack_link(**sample())
+        assert struct.unpack_from('<I', buf, 1104)[0] == 48
+        assert buf[44:44 + 24].decode('utf-16-le') == u'Guild Wars 2'
+
+
+class TestDeltaEncoder(object):
+
+    def test_key_then_deltas(self):
+        enc = DeltaEncoder(keyframe_interval=3)
+        first = sample(1)
+        assert enc.encode(first) == {'frame': 'key', 'data': first}
+        second = sample(2)
+        second['fAvatarPosition'] = [1.0, 2.0, 3.0]
+        assert enc.encode(second) == {
+            'frame': 'delta',
+            'data': {'uiTick': 2, 'fAvatarPosition': [1.0, 2.0, 3.0]}
+        }
+        assert enc.encode(sample(3)) == {
+            'frame': 'delta',
+            'data': {
+                'uiTick': 3,
+                'fAvatarPosition': sample()['fAvatarPosition']
+            }
+        }
+        assert enc.encode(sample(4))['frame'] == 'key'
+
+    def test_merge_reproduces_input(self):
+        enc = DeltaEncoder()
+        state = {}
+        for tick in range(1, 5):
+            data = sample(tick)
+            data['context'] = dict(data['context'], mapId=tick)
+            state.update(enc.encode(data)['data'])
+            assert state == data
+
+
+class TestBinaryFrames(object):
+
+    def decoded(self, tick):
+        # round-trip through the Link layout so floats are single-precision
+        return LinkDecoder().decode(pack_link(**sample(tick)))
+
+    def test_round_trip(self):
+        enc = BinaryFrameEncoder(keyframe_interval=3)
+        framer = BinaryFramer()
+        stream = b''.join(enc.encode(self.decoded(t)) for t in range(1, 5))
+        frames = []
+        # feed one byte at a time to exercise partial reads
+        for i in range(len(stream)):
+            frames.extend(framer.feed(stream[i:i + 1]))
+        assert [f[0] for f in frames] == [
+            FRAME_KEY, FRAME_DELTA, FRAME_DELTA, FRAME_KEY
+        ]
+        assert decode_frame(*frames[0]) == self.decoded(1)
+        delta = decode_frame(*frames[1])
+        for k in ('name', 'identity', 'description'):
+            assert k not in delta
+        full = self.decoded(2)
+        assert delta == dict(
+            (k, v) for k, v in full.items() if k in delta)
+        assert decode_frame(*frames[3]) == self.decoded(4)
+
+    def test_changed_string_sent(self):
+        enc = BinaryFrameEncoder()
+        enc.encode(self.decoded(1))
+        data = self.decoded(2)
+        data['description'] = u'\u0100 changed'
+        res = BinaryFramer().feed(enc.encode(data))
+        delta = decode_frame(*res[0])
+        assert delta['description'] == u'\u0100 changed'
+        assert 'identity' not in delta
+
+    def test_error_and_merged_reads(self):
+        enc = BinaryFrameEncoder()
+        stream = (enc.encode_error({'error': True, 'exception': 'x'}) +
+                  enc.encode(self.decoded(1)))
+        frames = BinaryFramer().feed(stream)
+        assert frames[0][0] == FRAME_ERROR
+        assert decode_frame(*frames[0]) == {'error': True, 'exception': 'x'}
+        assert frames[1][0] == FRAME_KEY
+
+    def test_line_framer(self):
+        framer = LineFramer()
+        assert framer.feed(b'{"a": 1}\r\n{"b"') == [b'{"a": 1}']
+        assert framer.feed(b': 2}\n\n') == [b'{"b": 2}']
+
+
+class FakeStdin(object):
+
+    def __init__(self):
+        self.lines = []
+        self.cond = threading.Condition()
+
+    def feed(self, line):
+        with self.cond:
+            self.lines.append(line)
+            self.cond.notify()
+
+    def readline(self):
+        with self.cond:
+            while not self.lines:
+                self.cond.wait()
+            return self.lines.pop(0)
+
+
+class TestFlowControl(object):
+
+    def test_credits(self):
+        stdin = FakeStdin()
+        flow = FlowControl(2, stdin)
+        assert flow.take() is True
+        assert flow.take() is True
+        assert flow.take() is False
+        flow.give_back()
+        assert flow.take() is True
+        stdin.feed('2\n')
+        stdin.feed('bad\n')
+        stdin.feed('')
+        assert flow.closed.wait(5)
+        assert flow.take() is True
+        assert flow.take() is True
+        assert flow.take() is False
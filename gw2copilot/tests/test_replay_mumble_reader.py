@@ -0,0 +1,114 @@
+"""
+gw2copilot/tests/test_replay_mumble_reader.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+
+from gw2copilot.mumble_recording import MumbleRecorder, iter_recording
+from gw2copilot.read_mumble_link import LinkDecoder, pack_link
+from gw2copilot.replay_mumble_reader import ReplayMumbleLinkReader
+from gw2copilot.shm_mumble_reader import synthetic_frames
+from gw2copilot.tests.fakes import FakeServer
+
+
+def make_frames(count):
+    gen = synthetic_frames(steps=10)
+    decoder = LinkDecoder()
+    return [
+        decoder.decode(pack_link(uiTick=i + 1, **next(gen)))
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def recording(tmpdir):
+    path = str(tmpdir.join('rec.bin'))
+    frames = make_frames(250)
+    rec = MumbleRecorder(path)
+    for i, f in enumerate(frames):
+        rec.record(f, timestamp=1000.0 + i * 0.1)
+    rec.close()
+    return path, frames
+
+
+class TestRecording(object):
+
+    def test_round_trip(self, recording):
+        path, frames = recording
+        state = None
+        count = 0
+        for i, (ts, data, partial) in enumerate(iter_recording(path)):
+            assert ts == 1000.0 + i * 0.1
+            state = dict(state, **data) if partial else data
+            assert state == frames[i]
+            count += 1
+        assert count == 250
+
+    def test_truncated_and_invalid(self, recording, tmpdir):
+        path, frames = recording
+        with open(path, 'ab') as fh:
+            fh.write(b'\x00\x01')
+        assert len(list(iter_recording(path))) == 250
+        bad = tmpdir.join('bad.bin')
+        bad.write(b'not a recording')
+        with pytest.raises(ValueError):
+            list(iter_recording(str(bad)))
+
+
+class TestReplay(object):
+
+    def test_realtime(self, recording):
+        path, frames = recording
+        server = FakeServer()
+        r = ReplayMumbleLinkReader(server, path, speed=2.0)
+        server.reactor.run()
+        assert r.finished is True
+        assert r.frames == 250
+        assert server.states == frames
+        # frames are 0.1s apart; at 2x, 0.05s
+        assert server.updates[-1][0] - server.updates[0][0] == \
+            pytest.approx(249 * 0.05)
+
+    def test_fast(self, recording):
+        path, frames = recording
+        server = FakeServer()
+        r = ReplayMumbleLinkReader(server, path, speed=0)
+        server.reactor.run()
+        assert r.frames == 250
+        assert server.states == frames
+        assert server.reactor.now == 100.0
@@ -0,0 +1,95 @@
+"""
+gw2copilot/tests/test_sample_buffer.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+
+from gw2copilot.sample_buffer import SampleBuffer, Sample
+
+
+def fill(buf, samples):
+    for s in samples:
+        buf.append(*s)
+
+
+class TestSampleBuffer(object):
+
+    def test_ring(self):
+        buf = SampleBuffer(capacity=3)
+        assert len(buf) == 0
+        assert buf.latest is None
+        fill(buf, [(float(t), t, t * 10.0, 0.0, 1.0, 90.0, 15)
+                   for t in range(5)])
+        assert len(buf) == 3
+        assert [s.tick for s in buf.window(100)] == [2, 3, 4]
+        assert buf[0] == Sample(2.0, 2, 20.0, 0.0, 1.0, 90.0, 15)
+        assert buf.latest.tick == 4
+        with pytest.raises(IndexError):
+            buf[3]
+        buf.clear()
+        assert len(buf) == 0
+
+    def test_window_and_speed(self):
+        buf = SampleBuffer()
+        fill(buf, [
+            (0.0, 1, 0.0, 0.0, 0.0, 0.0, 15),
+            (1.0, 2, 100.0, 100.0, 0.0, 0.0, 28),
+            (2.0, 3, 130.0, 140.0, 0.0, 0.0, 28),
+            (3.0, 4, 160.0, 180.0, 0.0, 0.0, 28),
+        ])
+        assert [s.tick for s in buf.window(1.5)] == [3, 4]
+        # doesn't go back past the map change
+        assert [s.tick for s in buf.window(10)] == [2, 3, 4]
+        assert buf.velocity(10) == (30.0, 40.0)
+        assert buf.speed(10) == 50.0
+
+    def test_heading_rate(self):
+        buf = SampleBuffer()
+        fill(buf, [
+            (0.0, 1, 0.0, 0.0, 0.0, 350.0, 15),
+            (0.5, 2, 0.0, 0.0, 0.0, 10.0, 15),
+            (1.0, 3, 0.0, 0.0, 0.0, 30.0, 15),
+        ])
+        assert buf.heading_rate(1.0) == pytest.approx(40.0)
+
+    def test_not_enough_samples(self):
+        buf = SampleBuffer()
+        assert buf.velocity() == (0.0, 0.0)
+        buf.append(1.0, 1, 5.0, 5.0, 0.0, 0.0, 15)
+        assert buf.speed() == 0.0
+        assert buf.heading_rate() == 0.0
@@ -0,0 +1,244 @@
+"""
+gw2copilot/tests/test_sessions.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import pytest
+
+from gw2copilot import sessions
+from gw2copilot.sessions import MumbleSession, SessionManager
+from gw2copilot.trail import TrailStore
+from gw2copilot.tests.fakes import FakeServer, mumble_data
+
+
+class FakeRequest(object):
+
+    def __init__(self, **args):
+        self.args = dict((k, [v]) for k, v in args.items())
+
+
+class TestSessionManager(object):
+
+    def test_lookup(self):
+        mgr = SessionManager(FakeServer(), ['MumbleLink', 'alt'])
+        assert mgr.names == ['MumbleLink', 'alt']
+        assert len(mgr) == 2
+        assert mgr.default.name == 'MumbleLink'
+        assert mgr.get() is mgr.default
+        assert mgr.get('alt').name == 'alt'
+        assert mgr.get('nope') is None
+        assert mgr.for_request(FakeRequest()) is mgr.default
+        assert mgr.for_request(FakeRequest(session='alt')) is mgr.get('alt')
+        assert mgr.for_request(FakeRequest(session='nope')) is None
+
+    def test_invalid_names(self):
+        with pytest.raises(ValueError):
+            SessionManager(FakeServer(), [])
+        with pytest.raises(ValueError):
+            SessionManager(FakeServer(), ['a', 'a'])
+
+    def test_sessions_are_independent(self):
+        server = FakeServer()
+        mgr = SessionManager(server, ['MumbleLink', 'alt'])
+        main, alt = list(mgr)
+        assert isinstance(main, MumbleSession)
+        changed = alt.update_mumble_data(mumble_data('Alt', map_id=50))
+        assert 'identity' in changed
+        assert main.raw_mumble_link_data is None
+        assert alt.playerinfo.as_dict['map_id'] == 50
+        assert set(s for s, _ in server.sent) == set(['alt'])
+        assert ('alt', 'player_dict') in server.sent
+        assert ('alt', 'motion') in server.sent
+        main.update_mumble_data(mumble_data('Main'))
+        assert main.playerinfo.player_dict['name'] == 'Main'
+        assert alt.playerinfo.player_dict['name'] == 'Alt'
+        # a delta only touches its own session
+        alt.update_mumble_data({'fAvatarPosition': [500.0, 2.0, 3.0]},
+                               partial=True)
+        assert alt.playerinfo.position != main.playerinfo.position
+
+    def test_trails(self, tmpdir):
+        trails = TrailStore(str(tmpdir))
+        mgr = SessionManager(FakeServer(), ['MumbleLink', 'alt'],
+                             trails=trails)
+        main, alt = list(mgr)
+        main.update_mumble_data(mumble_data('Main'))
+        alt.update_mumble_data(mumble_data('Alt', x=500.0))
+        # not moved; nothing new to record
+        alt.update_mumble_data(mumble_data('Alt', x=500.0))
+        assert main.character_name == 'Main'
+        assert len(trails.trail('Main').maps[15]) == 1
+        assert len(trails.trail('Alt').maps[15]) == 1
+        trails.close()
+
+    def test_prefetch_on_map_change(self):
+
+        class FakeJob(object):
+            cancelled = False
+
+            def cancel(self):
+                self.cancelled = True
+
+        class FakePrefetcher(object):
+
+            def __init__(self):
+                self.calls = []
+
+            def prefetch(self, map_id, position=None):
+                self.calls.append(map_id)
+                return FakeJob()
+
+        prefetcher = FakePrefetcher()
+        mgr = SessionManager(FakeServer(), ['MumbleLink'],
+                             prefetcher=prefetcher)
+        session = mgr.default
+        session.update_mumble_data(mumble_data('Main'))
+        first = session.prefetch_job
+        session.update_mumble_data(mumble_data('Main', x=5.0))
+        assert prefetcher.calls == [15]
+        session.update_mumble_data(mumble_data('Main', map_id=50))
+        assert prefetcher.calls == [15, 50]
+        assert first.cancelled is True
+        assert session.prefetch_job.cancelled is False
+
+    def test_uncached_map(self, tmpdir):
+
+        class FakeJob(object):
+            map_done = False
+
+            def cancel(self):
+                pass
+
+        class FakePrefetcher(object):
+
+            def __init__(self):
+                self.calls = []
+
+            def prefetch(self, map_id, position=None):
+                self.calls.append((map_id, position))
+                return FakeJob()
+
+        server = FakeServer()
+        trails = TrailStore(str(tmpdir))
+        prefetcher = FakePrefetcher()
+        session = SessionManager(server, ['MumbleLink'], trails=trails,
+                                 prefetcher=prefetcher).default
+        session.update_mumble_data(mumble_data('Main'))
+        server.cache.uncached.add(50)
+        del server.sent[:]
+        del server.data[:]
+        session.update_mumble_data(mumble_data('Main', map_id=50, x=5.0))
+        session.update_mumble_data(mumble_data('Main', map_id=50, x=6.0))
+        assert prefetcher.calls[-1] == (50, None)
+        # nothing about the new map is sent or recorded until it's cached
+        assert [d['map_id'] for t, d in zip(server.sent, server.data)
+                if t[1] == 'motion'] == [15]
+        assert 50 not in trails.trail('Main').maps
+        assert session.playerinfo.map_pending is True
+        # the job retrieves the map; the next update picks it up
+        server.cache.uncached.discard(50)
+        session.prefetch_job.map_done = True
+        session.update_mumble_data(mumble_data('Main', map_id=50, x=6.0))
+        assert session.playerinfo.map_pending is False
+        assert server.data[-1]['map_id'] == 50
+        assert len(trails.trail('Main').maps[50]) == 1
+        assert len(prefetcher.calls) == 2
+        trails.close()
+
+    def test_uncached_map_retry(self, monkeypatch):
+
+        class FakeJob(object):
+            map_done = True
+
+            def cancel(self):
+                pass
+
+        class FakePrefetcher(object):
+
+            def __init__(self):
+                self.calls = 0
+
+            def prefetch(self, map_id, position=None):
+                self.calls += 1
+                return FakeJob()
+
+        now = [1000.0]
+        monkeypatch.setattr(sessions.time, 'time', lambda: now[0])
+        server = FakeServer()
+        server.cache.uncached.add(15)
+        prefetcher = FakePrefetcher()
+        session = SessionManager(server, ['MumbleLink'],
+                                 prefetcher=prefetcher).default
+        session.update_mumble_data(mumble_data('Main'))
+        assert prefetcher.calls == 1
+        # the job failed to retrieve the map; checked once, then retried
+        # after MAP_RETRY_INTERVAL
+        session.update_mumble_data(mumble_data('Main', x=2.0))
+        session.update_mumble_data(mumble_data('Main', x=3.0))
+        assert prefetcher.calls == 1
+        now[0] += sessions.MAP_RETRY_INTERVAL
+        session.update_mumble_data(mumble_data('Main', x=4.0))
+        assert prefetcher.calls == 2
+        server.cache.uncached.discard(15)
+        session.update_mumble_data(mumble_data('Main', x=5.0))
+        assert session.playerinfo.map_pending is False
+
+    def test_motion_throttled(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(sessions.time, 'time', lambda: now[0])
+        server = FakeServer()
+        session = SessionManager(server, ['MumbleLink']).default
+        session.update_mumble_data(mumble_data('Main'))
+        for x in range(2, 7):
+            now[0] += 0.06
+            session.update_mumble_data(mumble_data('Main', x=float(x)))
+        # one message at the start, and one an interval later (x=5)
+        assert server.sent == [
+            ('MumbleLink', 'player_dict'), ('MumbleLink', 'motion'),
+            ('MumbleLink', 'motion')
+        ]
+        sent = server.data[-1]['position']
+        # x=6 hasn't been sent yet; stopping sends it
+        now[0] += 0.01
+        session.update_mumble_data(mumble_data('Main', x=6.0))
+        assert len(server.sent) == 4
+        assert server.data[-1]['position'] != sent
+        assert server.data[-1]['velocity'] == [0.0, 0.0]
+        session.update_mumble_data(mumble_data('Main', x=6.0))
+        assert len(server.sent) == 4
+        # a map change is sent at once
+        session.update_mumble_data(mumble_data('Main', map_id=50, x=5.0))
+        assert server.data[-1]['map_id'] == 50
@@ -0,0 +1,78 @@
+"""
+gw2copilot/tests/test_shm_mumble_reader.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from gw2copilot.read_mumble_link import GW2MumbleLinkReader, LINK_SIZE
+from gw2copilot.shm_mumble_reader import (
+    ShmMumbleLinkReader, LinkWriter, synthetic_frames, writer_entry_point
+)
+from gw2copilot.tests.fakes import FakeServer
+
+
+class TestShmMumbleLink(object):
+
+    def test_writer_and_reader(self, tmpdir):
+        path = str(tmpdir.join('MumbleLink'))
+        writer = LinkWriter(path)
+        assert tmpdir.join('MumbleLink').size() == LINK_SIZE
+        frames = synthetic_frames(map_id=50, name='Tester', steps=4)
+        reader = GW2MumbleLinkReader(path=path)
+        writer.write(**next(frames))
+        first = reader.read()
+        assert first['uiTick'] == 1
+        assert first['context']['mapId'] == 50
+        assert first['identity']['name'] == 'Tester'
+        assert first['fAvatarPosition'][0] == 50.0
+        assert reader.read() is None
+        writer.write(**next(frames))
+        second = reader.read()
+        assert second['uiTick'] == 2
+        assert second['fAvatarPosition'] != first['fAvatarPosition']
+        writer.close()
+
+    def test_reader_class(self, tmpdir):
+        path = str(tmpdir.join('MumbleLink'))
+        writer_entry_point(['-f', path, '-c', '3', '-r', '1000'])
+        server = FakeServer()
+        ShmMumbleLinkReader(server, 1.0, path=path)
+        # the data changed, so the scheduler polls again at --poll-min
+        assert server.reactor.run_next() == 0.1
+        assert server.states[0]['uiTick'] == 3
+        # nothing changed
+        assert server.reactor.run_next() == 0.2
+        assert len(server.updates) == 1
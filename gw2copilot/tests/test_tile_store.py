@@ -0,0 +1,119 @@
+"""
+gw2copilot/tests/test_tile_store.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import os
+import pytest
+
+from gw2copilot.tile_store import TileStore, INDEX_RECORD
+
+OCEAN = b'\xff\xd8 ocean'
+LAND = b'\xff\xd8 land'
+
+
+class TestTileStore(object):
+
+    def test_dedup(self, tmpdir):
+        store = TileStore(str(tmpdir))
+        h1 = store.put((1, 1, 3, 0, 0), OCEAN)
+        h2 = store.put((1, 1, 3, 0, 1), OCEAN)
+        h3 = store.put((1, 1, 3, 1, 0), LAND)
+        assert h1 == h2 != h3
+        assert store.path((1, 1, 3, 0, 0)) == store.path((1, 1, 3, 0, 1))
+        with open(store.path((1, 1, 3, 1, 0)), 'rb') as fh:
+            assert fh.read() == LAND
+        stats = store.stats()
+        assert stats['tiles'] == 3
+        assert stats['blobs'] == 2
+        assert stats['saved_bytes'] == len(OCEAN)
+        assert stats['dedup_ratio'] == 1.5
+
+    def test_missing_and_unknown(self, tmpdir):
+        store = TileStore(str(tmpdir))
+        store.mark_missing((1, 1, 7, 500, 500))
+        assert store.lookup((1, 1, 7, 500, 500)) == ''
+        assert store.path((1, 1, 7, 500, 500)) is None
+        assert store.lookup((1, 1, 7, 0, 0)) is None
+        assert store.stats()['missing'] == 1
+
+    def test_index_reload(self, tmpdir):
+        store = TileStore(str(tmpdir))
+        store.put((1, 1, 3, 0, 0), OCEAN)
+        store.put((1, 1, 3, 0, 0), LAND)
+        store.mark_missing((2, 1, 3, 0, 0))
+        index = str(tmpdir.join('index.bin'))
+        # simulate a crash in the middle of an append
+        with open(index, 'ab') as fh:
+            fh.write(b'\x01\x02\x03')
+        store = TileStore(str(tmpdir))
+        assert store.lookup((1, 1, 3, 0, 0)) == store.put(
+            (1, 1, 3, 0, 0), LAND)
+        assert store.lookup((2, 1, 3, 0, 0)) == ''
+        assert os.path.getsize(index) == INDEX_RECORD.size * 3
+
+    def test_migrates_legacy_files(self, tmpdir):
+        tmpdir.join('1_1_3_4_5.jpg').write_binary(LAND)
+        tmpdir.join('1_1_3_4_6.jpg').write_binary(b'')
+        store = TileStore(str(tmpdir))
+        with open(store.path((1, 1, 3, 4, 5)), 'rb') as fh:
+            assert fh.read() == LAND
+        assert store.lookup((1, 1, 3, 4, 6)) == ''
+        assert not tmpdir.join('1_1_3_4_5.jpg').check()
+        assert not tmpdir.join('1_1_3_4_6.jpg').check()
+
+    def test_negative_floor(self, tmpdir):
+        tmpdir.join('1_-2_3_4_5.jpg').write_binary(OCEAN)
+        store = TileStore(str(tmpdir))
+        h = store.put((1, -2, 3, 0, 0), LAND)
+        store.mark_missing((1, -2, 3, 0, 1))
+        assert store.lookup((1, -2, 3, 4, 5)) is not None
+        store = TileStore(str(tmpdir))
+        assert store.lookup((1, -2, 3, 0, 0)) == h
+        assert store.lookup((1, -2, 3, 0, 1)) == ''
+        with open(store.path((1, -2, 3, 4, 5)), 'rb') as fh:
+            assert fh.read() == OCEAN
+        assert store.stats(floor=-2)['tiles'] == 2
+
+    def test_key_out_of_range(self, tmpdir):
+        store = TileStore(str(tmpdir))
+        with pytest.raises(ValueError):
+            store.put((1, 1, 300, 0, 0), LAND)
+        # nothing was written
+        assert not tmpdir.join('blobs').check()
+        assert not tmpdir.join('index.bin').check()
+        assert store.lookup((1, 1, 300, 0, 0)) is None
@@ -0,0 +1,158 @@
+"""
+gw2copilot/tests/test_tile_synth.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+from io import BytesIO
+
+from PIL import Image
+
+from gw2copilot.tile_synth import (
+    TILE_SIZE, synthesize_from_children, synthesize_from_parent,
+    TileSynthesizer
+)
+from gw2copilot.tests.fakes import FakeCache
+
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+WHITE = (255, 255, 255)
+
+
+def write_tile(tmpdir, name, color, size=TILE_SIZE):
+    path = str(tmpdir.join(name))
+    Image.new('RGB', (size, size), color).save(path, format='JPEG')
+    return path
+
+
+def write_quadrants(tmpdir, name, colors):
+    """write a tile whose quadrants are ``colors[dy][dx]``"""
+    img = Image.new('RGB', (TILE_SIZE, TILE_SIZE))
+    half = TILE_SIZE // 2
+    for dy in range(2):
+        for dx in range(2):
+            img.paste(colors[dy][dx],
+                      (dx * half, dy * half, (dx + 1) * half, (dy + 1) * half))
+    path = str(tmpdir.join(name))
+    img.save(path, format='JPEG')
+    return path
+
+
+def load(content):
+    return Image.open(BytesIO(content)).convert('RGB')
+
+
+def near(pixel, color, tolerance=12):
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel, color))
+
+
+def test_synthesize_from_children(tmpdir):
+    colors = [[RED, GREEN], [BLUE, WHITE]]
+    paths = [
+        [write_tile(tmpdir, '%d_%d.jpg' % (dx, dy), colors[dy][dx])
+         for dx in range(2)]
+        for dy in range(2)
+    ]
+    img = load(synthesize_from_children(paths))
+    assert img.size == (TILE_SIZE, TILE_SIZE)
+    q = TILE_SIZE // 4
+    assert near(img.getpixel((q, q)), RED)
+    assert near(img.getpixel((3 * q, q)), GREEN)
+    assert near(img.getpixel((q, 3 * q)), BLUE)
+    assert near(img.getpixel((3 * q, 3 * q)), WHITE)
+
+
+def test_synthesize_from_children_resizes(tmpdir):
+    paths = [
+        [write_tile(tmpdir, '%d_%d.jpg' % (dx, dy), GREEN, size=128)
+         for dx in range(2)]
+        for dy in range(2)
+    ]
+    img = load(synthesize_from_children(paths))
+    assert img.size == (TILE_SIZE, TILE_SIZE)
+    assert near(img.getpixel((TILE_SIZE // 2, TILE_SIZE // 2)), GREEN)
+
+
+def test_synthesize_from_parent(tmpdir):
+    path = write_quadrants(tmpdir, 'parent.jpg', [[RED, GREEN],
+                                                  [BLUE, WHITE]])
+    expected = {(4, 6): RED, (5, 6): GREEN, (4, 7): BLUE, (5, 7): WHITE}
+    for (x, y), color in expected.items():
+        img = load(synthesize_from_parent(path, x, y))
+        assert img.size == (TILE_SIZE, TILE_SIZE)
+        # the whole quadrant is upscaled; check the center and a corner
+        assert near(img.getpixel((TILE_SIZE // 2, TILE_SIZE // 2)), color)
+        assert near(img.getpixel((8, 8)), color)
+
+
+class TestTileSynthesizer(object):
+
+    def synthesizer(self, tiles):
+        cache = FakeCache()
+        cache.tiles.update(tiles)
+        return TileSynthesizer(None, None, cache)
+
+    def test_sources_children(self):
+        tiles = dict(
+            ((1, 1, 4, 2 + dx, 6 + dy), 'c%d%d' % (dx, dy))
+            for dx in range(2) for dy in range(2)
+        )
+        tiles[(1, 1, 2, 0, 1)] = 'parent'
+        s = self.synthesizer(tiles)
+        assert s.sources(1, 1, 3, 1, 3) == (
+            'children', [['c00', 'c10'], ['c01', 'c11']])
+
+    def test_sources_parent(self):
+        s = self.synthesizer({
+            (1, 1, 2, 0, 1): 'parent',
+            # only three of four children
+            (1, 1, 4, 2, 6): 'c00',
+            (1, 1, 4, 3, 6): 'c10',
+            (1, 1, 4, 2, 7): 'c01'
+        })
+        assert s.sources(1, 1, 3, 1, 3) == ('parent', 'parent')
+
+    def test_not_enough_neighbors(self):
+        s = self.synthesizer({
+            # three children, and a parent for a different tile
+            (1, 1, 1, 0, 0): 'c00',
+            (1, 1, 1, 1, 0): 'c10',
+            (1, 1, 1, 0, 1): 'c01',
+            (1, 1, 2, 0, 0): 'other'
+        })
+        assert s.sources(1, 1, 0, 0, 0) is None
+        assert s.sources(1, 1, 3, 1, 3) is None
+        assert s.synthesize(1, 1, 0, 0, 0) is None
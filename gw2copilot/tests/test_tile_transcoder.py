@@ -0,0 +1,185 @@
+"""
+gw2copilot/tests/test_tile_transcoder.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+from PIL import Image
+from twisted.internet.defer import Deferred, maybeDeferred
+
+from gw2copilot import tile_transcoder
+from gw2copilot.tile_transcoder import TileTranscoder, DEFAULT_WEBP_TIERS
+from gw2copilot.api import GW2CopilotAPI
+
+if sys.version_info[0] < 3:
+    from mock import patch, Mock, MagicMock
+else:
+    from unittest.mock import patch, Mock, MagicMock
+
+
+def results(d):
+    """return a list that the result of Deferred ``d`` is appended to"""
+    res = []
+    d.addCallback(res.append)
+    return res
+
+
+class FakePool(object):
+    """stand-in for ``deferToThreadPool`` that records calls"""
+
+    def __init__(self, sync=True):
+        self.sync = sync
+        self.calls = []
+        self.pending = []
+
+    def __call__(self, reactor, pool, func, *args):
+        self.calls.append(args)
+        if self.sync:
+            return maybeDeferred(func, *args)
+        d = Deferred()
+        self.pending.append((d, func, args))
+        return d
+
+    def run(self):
+        while self.pending:
+            d, func, args = self.pending.pop(0)
+            d.callback(func(*args))
+
+
+class TestTileTranscoder(object):
+
+    def setup_method(self):
+        self.t = TileTranscoder(None, None)
+
+    def write_tile(self, tmpdir):
+        path = str(tmpdir.join('1_1_3_0_0.jpg'))
+        Image.new('RGB', (256, 256), (10, 20, 30)).save(path, format='JPEG')
+        return path
+
+    def test_tiers(self):
+        assert self.t.tiers == DEFAULT_WEBP_TIERS
+        assert self.t.default_tier == 'high'
+        t = TileTranscoder(None, None, tiers={'a': 20, 'b': 90, 'c': 40})
+        assert t.default_tier == 'b'
+        assert t.variant_path('/foo/ab/ab12.jpg', 'c') == \
+            '/foo/ab/ab12.q40.webp'
+        assert self.t.variant_path('/foo/ab/ab12.jpg', 'low') == \
+            '/foo/ab/ab12.q50.webp'
+
+    def test_variant_cached(self, tmpdir):
+        path = self.write_tile(tmpdir)
+        pool = FakePool()
+        with patch.object(tile_transcoder, 'deferToThreadPool', pool):
+            res = results(self.t.transcode(path, 'low'))
+            assert res == [str(tmpdir.join('1_1_3_0_0.q50.webp'))]
+            assert len(pool.calls) == 1
+            assert Image.open(res[0]).format == 'WEBP'
+            # second request is served from the cached variant
+            assert results(self.t.transcode(path, 'low')) == res
+            assert len(pool.calls) == 1
+            # a different tier is a different variant
+            assert results(self.t.transcode(path, 'high')) == [
+                str(tmpdir.join('1_1_3_0_0.q80.webp'))]
+            assert len(pool.calls) == 2
+
+    def test_concurrent_requests_share(self, tmpdir):
+        path = self.write_tile(tmpdir)
+        pool = FakePool(sync=False)
+        with patch.object(tile_transcoder, 'deferToThreadPool', pool):
+            res1 = results(self.t.transcode(path, 'low'))
+            res2 = results(self.t.transcode(path, 'low'))
+            assert len(pool.calls) == 1
+            assert res1 == res2 == []
+            pool.run()
+        dest = str(tmpdir.join('1_1_3_0_0.q50.webp'))
+        assert res1 == res2 == [dest]
+
+    def test_failure(self, tmpdir):
+        pool = FakePool()
+        with patch.object(tile_transcoder, 'deferToThreadPool', pool):
+            path = str(tmpdir.join('missing.jpg'))
+            assert results(self.t.transcode(path, 'low')) == [None]
+            # nothing is left waiting; a retry transcodes again
+            assert results(self.t.transcode(path, 'low')) == [None]
+            assert len(pool.calls) == 2
+
+
+class TestAPITileTier(object):
+
+    def setup_method(self):
+        self.server = Mock()
+        self.server.tile_transcoder = TileTranscoder(None, None)
+        self.server.tile_transcoder.transcode = Mock(return_value=Deferred())
+        self.server.cache.tile_path.return_value = '/cache/1_1_3_0_0.jpg'
+        # routes aren't needed, and Mock attributes look like routes
+        with patch.object(GW2CopilotAPI, '_add_routes'):
+            self.api = GW2CopilotAPI(Mock(), self.server)
+
+    def request(self, accept, tier=None):
+        req = MagicMock()
+        req.args = {'continent': ['1'], 'floor': ['1'], 'zoom': ['3'],
+                    'x': ['0'], 'y': ['0']}
+        if tier is not None:
+            req.args['tier'] = [tier]
+        headers = {} if accept is None else {'accept': accept}
+        req.getHeader.side_effect = headers.get
+        return req
+
+    def tier_for(self, accept, tier=None):
+        transcode = self.server.tile_transcoder.transcode
+        transcode.reset_mock()
+        self.api.tiles(self.request(accept, tier))
+        if not transcode.called:
+            return None
+        assert transcode.call_args[0][0] == '/cache/1_1_3_0_0.jpg'
+        return transcode.call_args[0][1]
+
+    def test_tier_selection(self):
+        assert self.tier_for('image/webp,*/*') == 'high'
+        assert self.tier_for('image/webp,*/*', tier='low') == 'low'
+        assert self.tier_for('image/webp,*/*', tier='bogus') == 'high'
+        assert self.tier_for('image/png,*/*', tier='low') is None
+
+    def test_accepts_webp(self):
+        accepts = self.api._accepts_webp
+        assert accepts(self.request(None)) is False
+        assert accepts(self.request('')) is False
+        assert accepts(self.request('image/png,*/*;q=0.8')) is False
+        assert accepts(self.request('image/webp,*/*')) is True
+        assert accepts(self.request('image/png, Image/WebP ; q=0.5')) is True
+        assert accepts(self.request('image/webp;q=0')) is False
+        assert accepts(self.request('image/webp; q=0.0, */*')) is False
+        assert accepts(self.request('image/webp;q=abc')) is False
@@ -0,0 +1,189 @@
+"""
+gw2copilot/tests/test_trail.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+from array import array
+
+import pytest
+
+from gw2copilot.trail import (
+    simplify, zoom_tolerance, MapTrail, CharacterTrail, TrailStore,
+    SEGMENT_GAP
+)
+from gw2copilot.tests.fakes import FakeThreads
+
+
+def arrays(points):
+    return (array('d', [p[0] for p in points]),
+            array('d', [p[1] for p in points]))
+
+
+class TestSimplify(object):
+
+    def test_straight_line(self):
+        xs, ys = arrays([(i, 0.1 * (i % 2)) for i in range(100)])
+        assert simplify(xs, ys, 0, 100, 1.0) == [0, 99]
+
+    def test_corner_kept(self):
+        pts = [(i, 0) for i in range(10)] + [(9, i) for i in range(1, 10)]
+        xs, ys = arrays(pts)
+        assert simplify(xs, ys, 0, len(pts), 1.0) == [0, 9, len(pts) - 1]
+        # at a coarse tolerance the corner is dropped too
+        assert simplify(xs, ys, 0, len(pts), 10.0) == [0, len(pts) - 1]
+
+    def test_short(self):
+        xs, ys = arrays([(0, 0), (1, 1)])
+        assert simplify(xs, ys, 0, 2, 1.0) == [0, 1]
+
+    def test_zoom_tolerance(self):
+        assert zoom_tolerance(7) == 1.0
+        assert zoom_tolerance(5) == 4.0
+
+
+class TestMapTrail(object):
+
+    def test_segments_and_since(self):
+        t = MapTrail()
+        for i in range(10):
+            t.append(100.0 + i, 10.0 * i, 0.0)
+        # waypoint jump
+        t.append(111.0, 5000.0, 5000.0)
+        t.append(112.0, 5010.0, 5000.0)
+        # long gap
+        t.append(112.0 + SEGMENT_GAP + 1, 5020.0, 5000.0)
+        assert t.query(7) == [
+            [[0.0, 0.0], [90.0, 0.0]],
+            [[5000.0, 5000.0], [5010.0, 5000.0]],
+            [[5020.0, 5000.0]]
+        ]
+        assert t.query(7, since=112.0) == [
+            [[5010.0, 5000.0]], [[5020.0, 5000.0]]
+        ]
+        assert t.latest == 112.0 + SEGMENT_GAP + 1
+
+    def test_cache_invalidated_on_append(self):
+        t = MapTrail()
+        for i in range(5):
+            t.append(100.0 + i, 10.0 * i, 0.0)
+        assert t.query(7) == [[[0.0, 0.0], [40.0, 0.0]]]
+        t.append(105.0, 40.0, 50.0)
+        assert t.query(7) == [[[0.0, 0.0], [40.0, 0.0], [40.0, 50.0]]]
+
+
+class TestCharacterTrail(object):
+
+    def test_persistence(self, tmpdir):
+        path = str(tmpdir.join('c.trail'))
+        t = CharacterTrail(path)
+        assert t.record(100.0, 15, 10.0, 20.0) is True
+        # too close to the last point
+        assert t.record(101.0, 15, 10.5, 20.5) is False
+        assert t.record(102.0, 15, 30.0, 20.0) is True
+        assert t.record(103.0, 50, 30.0, 20.0) is True
+        t.close()
+        with open(path, 'ab') as fh:
+            fh.write(b'\x01\x02\x03')
+        t = CharacterTrail(path)
+        assert sorted(t.maps.keys()) == [15, 50]
+        assert t.query(15, 7) == [[[10.0, 20.0], [30.0, 20.0]]]
+        assert t.query(99, 7) == []
+        t.record(104.0, 50, 60.0, 20.0)
+        t.close()
+        t = CharacterTrail(path)
+        assert len(t.maps[50]) == 2
+        t.close()
+
+    def test_invalid_file(self, tmpdir):
+        path = tmpdir.join('bad.trail')
+        path.write('not a trail file')
+        with pytest.raises(ValueError):
+            CharacterTrail(str(path))
+
+
+class TestTrailStore(object):
+
+    def test_store(self, tmpdir):
+        store = TrailStore(str(tmpdir.join('trails')))
+        assert store.path_for(u'Foo Bar') != store.path_for(u'Foo_Bar')
+        store.record(u'Foo Bar', 100.0, 15, 1.0, 2.0)
+        assert store.trail(u'Foo Bar') is store.trail(u'Foo Bar')
+        store.close()
+        with open(store.path_for(u'Bad'), 'wb') as fh:
+            fh.write(b'garbage')
+        assert len(store.trail(u'Bad').maps) == 0
+        store.close()
+
+    def test_threaded_open(self, tmpdir):
+        store = TrailStore(str(tmpdir.join('trails')))
+        store.record(u'Foo', 100.0, 15, 1.0, 2.0)
+        store.close()
+        run = FakeThreads()
+        store = TrailStore(str(tmpdir.join('trails')), run=run)
+        assert store.trail(u'Foo') is None
+        # points recorded while the trail is opening are queued
+        assert store.record(u'Foo', 101.0, 15, 10.0, 2.0) is True
+        assert store.record(u'Foo', 102.0, 15, 20.0, 2.0) is True
+        assert len(run.pending) == 1
+        run.run()
+        trail = store.trail(u'Foo')
+        assert trail.query(15, 7) == [[[1.0, 2.0], [20.0, 2.0]]]
+        assert store.trail(u'Foo') is trail
+        assert run.pending == []
+        store.close()
+        assert len(TrailStore(str(tmpdir.join('trails'))).trail(
+            u'Foo').maps[15]) == 3
+
+    def test_threaded_open_failed(self, tmpdir):
+        run = FakeThreads()
+        store = TrailStore(str(tmpdir.join('trails')), run=run)
+        store.record(u'Foo', 100.0, 15, 1.0, 2.0)
+        store.directory = str(tmpdir.join('missing'))
+        run.run()
+        assert store.trail(u'Foo') is None
+        # retried on the next call
+        store.directory = str(tmpdir.join('trails'))
+        run.run()
+        assert len(store.trail(u'Foo').maps) == 0
+        store.close()
+
+    def test_close_while_opening(self, tmpdir):
+        run = FakeThreads()
+        store = TrailStore(str(tmpdir.join('trails')), run=run)
+        store.record(u'Foo', 100.0, 15, 1.0, 2.0)
+        store.close()
+        run.run()
+        assert store._trails == {}
@@ -0,0 +1,172 @@
+"""
+gw2copilot/tests/test_travel_graph.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import pytest
+
+from gw2copilot.travel_graph import (
+    TravelGraph, WALK_SPEED, WAYPOINT_TIME, LOADING_TIME, TRANSPORT_TIME,
+    ROUTE_CACHE_SIZE
+)
+
+
+def map_data(x1, x2, waypoints):
+    return {
+        'continent_rect': [[x1, 0], [x2, 1000]],
+        'points_of_interest': {
+            'waypoint': [
+                {'name': name, 'coord': coord, 'chat_link': '[&%s]' % name}
+                for name, coord in waypoints
+            ],
+            'landmark': [{'name': 'ignored', 'coord': [x1, 0]}]
+        }
+    }
+
+
+def end(map_id, coord, title):
+    return {'map_id': map_id, 'coord': coord, 'title': title}
+
+
+MAPS = {
+    1: map_data(0, 1000, [('WP1', [900, 500])]),
+    2: map_data(1000, 2000, [('WP2', [1900, 500])]),
+    3: map_data(2000, 3000, []),
+    4: map_data(5000, 6000, []),
+    5: None
+}
+
+PATHS = {
+    'interborders': [
+        {'end_a': end(1, [990, 100], 'Portal to 2'),
+         'end_b': end(2, [1010, 100], 'Portal to 1')}
+    ],
+    'interzones': [
+        # unresolved maps are skipped
+        {'end_a': end(-1, [0, 0], 'Asura Gate'),
+         'end_b': end(1, [10, 10], 'Asura Gate')}
+    ],
+    'intrazones': [],
+    'launchpads': [
+        {'end_a': end(2, [1950, 900], 'Launch Pad'),
+         'end_b': end(3, [2050, 900], 'Launch Pad')}
+    ]
+}
+
+
+class TestTravelGraph(object):
+
+    def setup_method(self):
+        self.graph = TravelGraph(MAPS, PATHS)
+
+    def test_build(self):
+        g = self.graph
+        assert sorted(g.map_rects.keys()) == [1, 2, 3, 4]
+        # 2 waypoints, 2 portal ends, 2 launch pad ends
+        assert g.node_count == 6
+        assert g.node_names == [
+            'WP1', 'WP2', 'Portal to 2', 'Portal to 1', 'Launch Pad',
+            'Launch Pad'
+        ]
+        assert list(g.node_map) == [1, 2, 1, 2, 2, 3]
+        assert len(g.edge_offsets) == 7
+        # portal both ways, launch pad one way, walking within maps 1 and 2
+        assert len(g.edge_targets) == 3 + 2 + 6
+        for i in range(g.node_count):
+            for e in range(g.edge_offsets[i], g.edge_offsets[i + 1]):
+                assert g.edge_targets[e] != i
+
+    def test_map_at(self):
+        assert self.graph.map_at(1500, 10) == 2
+        assert self.graph.map_at(4000, 10) is None
+        assert self.graph.map_center(3) == (2500.0, 500.0)
+
+    def test_same_map(self):
+        assert self.graph.route(1, (50, 50), 1) == {
+            'seconds': 0.0, 'steps': []}
+        res = self.graph.route(1, (0, 0), 1, (0, 100))
+        assert res['seconds'] == pytest.approx(100 / WALK_SPEED)
+        assert [s['mode'] for s in res['steps']] == ['walk']
+
+    def test_walk_through_portal(self):
+        # waypointing to map 2 is faster than the portal ...
+        res = self.graph.route(1, (980, 100), 2)
+        assert [s['mode'] for s in res['steps']] == ['waypoint']
+        assert res['seconds'] == WAYPOINT_TIME
+        # ... unless going somewhere near the portal
+        res = self.graph.route(1, (980, 100), 2, (1010, 100))
+        assert res['seconds'] == pytest.approx(10 / WALK_SPEED + LOADING_TIME)
+        assert [(s['mode'], s['name']) for s in res['steps']] == [
+            ('walk', 'Portal to 2'), ('gate', 'Portal to 1'), ('walk', None)]
+        assert res['steps'][1]['map_id'] == 2
+        assert res['steps'][1]['coord'] == [1010, 100]
+
+    def test_waypoint_when_faster(self):
+        res = self.graph.route(1, (0, 900), 2, (1900, 400))
+        assert [(s['mode'], s['name']) for s in res['steps']] == [
+            ('waypoint', 'WP2'), ('walk', None)]
+        assert res['steps'][0]['chat_link'] == '[&WP2]'
+        assert res['seconds'] == pytest.approx(
+            WAYPOINT_TIME + 100 / WALK_SPEED)
+        assert sum(s['seconds'] for s in res['steps']) == pytest.approx(
+            res['seconds'])
+
+    def test_one_way_launch_pad(self):
+        res = self.graph.route(2, (1950, 950), 3)
+        assert [s['mode'] for s in res['steps']] == ['walk', 'gate']
+        assert res['seconds'] == pytest.approx(
+            50 / WALK_SPEED + TRANSPORT_TIME)
+        # no way back from map 3 except waypoints
+        res = self.graph.route(3, (2050, 900), 2)
+        assert [s['mode'] for s in res['steps']] == ['waypoint']
+
+    def test_unreachable(self):
+        assert self.graph.route(1, (0, 0), 4) is None
+        assert self.graph.route(1, (0, 0), 99) is None
+
+    def test_no_paths(self):
+        g = TravelGraph(MAPS)
+        assert g.node_count == 2
+        res = g.route(1, (980, 100), 2)
+        assert [s['mode'] for s in res['steps']] == ['waypoint']
+
+    def test_memoized(self):
+        g = self.graph
+        tree = g.shortest_paths(1, 10.2, 20.4)
+        assert g.shortest_paths(1, 9.8, 19.6) is tree
+        for i in range(ROUTE_CACHE_SIZE):
+            g.shortest_paths(2, 1000 + i, 0)
+        assert g.shortest_paths(1, 10, 20) is not tree
@@ -0,0 +1,171 @@
+"""
+gw2copilot/tests/test_warmup.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+from twisted.internet.defer import Deferred
+
+from gw2copilot import warmup
+from gw2copilot.warmup import CacheWarmer
+from gw2copilot.tests.fakes import FakeServer, FakeThreads
+
+if sys.version_info[0] < 3:
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+
+class TestCacheWarmer(object):
+
+    def setup_method(self):
+        self.server = FakeServer()
+        self.w = CacheWarmer(self.server)
+        self.threads = FakeThreads()
+        self.calls = []
+        self.patcher = patch.object(warmup, 'deferToThread', self.threads)
+        self.patcher.start()
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def step(self, name, result=None):
+        def func(progress):
+            self.calls.append(name)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return func
+
+    def states(self):
+        return [s['state'] for s in self.w.status['steps']]
+
+    def test_step_order(self):
+        reactor_d = Deferred()
+        self.w.add_step('a', 'Step A', self.step('a'))
+        self.w.add_step('b', 'Step B', self.step('b', reactor_d),
+                        threaded=False)
+        self.w.add_step('c', 'Step C', self.step('c'))
+        done = []
+        self.w.start().addCallback(done.append)
+        assert self.w.status['state'] == 'running'
+        assert self.states() == ['running', 'pending', 'pending']
+        assert len(self.threads.pending) == 1
+        self.threads.run_next()
+        # b runs in the reactor thread, and c waits for its Deferred
+        assert self.calls == ['a', 'b']
+        assert self.states() == ['done', 'running', 'pending']
+        assert self.threads.pending == []
+        reactor_d.callback(None)
+        assert self.states() == ['done', 'done', 'running']
+        self.threads.run_next()
+        assert self.calls == ['a', 'b', 'c']
+        assert self.states() == ['done', 'done', 'done']
+        assert done == [None]
+        assert self.w.complete is True
+        assert self.w.duration is not None
+        assert self.server.sent[-1] == (None, 'warmup')
+        assert self.server.data[-1] == self.w.status
+        assert self.server.data[-1]['state'] == 'done'
+
+    def test_progress(self):
+        def func(progress):
+            progress(1, 3)
+            progress(2, 3)
+        self.w.add_step('a', 'Step A', func)
+        self.w.start()
+        with patch.object(warmup.time, 'time') as mock_time:
+            mock_time.return_value = 1000.0
+            self.threads.run_next()
+            # progress from the thread is only applied in the reactor thread
+            step = self.w.status['steps'][0]
+            assert (step['done'], step['total']) == (0, None)
+            assert len(self.server.reactor.calls) == 2
+            del self.server.sent[:]
+            del self.server.data[:]
+            self.server.reactor.run()
+        step = self.w.status['steps'][0]
+        assert (step['done'], step['total']) == (2, 3)
+        # progress broadcasts are rate-limited; the step state changes
+        # (which are forced) have already been sent
+        assert self.server.sent == []
+
+    def test_progress_broadcast(self):
+        progress = []
+        d = Deferred()
+
+        def func(p):
+            progress.append(p)
+            return d
+        self.w.add_step('a', 'Step A', func, threaded=False)
+        with patch.object(warmup.time, 'time') as mock_time:
+            mock_time.return_value = 1000.0
+            self.w.start()
+            mock_time.return_value = 1001.0
+            del self.server.sent[:]
+            del self.server.data[:]
+            progress[0](5, 10)
+            progress[0](6, 10)
+        assert len(self.server.sent) == 1
+        step = self.server.data[0]['steps'][0]
+        assert (step['done'], step['total']) == (5, 10)
+
+    def test_failed_step(self):
+        self.w.add_step('a', 'Step A', self.step('a', RuntimeError('foo')))
+        self.w.add_step('b', 'Step B', self.step('b'))
+        done = []
+        self.w.start().addCallback(done.append)
+        self.threads.run_next()
+        assert self.states() == ['failed', 'running']
+        assert self.w.is_ready('a') is True
+        self.threads.run_next()
+        assert self.calls == ['a', 'b']
+        assert self.states() == ['failed', 'done']
+        assert done == [None]
+        assert self.w.complete is True
+
+    def test_is_ready(self):
+        self.w.add_step('a', 'Step A', self.step('a'))
+        self.w.add_step('b', 'Step B', self.step('b'))
+        assert self.w.is_ready('a') is False
+        self.w.start()
+        assert self.w.is_ready('a') is False
+        self.threads.run_next()
+        assert self.w.is_ready('a') is True
+        assert self.w.is_ready('b') is False
+        assert self.w.complete is False
+        self.threads.run_next()
+        assert self.w.is_ready('b') is True
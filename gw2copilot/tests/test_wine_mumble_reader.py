@@ -0,0 +1,75 @@
+"""
+gw2copilot/tests/test_wine_mumble_reader.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import json
+
+from gw2copilot.read_mumble_link import BinaryFramer, LineFramer
+from gw2copilot.wine_mumble_reader import WineProcessProtocol
+from gw2copilot.tests.fakes import FakeServer, mumble_data
+
+
+class BrokenFramer(object):
+
+    def feed(self, data):
+        raise ValueError('bad stream')
+
+
+class TestWineProcessProtocol(object):
+
+    def test_json_frames(self):
+        server = FakeServer()
+        proto = WineProcessProtocol(server, json_frames=True)
+        line = json.dumps(mumble_data()) + '\n'
+        proto.outReceived(line[:10])
+        assert server.updates == []
+        proto.outReceived(line[10:])
+        assert server.updates == [(100.0, mumble_data(), False)]
+        assert proto.have_data is True
+
+    def test_deframe_error_keeps_format(self):
+        server = FakeServer()
+        proto = WineProcessProtocol(server, json_frames=True)
+        proto._framer = BrokenFramer()
+        proto.outReceived('garbage')
+        assert isinstance(proto._framer, LineFramer)
+        proto.outReceived(json.dumps(mumble_data()) + '\n')
+        assert len(server.updates) == 1
+        proto = WineProcessProtocol(server)
+        proto._framer = BrokenFramer()
+        proto.outReceived('garbage')
+        assert isinstance(proto._framer, BinaryFramer)
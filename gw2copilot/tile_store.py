@@ -0,0 +1,298 @@
+"""
+gw2copilot/tile_store.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import os
+import struct
+import hashlib
+import threading
+from binascii import hexlify, unhexlify
+
+from .utils import write_atomic
+
+logger = logging.getLogger(__name__)
+
+#: index record: continent, floor, zoom, x, y, SHA1 digest of the tile
+#: content. Continent and floor are signed; GW2 has negative floors.
+INDEX_RECORD = struct.Struct('<hhBii20s')
+
+#: digest recorded for tiles that the tile service returned a 403 for
+MISSING_DIGEST = b'\x00' * 20
+
+
+class TileStore(object):
+    """
+    Content-addressed store for map tiles. Many tiles (open ocean, fog, etc.)
+    are byte-identical, so each distinct tile is stored only once, as
+    ``blobs/<first two hex digits>/<sha1>.jpg``, and an append-only binary
+    index (``index.bin``, records of :py:data:`~.INDEX_RECORD`) maps tile
+    coordinates to content hashes. The hash doubles as the tile's HTTP ETag.
+
+    The index is read into memory at startup. Tiles cached by older versions
+    as ``{continent}_{floor}_{zoom}_{x}_{y}.jpg`` are moved into the store the
+    first time they're looked up.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, tile_dir):
+        """
+        :param tile_dir: tile cache directory
+        :type tile_dir: str
+        """
+        self._dir = tile_dir
+        self._index_path = os.path.join(tile_dir, 'index.bin')
+        self._lock = threading.RLock()
+        # (continent, floor, zoom, x, y) to 20-byte digest
+        self._index = {}
+        if not os.path.exists(tile_dir):
+            os.makedirs(tile_dir, 0o700)
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Read the on-disk index into memory. Later records override earlier
+        ones; a partial record at the end (from a crash mid-append) is
+        truncated.
+        """
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'rb') as fh:
+            data = fh.read()
+        size = INDEX_RECORD.size
+        usable = len(data) - (len(data) % size)
+        for offset in range(0, usable, size):
+            rec = INDEX_RECORD.unpack_from(data, offset)
+            self._index[rec[:5]] = rec[5]
+        if usable != len(data):
+            logger.warning('Truncating partial record at end of tile index '
+                           '%s', self._index_path)
+            with open(self._index_path, 'r+b') as fh:
+                fh.truncate(usable)
+        logger.debug('Loaded tile index with %d entries', len(self._index))
+
+    def _record(self, key, digest):
+        """
+        Return the packed index record for ``key`` and ``digest``.
+
+        :raises: ValueError if ``key`` can't be stored in the index
+        """
+        try:
+            return INDEX_RECORD.pack(*(tuple(key) + (digest,)))
+        except struct.error as ex:
+            raise ValueError('Tile key %s out of range for the tile index: '
+                             '%s' % (key, ex))
+
+    def _append(self, key, digest, record=None):
+        """
+        Record ``digest`` for ``key`` in memory and in the on-disk index.
+        ``record`` is the packed index record, if already built. Must be
+        called with the lock held.
+        """
+        if record is None:
+            record = self._record(key, digest)
+        with open(self._index_path, 'ab') as fh:
+            fh.write(record)
+        self._index[key] = digest
+
+    def blob_path(self, hexdigest):
+        """
+        Return the path of the blob with the given content hash.
+
+        :param hexdigest: hex SHA1 of the tile content
+        :type hexdigest: str
+        :rtype: str
+        """
+        return os.path.join(self._dir, 'blobs', hexdigest[:2],
+                            '%s.jpg' % hexdigest)
+
+    def legacy_path(self, key):
+        """
+        Return the path a tile was cached at before the tile store.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        :rtype: str
+        """
+        return os.path.join(self._dir, '%d_%d_%d_%d_%d.jpg' % tuple(key))
+
+    def lookup(self, key):
+        """
+        Look up a tile in the store.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        :return: hex SHA1 of the tile content, empty string if the tile is
+          known not to exist upstream, or None if the tile isn't cached
+        :rtype: str
+        """
+        key = tuple(key)
+        with self._lock:
+            digest = self._index.get(key, None)
+            if digest is None:
+                digest = self._migrate(key)
+        if digest is None:
+            return None
+        if digest == MISSING_DIGEST:
+            return ''
+        return hexlify(digest).decode('ascii')
+
+    def path(self, key):
+        """
+        Return the path of a cached tile's content, or None if the tile isn't
+        cached or doesn't exist upstream.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        :rtype: str
+        """
+        hexdigest = self.lookup(key)
+        if not hexdigest:
+            return None
+        return self.blob_path(hexdigest)
+
+    def _migrate(self, key):
+        """
+        If ``key`` was cached at its :py:meth:`~.legacy_path`, move it into
+        the store and return its digest; else return None. Must be called
+        with the lock held.
+        """
+        legacy = self.legacy_path(key)
+        if not os.path.exists(legacy):
+            return None
+        with open(legacy, 'rb') as fh:
+            data = fh.read()
+        if len(data) == 0:
+            self.mark_missing(key)
+            digest = MISSING_DIGEST
+        else:
+            digest = unhexlify(self.put(key, data))
+        os.unlink(legacy)
+        logger.debug('Migrated legacy tile cache file %s', legacy)
+        return digest
+
+    def put(self, key, data):
+        """
+        Store tile content.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        :param data: JPEG content
+        :type data: str
+        :return: hex SHA1 of the content
+        :rtype: str
+        :raises: ValueError if ``key`` can't be stored in the index
+        """
+        key = tuple(key)
+        digest = hashlib.sha1(data).digest()
+        hexdigest = hexlify(digest).decode('ascii')
+        blob = self.blob_path(hexdigest)
+        # check the key before writing anything, so a bad key can't leave
+        # an unreferenced blob behind
+        record = self._record(key, digest)
+        with self._lock:
+            if not os.path.exists(blob):
+                if not os.path.isdir(os.path.dirname(blob)):
+                    os.makedirs(os.path.dirname(blob), 0o700)
+                write_atomic(blob, data, binary=True)
+            if self._index.get(key, None) != digest:
+                self._append(key, digest, record)
+        return hexdigest
+
+    def mark_missing(self, key):
+        """
+        Record that the tile service returned a 403 for a tile.
+
+        :param key: (continent, floor, zoom, x, y) tuple
+        :type key: tuple
+        """
+        key = tuple(key)
+        with self._lock:
+            if self._index.get(key, None) != MISSING_DIGEST:
+                self._append(key, MISSING_DIGEST)
+
+    def stats(self, continent=None, floor=None):
+        """
+        Return deduplication statistics for the store, optionally limited to
+        one continent and/or floor.
+
+        :param continent: continent ID to limit to
+        :type continent: int
+        :param floor: floor to limit to
+        :type floor: int
+        :return: dict with keys ``tiles`` (cached tiles), ``missing`` (known
+          403s), ``blobs`` (distinct tiles), ``logical_bytes`` (size if
+          every tile were stored separately), ``stored_bytes`` (size of the
+          distinct blobs), ``saved_bytes`` and ``dedup_ratio`` (tiles per
+          blob)
+        :rtype: dict
+        """
+        with self._lock:
+            items = list(self._index.items())
+        tiles = 0
+        missing = 0
+        refs = {}
+        for key, digest in items:
+            if continent is not None and key[0] != continent:
+                continue
+            if floor is not None and key[1] != floor:
+                continue
+            if digest == MISSING_DIGEST:
+                missing += 1
+                continue
+            tiles += 1
+            refs[digest] = refs.get(digest, 0) + 1
+        logical = 0
+        stored = 0
+        for digest, count in refs.items():
+            path = self.blob_path(hexlify(digest).decode('ascii'))
+            if not os.path.exists(path):
+                continue
+            size = os.path.getsize(path)
+            stored += size
+            logical += size * count
+        return {
+            'tiles': tiles,
+            'missing': missing,
+            'blobs': len(refs),
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'saved_bytes': logical - stored,
+            'dedup_ratio': (float(tiles) / len(refs)) if refs else 1.0
+        }
@@ -0,0 +1,202 @@
+"""
+gw2copilot/tile_synth.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+from io import BytesIO
+from twisted.internet.threads import deferToThreadPool
+
+logger = logging.getLogger(__name__)
+
+#: width and height of GW2 map tiles, in pixels
+TILE_SIZE = 256
+
+#: JPEG quality for synthesized tiles
+SYNTH_JPEG_QUALITY = 85
+
+
+def synthesize_from_children(child_paths):
+    """
+    Build a tile by stitching together its four children at the next zoom
+    level and downsampling the result.
+
+    :param child_paths: 2x2 nested list of child tile paths, indexed
+      ``[dy][dx]`` (i.e. ``child_paths[0][1]`` is the top-right child)
+    :type child_paths: list
+    :return: JPEG content
+    :rtype: str
+    """
+    from PIL import Image
+    canvas = Image.new('RGB', (TILE_SIZE * 2, TILE_SIZE * 2))
+    for dy in range(2):
+        for dx in range(2):
+            child = Image.open(child_paths[dy][dx]).convert('RGB')
+            if child.size != (TILE_SIZE, TILE_SIZE):
+                child = child.resize((TILE_SIZE, TILE_SIZE), Image.BILINEAR)
+            canvas.paste(child, (dx * TILE_SIZE, dy * TILE_SIZE))
+    img = canvas.resize((TILE_SIZE, TILE_SIZE), Image.ANTIALIAS)
+    return _jpeg(img)
+
+
+def synthesize_from_parent(parent_path, x, y):
+    """
+    Build a tile by cropping the matching quadrant out of its parent at the
+    previous zoom level and upscaling it.
+
+    :param parent_path: path to the parent tile, ``(x // 2, y // 2)`` at
+      ``zoom - 1``
+    :type parent_path: str
+    :param x: x coordinate of the tile to build
+    :type x: int
+    :param y: y coordinate of the tile to build
+    :type y: int
+    :return: JPEG content
+    :rtype: str
+    """
+    from PIL import Image
+    parent = Image.open(parent_path).convert('RGB')
+    half = parent.size[0] // 2
+    left = (x % 2) * half
+    top = (y % 2) * half
+    quadrant = parent.crop((left, top, left + half, top + half))
+    img = quadrant.resize((TILE_SIZE, TILE_SIZE), Image.BILINEAR)
+    return _jpeg(img)
+
+
+def _jpeg(img):
+    """return the JPEG encoding of PIL Image ``img``"""
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=SYNTH_JPEG_QUALITY)
+    return out.getvalue()
+
+
+class TileSynthesizer(object):
+    """
+    Build provisional stand-ins for tiles that aren't cached yet, from cached
+    tiles at neighboring zoom levels: preferably by downsampling the four
+    children at ``zoom + 1``, otherwise by upscaling a quadrant of the parent
+    at ``zoom - 1``. Image work is done in the tile worker thread pool.
+    Synthesized tiles are never written to the cache.
+    """
+
+    def __init__(self, reactor, pool, cache):
+        """
+        :param reactor: the Twisted reactor
+        :type reactor: twisted.internet.reactor
+        :param pool: thread pool to do image processing in
+        :type pool: twisted.python.threadpool.ThreadPool
+        :param cache: the API client that owns the tile cache
+        :type cache: :py:class:`~.CachingAPIClient`
+        """
+        self._reactor = reactor
+        self._pool = pool
+        self._cache = cache
+
+    def sources(self, continent, floor, zoom, x, y):
+        """
+        Find cached tiles that a tile can be synthesized from.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        :param x: x coordinate
+        :type x: int
+        :param y: y coordinate
+        :type y: int
+        :return: ``('children', [[path, path], [path, path]])``,
+          ``('parent', path)`` or None
+        :rtype: tuple
+        """
+        children = [
+            [
+                self._cache.tile_path(continent, floor, zoom + 1,
+                                      x * 2 + dx, y * 2 + dy)
+                for dx in range(2)
+            ]
+            for dy in range(2)
+        ]
+        if all(p is not None for row in children for p in row):
+            return 'children', children
+        if zoom > 0:
+            parent = self._cache.tile_path(continent, floor, zoom - 1,
+                                           x // 2, y // 2)
+            if parent is not None:
+                return 'parent', parent
+        return None
+
+    def synthesize(self, continent, floor, zoom, x, y):
+        """
+        Build a provisional tile from cached neighbors, in the worker pool.
+
+        :param continent: continent ID
+        :type continent: int
+        :param floor: floor number
+        :type floor: int
+        :param zoom: zoom level
+        :type zoom: int
+        :param x: x coordinate
+        :type x: int
+        :param y: y coordinate
+        :type y: int
+        :return: Deferred firing with JPEG content (or None if synthesis
+          failed), or None if there are no usable cached neighbors
+        :rtype: twisted.internet.defer.Deferred
+        """
+        src = self.sources(continent, floor, zoom, x, y)
+        if src is None:
+            return None
+        kind, paths = src
+        logger.debug('Synthesizing tile %s from %s', (
+            continent, floor, zoom, x, y), kind)
+        if kind == 'children':
+            d = deferToThreadPool(self._reactor, self._pool,
+                                  synthesize_from_children, paths)
+        else:
+            d = deferToThreadPool(self._reactor, self._pool,
+                                  synthesize_from_parent, paths, x, y)
+        d.addErrback(self._failed, (continent, floor, zoom, x, y))
+        return d
+
+    def _failed(self, failure, key):
+        """errback for :py:meth:`~.synthesize`; log and return None"""
+        logger.error('Unable to synthesize tile %s: %s', key,
+                     failure.getErrorMessage())
+        return None
@@ -0,0 +1,181 @@
+"""
+gw2copilot/tile_transcoder.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import os
+from io import BytesIO
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.threads import deferToThreadPool
+
+from .utils import write_atomic
+
+logger = logging.getLogger(__name__)
+
+#: Default WebP quality tiers; tier name to PIL WebP quality (0-100)
+DEFAULT_WEBP_TIERS = {'high': 80, 'low': 50}
+
+
+def webp_supported():
+    """
+    Return whether the installed PIL/Pillow can write WebP images.
+
+    :rtype: bool
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    Image.init()
+    return 'WEBP' in Image.SAVE
+
+
+class TileTranscoder(object):
+    """
+    Transcode cached JPEG map tiles to WebP at one or more quality tiers. The
+    variants are cached next to the original tile's blob in the
+    :py:class:`~.TileStore`, as ``blobs/xx/{sha1}.q{quality}.webp``; like the
+    blob's, their name is used as their ETag (see
+    :py:meth:`~.GW2CopilotAPI._tile_etag`). Transcoding is
+    done in the dedicated tile worker thread pool, so it never blocks the
+    reactor and doesn't starve the reactor's default pool (used by cache
+    warm-up and gw2timer refreshes).
+    """
+
+    def __init__(self, reactor, pool, tiers=None):
+        """
+        :param reactor: the Twisted reactor
+        :type reactor: twisted.internet.reactor
+        :param pool: thread pool to transcode in
+        :type pool: twisted.python.threadpool.ThreadPool
+        :param tiers: dict of tier name to WebP quality; defaults to
+          :py:data:`~.DEFAULT_WEBP_TIERS`
+        :type tiers: dict
+        """
+        self._reactor = reactor
+        self._pool = pool
+        if tiers is None:
+            tiers = DEFAULT_WEBP_TIERS
+        self.tiers = dict(tiers)
+        # destination path to list of Deferreds waiting on it
+        self._in_flight = {}
+
+    @property
+    def default_tier(self):
+        """
+        Return the name of the tier used when the client doesn't request one;
+        the highest-quality tier.
+
+        :rtype: str
+        """
+        return max(self.tiers, key=lambda t: self.tiers[t])
+
+    def variant_path(self, tile_path, tier):
+        """
+        Return the path of the WebP variant of a cached tile.
+
+        :param tile_path: path to the cached JPEG tile's blob,
+          ``blobs/xx/{sha1}.jpg``
+        :type tile_path: str
+        :param tier: tier name
+        :type tier: str
+        :rtype: str
+        """
+        base = os.path.splitext(tile_path)[0]
+        return '%s.q%d.webp' % (base, self.tiers[tier])
+
+    def transcode(self, tile_path, tier):
+        """
+        Return a Deferred that fires with the path to the WebP variant of
+        ``tile_path`` at ``tier``, transcoding it first if it's not already
+        cached. Concurrent requests for the same variant share one transcode.
+        If transcoding fails, the Deferred fires with None and the caller
+        should serve the original.
+
+        :param tile_path: path to the cached JPEG tile
+        :type tile_path: str
+        :param tier: tier name
+        :type tier: str
+        :return: Deferred firing with the variant path, or None
+        :rtype: twisted.internet.defer.Deferred
+        """
+        dest = self.variant_path(tile_path, tier)
+        if os.path.exists(dest):
+            return succeed(dest)
+        d = Deferred()
+        if dest in self._in_flight:
+            self._in_flight[dest].append(d)
+            return d
+        self._in_flight[dest] = [d]
+        td = deferToThreadPool(self._reactor, self._pool, self._transcode,
+                               tile_path, dest, self.tiers[tier])
+        td.addCallback(lambda _: dest)
+        td.addErrback(self._transcode_failed, tile_path)
+        td.addCallback(self._transcode_done, dest)
+        return d
+
+    def _transcode_failed(self, failure, tile_path):
+        """errback for :py:meth:`~.transcode`; log and return None"""
+        logger.error('Unable to transcode tile %s to WebP: %s', tile_path,
+                     failure.getErrorMessage())
+        return None
+
+    def _transcode_done(self, result, dest):
+        """fire every Deferred waiting on ``dest`` with ``result``"""
+        for d in self._in_flight.pop(dest, []):
+            d.callback(result)
+
+    def _transcode(self, src, dest, quality):
+        """
+        Transcode ``src`` to WebP at ``quality`` and atomically write it to
+        ``dest``. Runs in the worker pool.
+
+        :param src: path to the JPEG tile
+        :type src: str
+        :param dest: path to write the WebP variant to
+        :type dest: str
+        :param quality: WebP quality, 0-100
+        :type quality: int
+        """
+        from PIL import Image
+        img = Image.open(src)
+        out = BytesIO()
+        img.save(out, format='WEBP', quality=quality)
+        write_atomic(dest, out.getvalue(), binary=True)
+        logger.debug('Transcoded %s to %s (%d bytes)', src, dest,
+                     len(out.getvalue()))
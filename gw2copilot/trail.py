@@ -0,0 +1,489 @@
+"""
+gw2copilot/trail.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+import re
+import struct
+import logging
+from array import array
+from hashlib import sha1
+
+from .coords import LEAFLET_MAX_ZOOM
+
+logger = logging.getLogger(__name__)
+
+#: magic bytes at the start of a trail file
+TRAIL_MAGIC = b'GW2TRAIL'
+#: trail file format version
+TRAIL_VERSION = 1
+#: file header: magic, format version
+_FILE_HEADER = struct.Struct('<8sH')
+#: one point: timestamp (seconds since the epoch), map ID, continent x and y
+_POINT = struct.Struct('<dIff')
+
+#: minimum distance, in continent units, between recorded points on a map
+MIN_DISTANCE = 2.0
+
+#: a gap between points longer than this, in seconds, starts a new segment
+SEGMENT_GAP = 30.0
+
+#: a jump between points longer than this, in continent units, starts a new
+#: segment (e.g. using a waypoint)
+SEGMENT_JUMP = 200.0
+
+#: simplification tolerance, in screen pixels at the requested zoom level
+PIXEL_TOLERANCE = 1.0
+
+#: how often the server flushes trails to disk, in seconds
+FLUSH_INTERVAL = 30.0
+
+
+def zoom_tolerance(zoom):
+    """
+    Return the simplification tolerance, in continent units, for a Leaflet
+    zoom level: :py:data:`~.PIXEL_TOLERANCE` screen pixels at that zoom.
+
+    :param zoom: zoom level, 0 to :py:data:`~.LEAFLET_MAX_ZOOM`
+    :type zoom: int
+    :rtype: float
+    """
+    return PIXEL_TOLERANCE * 2 ** (LEAFLET_MAX_ZOOM - zoom)
+
+
+def simplify(xs, ys, start, end, tolerance):
+    """
+    Simplify the polyline of points ``start`` to ``end - 1`` of ``xs`` and
+    ``ys`` with the Douglas-Peucker algorithm, keeping every point that is
+    more than ``tolerance`` from the simplified line. The first and last
+    points are always kept.
+
+    :param xs: point X coordinates
+    :type xs: array.array
+    :param ys: point Y coordinates
+    :type ys: array.array
+    :param start: index of the first point
+    :type start: int
+    :param end: index after the last point
+    :type end: int
+    :param tolerance: maximum distance of dropped points from the line
+    :type tolerance: float
+    :return: sorted indices of the points to keep
+    :rtype: list
+    """
+    if end - start <= 2:
+        return list(range(start, end))
+    tol2 = tolerance * tolerance
+    keep = [start, end - 1]
+    # iterative, so long straight-ish trails can't hit the recursion limit
+    stack = [(start, end - 1)]
+    while stack:
+        a, b = stack.pop()
+        ax = xs[a]
+        ay = ys[a]
+        dx = xs[b] - ax
+        dy = ys[b] - ay
+        seg2 = dx * dx + dy * dy
+        best = -1
+        best_d2 = tol2
+        for i in range(a + 1, b):
+            px = xs[i] - ax
+            py = ys[i] - ay
+            if seg2 == 0:
+                d2 = px * px + py * py
+            else:
+                cross = px * dy - py * dx
+                d2 = cross * cross / seg2
+            if d2 > best_d2:
+                best_d2 = d2
+                best = i
+        if best >= 0:
+            keep.append(best)
+            stack.append((a, best))
+            stack.append((best, b))
+    keep.sort()
+    return keep
+
+
+class MapTrail(object):
+    """
+    In-memory trail for one character on one map, split into segments at
+    gaps and jumps (see :py:data:`~.SEGMENT_GAP` and
+    :py:data:`~.SEGMENT_JUMP`). Simplified segments are cached per zoom
+    level; appending points only invalidates the last segment.
+    """
+
+    __slots__ = ['ts', 'xs', 'ys', '_starts', '_simplified']
+
+    def __init__(self):
+        self.ts = array('d')
+        self.xs = array('d')
+        self.ys = array('d')
+        # index of the first point of each segment
+        self._starts = []
+        # zoom -> {segment start: (segment end, kept indices)}
+        self._simplified = {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, timestamp, x, y):
+        """
+        Add a point to the end of the trail.
+
+        :param timestamp: time of the point, in seconds since the epoch
+        :type timestamp: float
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        """
+        n = len(self.ts)
+        if n == 0 or timestamp - self.ts[-1] > SEGMENT_GAP or \
+                abs(x - self.xs[-1]) + abs(y - self.ys[-1]) > SEGMENT_JUMP:
+            self._starts.append(n)
+        self.ts.append(timestamp)
+        self.xs.append(x)
+        self.ys.append(y)
+
+    @property
+    def latest(self):
+        """
+        Return the timestamp of the last point, or None if there are none.
+
+        :rtype: float
+        """
+        if len(self.ts) == 0:
+            return None
+        return self.ts[-1]
+
+    def query(self, zoom, since=None):
+        """
+        Return the trail simplified for a zoom level, as a list of segments,
+        each a list of ``[x, y]`` continent coordinates.
+
+        :param zoom: Leaflet zoom level
+        :type zoom: int
+        :param since: if not None, only include points from this time (in
+          seconds since the epoch) onwards
+        :type since: float
+        :rtype: list
+        """
+        cache = self._simplified.setdefault(zoom, {})
+        tolerance = zoom_tolerance(zoom)
+        ends = self._starts[1:] + [len(self.ts)]
+        result = []
+        for start, end in zip(self._starts, ends):
+            if since is not None and self.ts[end - 1] < since:
+                continue
+            cached = cache.get(start)
+            if cached is None or cached[0] != end:
+                cached = (end, simplify(self.xs, self.ys, start, end,
+                                        tolerance))
+                cache[start] = cached
+            points = [
+                [round(self.xs[i], 1), round(self.ys[i], 1)]
+                for i in cached[1]
+                if since is None or self.ts[i] >= since
+            ]
+            if points:
+                result.append(points)
+        return result
+
+
+class CharacterTrail(object):
+    """
+    Breadcrumb trail for one character, across all maps and all runs of the
+    program. Points are appended to a binary file (after a header of
+    :py:data:`~.TRAIL_MAGIC` and :py:data:`~.TRAIL_VERSION`, fixed-size
+    records of timestamp, map ID and continent coordinates), which is read
+    back when the trail is opened, and kept in memory per map as
+    :py:class:`~.MapTrail`.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the trail file; created if it doesn't exist
+        :type path: str
+        :raises: ValueError if the file exists and is not a trail file in a
+          known format
+        """
+        self.path = path
+        self.maps = {}
+        self._last = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._load()
+            self._fh = open(path, 'ab')
+        else:
+            self._fh = open(path, 'wb')
+            self._fh.write(_FILE_HEADER.pack(TRAIL_MAGIC, TRAIL_VERSION))
+
+    def _load(self):
+        """
+        Load the points in ``self.path``. A record truncated at the end of
+        the file (e.g. if the program was killed) is dropped from the file.
+        """
+        with open(self.path, 'rb') as fh:
+            header = fh.read(_FILE_HEADER.size)
+            if len(header) < _FILE_HEADER.size:
+                raise ValueError('%s is not a trail file' % self.path)
+            magic, version = _FILE_HEADER.unpack(header)
+            if magic != TRAIL_MAGIC or version != TRAIL_VERSION:
+                raise ValueError('%s is not a version %d trail file' % (
+                    self.path, TRAIL_VERSION))
+            data = fh.read()
+        count = len(data) // _POINT.size
+        for i in range(count):
+            self._add(*_POINT.unpack_from(data, i * _POINT.size))
+        if len(data) != count * _POINT.size:
+            logger.warning('Dropping truncated record at end of %s',
+                           self.path)
+            with open(self.path, 'r+b') as fh:
+                fh.truncate(_FILE_HEADER.size + count * _POINT.size)
+        logger.debug('Loaded %d trail points from %s', count, self.path)
+
+    def _add(self, timestamp, map_id, x, y):
+        trail = self.maps.get(map_id)
+        if trail is None:
+            trail = self.maps[map_id] = MapTrail()
+        trail.append(timestamp, x, y)
+        self._last = (map_id, x, y)
+
+    def record(self, timestamp, map_id, x, y):
+        """
+        Record a position, unless it is on the same map and within
+        :py:data:`~.MIN_DISTANCE` of the last recorded one.
+
+        :param timestamp: time of the position, in seconds since the epoch
+        :type timestamp: float
+        :param map_id: map ID
+        :type map_id: int
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :return: whether the point was recorded
+        :rtype: bool
+        """
+        last = self._last
+        if last is not None and last[0] == map_id and \
+                abs(x - last[1]) < MIN_DISTANCE and \
+                abs(y - last[2]) < MIN_DISTANCE:
+            return False
+        self._add(timestamp, map_id, x, y)
+        if self._fh is not None:
+            self._fh.write(_POINT.pack(timestamp, map_id, x, y))
+        return True
+
+    def query(self, map_id, zoom, since=None):
+        """
+        Return the simplified trail on a map; see :py:meth:`~.MapTrail.query`.
+
+        :param map_id: map ID
+        :type map_id: int
+        :param zoom: Leaflet zoom level
+        :type zoom: int
+        :param since: if not None, only include points from this time on
+        :type since: float
+        :return: list of segments, each a list of ``[x, y]`` points
+        :rtype: list
+        """
+        trail = self.maps.get(map_id)
+        if trail is None:
+            return []
+        return trail.query(zoom, since=since)
+
+    def flush(self):
+        """Flush recorded points to disk."""
+        if self._fh is not None:
+            self._fh.flush()
+
+    def close(self):
+        """Flush and close the trail file."""
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+
+
+class TrailStore(object):
+    """
+    The :py:class:`~.CharacterTrail` for each character, stored as one file
+    per character in a directory (by default, ``trails/`` under the cache
+    directory). Trails are opened the first time a character is seen. Trail
+    files hold a character's whole history, so they can be opened in a
+    worker thread; points recorded meanwhile are queued, and recorded once
+    the trail is open.
+    """
+
+    def __init__(self, directory, run=None):
+        """
+        :param directory: directory to store trail files in; created if it
+          doesn't exist
+        :type directory: str
+        :param run: callable ``run(func, *args)`` that calls ``func`` in a
+          worker thread and returns a Deferred (i.e. ``deferToThread``), to
+          open trails with; if None, trails are opened synchronously
+        :type run: callable
+        """
+        self.directory = directory
+        self._run = run
+        self._trails = {}
+        # character name to points recorded while its trail is opening
+        self._loading = {}
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def path_for(self, name):
+        """
+        Return the path of a character's trail file; the name with anything
+        but letters and digits replaced, plus a short hash of the full name
+        so that different names never share a file.
+
+        :param name: character name
+        :type name: str
+        :rtype: str
+        """
+        raw = name if isinstance(name, bytes) else name.encode('utf-8')
+        safe = re.sub(r'[^A-Za-z0-9]+', '_',
+                      raw.decode('utf-8', 'replace')).strip('_')
+        return os.path.join(self.directory, '%s-%s.trail' % (
+            safe, sha1(raw).hexdigest()[:8]))
+
+    def trail(self, name):
+        """
+        Return the trail for a character. If it isn't open yet, start
+        opening it; when opening in a worker thread, return None until that
+        has finished.
+
+        :param name: character name
+        :type name: str
+        :return: the character's trail, or None if it's still being opened
+        :rtype: :py:class:`~.CharacterTrail`
+        """
+        trail = self._trails.get(name)
+        if trail is not None:
+            return trail
+        if self._run is None:
+            trail = self._open(name)
+            self._trails[name] = trail
+            return trail
+        if name not in self._loading:
+            self._loading[name] = []
+            d = self._run(self._open, name)
+            d.addCallbacks(self._opened, self._open_failed,
+                           callbackArgs=(name,), errbackArgs=(name,))
+        return self._trails.get(name)
+
+    def _open(self, name):
+        """
+        Open a character's trail, moving an unreadable trail file aside.
+        This may run in a worker thread.
+
+        :param name: character name
+        :type name: str
+        :rtype: :py:class:`~.CharacterTrail`
+        """
+        path = self.path_for(name)
+        try:
+            return CharacterTrail(path)
+        except ValueError:
+            logger.exception('Moving aside unreadable trail file %s', path)
+            os.rename(path, path + '.bad')
+            return CharacterTrail(path)
+
+    def _opened(self, trail, name):
+        """
+        Callback for opening a trail in a worker thread; record the points
+        queued meanwhile. If the store was closed meanwhile, just close the
+        trail.
+        """
+        if name not in self._loading:
+            trail.close()
+            return
+        for point in self._loading.pop(name):
+            trail.record(*point)
+        self._trails[name] = trail
+
+    def _open_failed(self, failure, name):
+        """
+        Errback for opening a trail in a worker thread; log the error and
+        drop the queued points. The next :py:meth:`~.trail` call retries.
+        """
+        points = self._loading.pop(name, [])
+        logger.error('Unable to open trail for %s (dropping %d points): %s',
+                     name, len(points), failure.getErrorMessage())
+
+    def record(self, name, timestamp, map_id, x, y):
+        """
+        Record a position for a character; see
+        :py:meth:`~.CharacterTrail.record`.
+
+        :param name: character name
+        :type name: str
+        :param timestamp: time of the position, in seconds since the epoch
+        :type timestamp: float
+        :param map_id: map ID
+        :type map_id: int
+        :param x: continent X coordinate
+        :type x: float
+        :param y: continent Y coordinate
+        :type y: float
+        :return: whether the point was recorded (or queued, if the trail is
+          still being opened)
+        :rtype: bool
+        """
+        trail = self.trail(name)
+        if trail is not None:
+            return trail.record(timestamp, map_id, x, y)
+        pending = self._loading.get(name)
+        if pending is None:
+            return False
+        pending.append((timestamp, map_id, x, y))
+        return True
+
+    def flush(self):
+        """Flush every open trail to disk."""
+        for trail in self._trails.values():
+            trail.flush()
+
+    def close(self):
+        """Close every open trail."""
+        for trail in self._trails.values():
+            trail.close()
+        self._trails = {}
+        self._loading = {}
@@ -0,0 +1,382 @@
+"""
+gw2copilot/travel_graph.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import heapq
+import logging
+from array import array
+from collections import OrderedDict
+from math import hypot
+
+logger = logging.getLogger(__name__)
+
+#: running speed out of combat, in continent units per second (about 294
+#: inches per second, and most maps have 24 inches per continent unit)
+WALK_SPEED = 294 / 24.0
+
+#: seconds spent in a loading screen when changing maps
+LOADING_TIME = 15.0
+
+#: seconds to use a waypoint, from anywhere
+WAYPOINT_TIME = LOADING_TIME
+
+#: seconds to use a skritt tunnel, zone transport or launch pad
+TRANSPORT_TIME = 5.0
+
+#: travel modes, by the code stored in :py:attr:`~.TravelGraph.edge_modes`
+MODES = ('walk', 'gate', 'waypoint')
+WALK = 0
+GATE = 1
+WAYPOINT = 2
+
+#: (:py:attr:`~.CachingAPIClient.travel_paths` type, usable in both
+#: directions, seconds) for each kind of travel connection
+CONNECTIONS = (
+    ('interborders', True, LOADING_TIME),
+    ('interzones', True, LOADING_TIME),
+    ('intrazones', True, TRANSPORT_TIME),
+    ('launchpads', False, TRANSPORT_TIME),
+)
+
+#: number of origins whose shortest path trees are memoized
+ROUTE_CACHE_SIZE = 16
+
+_INF = float('inf')
+
+
+class TravelGraph(object):
+    """
+    Weighted graph of the ways to get around the world: walking within a
+    map, travel connections (asura gates, zone portals, skritt tunnels and
+    launch pads; see :py:attr:`~.CachingAPIClient.travel_paths`) and
+    waypoints. Edge weights are estimated travel times in seconds.
+
+    The graph is built once per map catalog load. Nodes are the waypoints
+    and connection ends; edges are stored in compressed sparse row arrays
+    (the edges leaving node ``i`` are ``edge_offsets[i]`` up to
+    ``edge_offsets[i + 1]``). Waypoints can be used from anywhere, so they
+    are not edges; instead every waypoint is reachable from the origin of a
+    route in :py:data:`~.WAYPOINT_TIME`.
+
+    :py:meth:`~.route` runs Dijkstra's algorithm over the whole graph from
+    the origin, and memoizes the resulting shortest path tree, so routes
+    from the same place to any destination are just a walk up the tree.
+    """
+
+    def __init__(self, maps, paths=None):
+        """
+        Build the graph.
+
+        :param maps: dict of map ID to map data (as returned by
+          :py:meth:`~.CachingAPIClient.map_data`) for the maps to include
+        :type maps: dict
+        :param paths: travel connections (see
+          :py:attr:`~.CachingAPIClient.travel_paths`), or None
+        :type paths: dict
+        """
+        #: dict of map ID to continent rect of each map in the graph
+        self.map_rects = {}
+        #: node continent x coordinates
+        self.node_x = array('d')
+        #: node continent y coordinates
+        self.node_y = array('d')
+        #: node map IDs
+        self.node_map = array('i')
+        #: node names
+        self.node_names = []
+        #: node chat links (None for connection ends)
+        self.node_links = []
+        #: edges leaving node ``i`` are ``edge_offsets[i]`` up to
+        #: ``edge_offsets[i + 1]``
+        self.edge_offsets = array('i', [0])
+        #: edge target nodes
+        self.edge_targets = array('i')
+        #: edge weights, in seconds
+        self.edge_weights = array('d')
+        #: edge travel modes; see :py:data:`~.MODES`
+        self.edge_modes = array('b')
+        self._map_nodes = {}  # map ID to list of node indexes
+        self._waypoints = array('i')
+        self._trees = OrderedDict()  # memoized shortest path trees
+        for map_id in sorted(maps.keys()):
+            data = maps[map_id]
+            if data is None or 'continent_rect' not in data:
+                continue
+            self.map_rects[map_id] = data['continent_rect']
+            self._map_nodes[map_id] = []
+            pois = data.get('points_of_interest', {})
+            for poi in pois.get('waypoint', []):
+                i = self._add_node(map_id, poi['coord'], poi.get('name'),
+                                   poi.get('chat_link'))
+                self._waypoints.append(i)
+        edges = []
+        for conn_type, both_ways, seconds in CONNECTIONS:
+            if paths is None:
+                break
+            for conn in paths.get(conn_type, []):
+                a = conn['end_a']
+                b = conn['end_b']
+                if (a['map_id'] not in self.map_rects or
+                        b['map_id'] not in self.map_rects):
+                    continue
+                ia = self._add_node(a['map_id'], a['coord'], a.get('title'))
+                ib = self._add_node(b['map_id'], b['coord'], b.get('title'))
+                edges.append((ia, ib, seconds, GATE))
+                if both_ways:
+                    edges.append((ib, ia, seconds, GATE))
+        for nodes in self._map_nodes.values():
+            for i in nodes:
+                for j in nodes:
+                    if i != j:
+                        edges.append((i, j, self._walk_time(
+                            self.node_x[i], self.node_y[i],
+                            self.node_x[j], self.node_y[j]), WALK))
+        edges.sort()
+        count = len(self.node_x)
+        edge = 0
+        for i in range(count):
+            while edge < len(edges) and edges[edge][0] == i:
+                _, j, seconds, mode = edges[edge]
+                self.edge_targets.append(j)
+                self.edge_weights.append(seconds)
+                self.edge_modes.append(mode)
+                edge += 1
+            self.edge_offsets.append(edge)
+        logger.debug('Built travel graph of %d maps, %d nodes and %d edges',
+                     len(self.map_rects), count, len(self.edge_targets))
+
+    def _add_node(self, map_id, coord, name, chat_link=None):
+        """
+        Add a node to the graph.
+
+        :param map_id: ID of the map the node is on
+        :type map_id: int
+        :param coord: continent coordinates [x, y]
+        :type coord: list
+        :param name: node name
+        :type name: str
+        :param chat_link: chat link for waypoints
+        :type chat_link: str
+        :return: new node index
+        :rtype: int
+        """
+        self.node_x.append(coord[0])
+        self.node_y.append(coord[1])
+        self.node_map.append(map_id)
+        self.node_names.append(name)
+        self.node_links.append(chat_link)
+        i = len(self.node_x) - 1
+        self._map_nodes[map_id].append(i)
+        return i
+
+    @staticmethod
+    def _walk_time(x1, y1, x2, y2):
+        """
+        Return the time, in seconds, to walk between two points.
+
+        :return: seconds
+        :rtype: float
+        """
+        return hypot(x2 - x1, y2 - y1) / WALK_SPEED
+
+    @property
+    def node_count(self):
+        """
+        Return the number of nodes in the graph.
+
+        :rtype: int
+        """
+        return len(self.node_x)
+
+    def map_at(self, x, y):
+        """
+        Return the ID of the map in the graph containing a point.
+
+        :param x: continent x coordinate
+        :type x: float
+        :param y: continent y coordinate
+        :type y: float
+        :return: map ID, or None if no map contains the point
+        :rtype: int
+        """
+        for map_id in sorted(self.map_rects.keys()):
+            (x1, y1), (x2, y2) = self.map_rects[map_id]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                return map_id
+        return None
+
+    def map_center(self, map_id):
+        """
+        Return the center of a map's continent rect.
+
+        :param map_id: map ID
+        :type map_id: int
+        :return: (x, y) continent coordinates
+        :rtype: tuple
+        """
+        (x1, y1), (x2, y2) = self.map_rects[map_id]
+        return (x1 + x2) / 2.0, (y1 + y2) / 2.0
+
+    def shortest_paths(self, map_id, x, y):
+        """
+        Return the shortest path tree from a point, computing and memoizing
+        it if needed (the last :py:data:`~.ROUTE_CACHE_SIZE` origins, rounded
+        to whole continent units, are kept).
+
+        :param map_id: ID of the map the origin is on
+        :type map_id: int
+        :param x: origin continent x coordinate
+        :type x: float
+        :param y: origin continent y coordinate
+        :type y: float
+        :return: 3-tuple of arrays, indexed by node: time in seconds to reach
+          the node (infinity if unreachable), previous node (-1 for the
+          origin), and the mode of the last hop
+        :rtype: tuple
+        """
+        key = (map_id, int(round(x)), int(round(y)))
+        tree = self._trees.pop(key, None)
+        if tree is None:
+            tree = self._dijkstra(map_id, x, y)
+        self._trees[key] = tree
+        while len(self._trees) > ROUTE_CACHE_SIZE:
+            self._trees.popitem(last=False)
+        return tree
+
+    def _dijkstra(self, map_id, x, y):
+        """
+        Run Dijkstra's algorithm from a point; see :py:meth:`~.shortest_paths`.
+        """
+        count = len(self.node_x)
+        dist = array('d', [_INF]) * count
+        prev = array('i', [-1]) * count
+        modes = array('b', [WALK]) * count
+        heap = []
+        for i in self._map_nodes.get(map_id, []):
+            dist[i] = self._walk_time(x, y, self.node_x[i], self.node_y[i])
+        for i in self._waypoints:
+            if WAYPOINT_TIME < dist[i]:
+                dist[i] = WAYPOINT_TIME
+                modes[i] = WAYPOINT
+        for i in range(count):
+            if dist[i] < _INF:
+                heap.append((dist[i], i))
+        heapq.heapify(heap)
+        offsets = self.edge_offsets
+        targets = self.edge_targets
+        weights = self.edge_weights
+        edge_modes = self.edge_modes
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        while heap:
+            d, i = heappop(heap)
+            if d > dist[i]:
+                continue
+            for edge in range(offsets[i], offsets[i + 1]):
+                j = targets[edge]
+                nd = d + weights[edge]
+                if nd < dist[j]:
+                    dist[j] = nd
+                    prev[j] = i
+                    modes[j] = edge_modes[edge]
+                    heappush(heap, (nd, j))
+        return dist, prev, modes
+
+    def route(self, from_map, from_pos, to_map, to_pos=None):
+        """
+        Return the fastest route from a point to a map, or to a point on it.
+
+        :param from_map: ID of the map the route starts on
+        :type from_map: int
+        :param from_pos: (x, y) continent coordinates the route starts at
+        :type from_pos: tuple
+        :param to_map: ID of the destination map
+        :type to_map: int
+        :param to_pos: (x, y) continent coordinates of the destination, or
+          None to stop as soon as the route reaches ``to_map``
+        :type to_pos: tuple
+        :return: dict with ``seconds`` (the estimated total travel time) and
+          ``steps``, a list of hops each described by a dict with ``mode``
+          (see :py:data:`~.MODES`), ``seconds``, and the ``map_id``,
+          ``coord``, ``name`` and ``chat_link`` of where the hop ends; or
+          None if ``to_map`` cannot be reached
+        :rtype: dict
+        """
+        dist, prev, modes = self.shortest_paths(from_map, *from_pos)
+        best = _INF
+        last = -1
+        if from_map == to_map:
+            if to_pos is None:
+                return {'seconds': 0.0, 'steps': []}
+            best = self._walk_time(from_pos[0], from_pos[1], *to_pos)
+        for i in self._map_nodes.get(to_map, []):
+            d = dist[i]
+            if to_pos is not None:
+                d += self._walk_time(self.node_x[i], self.node_y[i],
+                                     *to_pos)
+            if d < best:
+                best = d
+                last = i
+        if best == _INF:
+            return None
+        chain = []
+        i = last
+        while i != -1:
+            chain.append(i)
+            i = prev[i]
+        steps = []
+        elapsed = 0.0
+        for i in reversed(chain):
+            steps.append({
+                'mode': MODES[modes[i]],
+                'seconds': dist[i] - elapsed,
+                'map_id': self.node_map[i],
+                'coord': [self.node_x[i], self.node_y[i]],
+                'name': self.node_names[i],
+                'chat_link': self.node_links[i]
+            })
+            elapsed = dist[i]
+        if to_pos is not None:
+            steps.append({
+                'mode': MODES[WALK],
+                'seconds': best - elapsed,
+                'map_id': to_map,
+                'coord': list(to_pos),
+                'name': None,
+                'chat_link': None
+            })
+        return {'seconds': best, 'steps': steps}
@@ -45,6 +45,8 @@ import json
 import time
 import os
 import re
+import threading
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -79,6 +81,45 @@ def set_headers(request):
                       'gw2copilot/%s/%s' % (VERSION, twisted_server))
 
 
+def unavailable_response(request, retry_after, reason):
+    """
+    Set a ``503 Service Unavailable`` response with a ``Retry-After`` header
+    on ``request``, and return the plain text response body. Used by endpoints
+    whose data is not available yet (i.e. during cache warm-up).
+
+    :param request: incoming HTTP request
+    :type request: :py:class:`twisted.web.server.Request`
+    :param retry_after: number of seconds the client should wait before
+      retrying
+    :type retry_after: int
+    :param reason: short human-readable reason, used as the response body
+    :type reason: str
+    :return: response body
+    :rtype: str
+    """
+    request.setResponseCode(503, message=make_response('SERVICE UNAVAILABLE'))
+    request.setHeader('Retry-After', '%d' % retry_after)
+    request.setHeader('Content-Type', 'text/plain')
+    return make_response(reason + "\n")
+
+
+def not_found_response(request, reason):
+    """
+    Set a ``404 Not Found`` response on ``request``, and return the plain
+    text response body.
+
+    :param request: incoming HTTP request
+    :type request: :py:class:`twisted.web.server.Request`
+    :param reason: short human-readable reason, used as the response body
+    :type reason: str
+    :return: response body
+    :rtype: str
+    """
+    request.setResponseCode(404, message=make_response('NOT FOUND'))
+    request.setHeader('Content-Type', 'text/plain')
+    return make_response(reason + "\n")
+
+
 def log_request(request):
     """
     Log request information and handling function, via Python logging.
@@ -132,6 +173,44 @@ def file_age(p):
     return time.time() - os.stat(p).st_mtime
 
 
+def write_atomic(path, data, binary=False):
+    """
+    Write ``data`` to ``path`` atomically, by writing to a temporary file in
+    the same directory and then renaming it over ``path``.
+
+    :param path: path to write to
+    :type path: str
+    :param data: content to write
+    :type data: str
+    :param binary: whether to write in binary mode
+    :type binary: bool
+    """
+    tmp_path = '%s.%d.%d.tmp' % (
+        path, os.getpid(), threading.current_thread().ident)
+    with open(tmp_path, 'wb' if binary else 'w') as fh:
+        fh.write(data)
+    replace_file(tmp_path, path)
+
+
+def replace_file(src, dest):
+    """
+    Rename ``src`` over ``dest``; atomic on POSIX. On Windows, which won't
+    rename over an existing file, ``dest`` is removed first.
+
+    :param src: path to rename
+    :type src: str
+    :param dest: destination path
+    :type dest: str
+    """
+    try:
+        os.rename(src, dest)
+    except OSError:
+        if not os.path.exists(dest):
+            raise
+        os.unlink(dest)
+        os.rename(src, dest)
+
+
 def extract_js_var(s, varname):
     """
     Given a string of javascript source code, extract the source of the given
@@ -144,15 +223,76 @@ def extract_js_var(s, varname):
     :return: source of specified variable
     :rtype: str
     """
-    vname_re = re.compile('^var %s\s+=\s+{.*$' % varname)
-    src = ''
-    in_var = False
-    for line in s.split("\n"):
-        if not in_var and vname_re.match(line):
-            in_var = True
-            src += line + "\n"
-        elif in_var:
-            src += line + "\n"
-            if '};' in line:
-                return src
+    vname_re = re.compile('^var %s\s+=\s+{.*$' % varname, re.M)
+    m = vname_re.search(s)
+    if m is not None:
+        end = s.find('};', m.end())
+        if end != -1:
+            # include the rest of the line containing the closing brace
+            eol = s.find("\n", end)
+            if eol == -1:
+                return s[m.start():] + "\n"
+            return s[m.start():eol + 1]
     raise Exception("Could not parse JS variable %s from source" % varname)
+
+
+class PhaseTimer(object):
+    """
+    Record the wall-clock duration of named, sequential phases (i.e. of
+    application startup), and format them as a report.
+    """
+
+    def __init__(self):
+        self._start = time.time()
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager that records the duration of its body as ``name``.
+
+        :param name: phase name
+        :type name: str
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def record(self, name, duration):
+        """
+        Record a phase whose duration was measured elsewhere.
+
+        :param name: phase name
+        :type name: str
+        :param duration: duration in seconds, or None if unknown
+        :type duration: float
+        """
+        self._phases.append((name, duration))
+
+    @property
+    def phases(self):
+        """
+        Return the recorded phases.
+
+        :return: list of (name, duration in seconds) 2-tuples
+        :rtype: list
+        """
+        return list(self._phases)
+
+    def report(self):
+        """
+        Return a human-readable report of all recorded phases.
+
+        :return: multi-line report
+        :rtype: str
+        """
+        width = max([len(p[0]) for p in self._phases] + [10])
+        lines = ['Startup profile:']
+        for name, duration in self._phases:
+            if duration is None:
+                lines.append('  %s %10s' % (name.ljust(width), 'n/a'))
+            else:
+                lines.append('  %s %9.3fs' % (name.ljust(width), duration))
+        return "\n".join(lines)
@@ -0,0 +1,242 @@
+"""
+gw2copilot/warmup.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/gw2copilot>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of gw2copilot.
+
+    gw2copilot is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    gw2copilot is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with gw2copilot.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/gw2copilot> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import time
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.threads import deferToThread
+
+logger = logging.getLogger(__name__)
+
+#: Minimum interval in seconds between "warmup" websocket progress messages
+#: (step state changes are always sent).
+PROGRESS_BROADCAST_INTERVAL = 0.5
+
+
+class CacheWarmer(object):
+    """
+    Fill the persistent cache in the background after the server has started
+    listening. Steps are run one at a time, in the order they were added (i.e.
+    priority order). Progress is available via :py:attr:`~.status` and is
+    broadcast to websocket clients as ``warmup`` messages.
+    """
+
+    def __init__(self, parent_server):
+        """
+        Initialize the warmer.
+
+        :param parent_server: the TwistedServer instance that owns this
+        :type parent_server: :py:class:`~.TwistedServer`
+        """
+        self.server = parent_server
+        self._steps = []
+        self._by_name = {}
+        self._state = 'pending'
+        self._start_time = None
+        self._end_time = None
+        self._last_broadcast = 0
+
+    def add_step(self, name, title, func, threaded=True):
+        """
+        Add a warm-up step. ``func`` will be called with a single argument, a
+        ``progress(done, total)`` callable that it may use to report progress.
+
+        :param name: short name of the step, used by :py:meth:`~.is_ready`
+        :type name: str
+        :param title: human-readable description of the step
+        :type title: str
+        :param func: callable that performs the step
+        :type func: callable
+        :param threaded: if True, ``func`` performs blocking work and will be
+          run in a thread (its progress callable is safe to call from that
+          thread). If False, ``func`` is called in the reactor thread and may
+          return a Deferred.
+        :type threaded: bool
+        """
+        step = {
+            'name': name,
+            'title': title,
+            'func': func,
+            'threaded': threaded,
+            'state': 'pending',
+            'done': 0,
+            'total': None,
+            'start': None,
+            'duration': None
+        }
+        self._steps.append(step)
+        self._by_name[name] = step
+
+    def start(self):
+        """
+        Start running steps in the background.
+
+        :return: Deferred that fires when all steps have finished
+        :rtype: twisted.internet.defer.Deferred
+        """
+        logger.info('Starting cache warm-up: %s',
+                    [s['name'] for s in self._steps])
+        self._state = 'running'
+        self._start_time = time.time()
+        d = maybeDeferred(lambda: None)
+        for step in self._steps:
+            d.addCallback(self._run_step, step)
+        d.addCallback(self._finished)
+        return d
+
+    def _run_step(self, _, step):
+        """
+        Run a single step; errors are logged and the step marked as failed,
+        but never stop later steps from running.
+        """
+        logger.info('Warm-up step starting: %s', step['name'])
+        step['state'] = 'running'
+        step['start'] = time.time()
+        self._broadcast(force=True)
+        if step['threaded']:
+            progress = self._threadsafe_progress(step)
+            d = deferToThread(step['func'], progress)
+        else:
+            d = maybeDeferred(step['func'], self._progress_callback(step))
+        d.addCallbacks(self._step_done, self._step_failed,
+                       callbackArgs=(step,), errbackArgs=(step,))
+        return d
+
+    def _step_done(self, _, step):
+        step['state'] = 'done'
+        step['duration'] = time.time() - step['start']
+        logger.info('Warm-up step %s finished in %.3fs', step['name'],
+                    step['duration'])
+        self._broadcast(force=True)
+
+    def _step_failed(self, failure, step):
+        step['state'] = 'failed'
+        step['duration'] = time.time() - step['start']
+        logger.error('Warm-up step %s failed: %s', step['name'],
+                     failure.getTraceback())
+        self._broadcast(force=True)
+
+    def _finished(self, _):
+        self._state = 'done'
+        self._end_time = time.time()
+        logger.warning('Cache warm-up complete in %.3fs',
+                       self._end_time - self._start_time)
+        self._broadcast(force=True)
+
+    def _progress_callback(self, step):
+        """return a progress(done, total) callable for use in the reactor"""
+        def progress(done, total):
+            step['done'] = done
+            step['total'] = total
+            self._broadcast()
+        return progress
+
+    def _threadsafe_progress(self, step):
+        """return a progress(done, total) callable for use in a thread"""
+        progress = self._progress_callback(step)
+
+        def threadsafe_progress(done, total):
+            self.server.reactor.callFromThread(progress, done, total)
+        return threadsafe_progress
+
+    def _broadcast(self, force=False):
+        """
+        Send current status to websocket clients, rate-limited to once every
+        :py:data:`~.PROGRESS_BROADCAST_INTERVAL` seconds unless ``force``.
+        """
+        now = time.time()
+        if not force and now - self._last_broadcast < \
+                PROGRESS_BROADCAST_INTERVAL:
+            return
+        self._last_broadcast = now
+        self.server._ws_send('warmup', self.status)
+
+    def is_ready(self, name):
+        """
+        Return whether the named step has finished (successfully or not), i.e.
+        whether anything depending on it can stop waiting.
+
+        :param name: step name
+        :type name: str
+        :return: whether the step is finished
+        :rtype: bool
+        """
+        return self._by_name[name]['state'] in ('done', 'failed')
+
+    @property
+    def complete(self):
+        """
+        Return whether all steps have finished.
+
+        :rtype: bool
+        """
+        return self._state == 'done'
+
+    @property
+    def duration(self):
+        """
+        Return the total warm-up duration in seconds, or None if not finished.
+
+        :rtype: float
+        """
+        if self._end_time is None:
+            return None
+        return self._end_time - self._start_time
+
+    @property
+    def status(self):
+        """
+        Return a JSON-serializable dict describing warm-up progress, with
+        keys ``state`` ("pending", "running" or "done") and ``steps``, a list
+        of dicts with keys ``name``, ``title``, ``state`` ("pending",
+        "running", "done" or "failed"), ``done``, ``total`` and ``duration``.
+
+        :return: warm-up status
+        :rtype: dict
+        """
+        return {
+            'state': self._state,
+            'steps': [
+                {
+                    k: s[k] for k in [
+                        'name', 'title', 'state', 'done', 'total', 'duration'
+                    ]
+                } for s in self._steps
+            ]
+        }
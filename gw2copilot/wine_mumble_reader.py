@@ -40,10 +40,12 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 import os
 import json
-import psutil
-import pkg_resources
 from twisted.internet import protocol
-from twisted.internet.task import LoopingCall
+
+from .read_mumble_link import (
+    BinaryFramer, LineFramer, decode_frame, FRAME_DELTA, FRAME_ERROR,
+    DEFAULT_PUSH_WINDOW
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,42 +55,72 @@ class WineMumbleLinkReader(object):
     Class to handle reading MumbleLink via wine.
     """
 
-    def __init__(self, parent_server, poll_interval):
+    def __init__(self, parent_server, poll_interval, json_frames=False,
+                 push_rate=None, name='MumbleLink'):
         """
         Initialize the class.
         :param parent_server: the TwistedServer instance that started this
         :type parent_server: :py:class:`~.TwistedServer`
         :param poll_interval: interval in seconds to poll MumbleLink
         :type poll_interval: float
+        :param json_frames: have the process write line-delimited JSON, for
+          debugging, instead of binary frames
+        :type json_frames: bool
+        :param push_rate: if not None, run the process in push mode, polling
+          MumbleLink this many times per second and writing a frame whenever
+          the game updates it, instead of asking it for a frame every
+          ``poll_interval`` seconds
+        :type push_rate: float
+        :param name: MumbleLink shared memory name (the game's ``-mumble``
+          argument)
+        :type name: str
         """
         logger.debug("Instantiating WineMumbleLinkReader")
         self.server = parent_server
         self._poll_interval = poll_interval
+        self._json_frames = json_frames
+        self._push_rate = push_rate
+        self._name = name
         self._wine_protocol = None
         self._wine_process = None
-        self._looping_deferred = None
+        self.poll_scheduler = None
         self._setup_process()
-        self._add_update_loop()
+        if push_rate is None:
+            self._add_update_loop()
+        else:
+            logger.info('Reading MumbleLink in push mode at up to %s Hz',
+                        push_rate)
+
+    @property
+    def push_rate(self):
+        """
+        Return the process' poll rate in push mode.
+
+        :return: polls per second, or None if not in push mode
+        :rtype: float
+        """
+        return self._push_rate
 
     def _add_update_loop(self):
         """
-        Setup the LoopingCall to poll MumbleLink every ``self.poll_interval``;
-        helper for testing.
+        Setup the :py:class:`~.PollScheduler` to ask the process for data;
+        helper for testing. The process' responses are reported to the
+        scheduler by :py:meth:`~.WineProcessProtocol.outReceived`.
         """
-        logger.debug("Creating LoopingCall")
-        l = LoopingCall(self._wine_protocol.ask_for_output)
-        l.clock = self.server.reactor
-        logger.info('Setting poll interval to %s seconds',
-                    self._poll_interval)
-        self._looping_deferred = l.start(self._poll_interval)
-        self._looping_deferred.addErrback(logger.error)
+        logger.debug("Creating PollScheduler")
+        self.poll_scheduler = self.server.make_poll_scheduler(
+            self._wine_protocol.ask_for_output)
+        self._wine_protocol.poll_scheduler = self.poll_scheduler
+        self.poll_scheduler.start()
 
     def _setup_process(self):
         """
         Setup and spawn the process to read MumbleLink.
         """
         logger.debug("Creating WineProcessProtocol")
-        self._wine_protocol = WineProcessProtocol(self.server)
+        self._wine_protocol = WineProcessProtocol(
+            self.server, json_frames=self._json_frames,
+            push=(self._push_rate is not None))
         logger.debug("Finding process executable, args and environ")
         executable, args, env = self._gw2_wine_spawn_info
         # this seems to cause problems
@@ -124,8 +156,17 @@ class WineMumbleLinkReader(object):
             wine_path,
             self._wine_python_path(env['WINEPREFIX']),
             self._read_mumble_path,
-            '-i'
+            '-n', self._name,
+            '-d' if self._json_frames else '-b'
         ]
+        if self._push_rate is None:
+            wine_args.append('-i')
+        else:
+            wine_args.extend([
+                '-p',
+                '-s', '%f' % (1.0 / self._push_rate),
+                '-w', '%d' % DEFAULT_PUSH_WINDOW
+            ])
         return wine_path, wine_args, env
 
     @property
@@ -136,6 +177,7 @@ class WineMumbleLinkReader(object):
         :return: absolute path to :py:mod:`~.read_mumble_link`
         :rtype: str
         """
+        import pkg_resources
         p = pkg_resources.resource_filename('gw2copilot', 'read_mumble_link.py')
         p = os.path.abspath(os.path.realpath(p))
         logger.debug('Found path to read_mumble_link as: %s', p)
@@ -160,24 +202,47 @@ class WineMumbleLinkReader(object):
     @property
     def _gw2_process(self):
         """
-        Find the Gw2.exe process; return the Process object.
+        Find the Gw2.exe process; return the Process object. If several are
+        running (multiboxing), find the one started with our MumbleLink name
+        (``-mumble <name>``).
 
         :return: Gw2.exe process
         :rtype: psutil.Process
         """
-        gw2_p = None
-        for p in psutil.process_iter():
-            if p.name() != 'Gw2.exe':
-                continue
-            if gw2_p is not None:
-                raise Exception("Error: more than one Gw2.exe process found")
-            gw2_p = p
-        if gw2_p is None:
+        # psutil is only needed to find the game once, at startup
+        import psutil
+        procs = [p for p in psutil.process_iter() if p.name() == 'Gw2.exe']
+        if len(procs) == 0:
             raise Exception("Error: could not find a running Gw2.exe process")
+        if len(procs) > 1:
+            procs = [
+                p for p in procs
+                if _mumble_name(p.cmdline()) == self._name
+            ]
+            if len(procs) != 1:
+                raise Exception("Error: found %d Gw2.exe processes using "
+                                "MumbleLink name %s" % (len(procs),
+                                                        self._name))
+        gw2_p = procs[0]
         logger.debug("Found Gw2.exe process, PID %d", gw2_p.pid)
         return gw2_p
 
 
+def _mumble_name(cmdline):
+    """
+    Return the MumbleLink name a game process was started with.
+
+    :param cmdline: process command line
+    :type cmdline: list
+    :return: the ``-mumble`` argument, or ``MumbleLink`` if there is none
+    :rtype: str
+    """
+    for i, arg in enumerate(cmdline[:-1]):
+        if arg.lower() == '-mumble':
+            return cmdline[i + 1]
+    return 'MumbleLink'
+
+
 class WineProcessProtocol(protocol.ProcessProtocol):
     """
     An implementation of :py:class:`twisted.internet.protocol.ProcessProtocol`
@@ -186,17 +251,42 @@ class WineProcessProtocol(protocol.ProcessProtocol):
     process and requesting more.
     """
 
-    def __init__(self, parent_server):
+    def __init__(self, parent_server, json_frames=False, push=False):
         """
         Initialize; save an instance variable pointing to our
         :py:class:`~.TwistedServer`
 
         :param parent_server: the TwistedServer instance that started this
         :type parent_server: :py:class:`~.TwistedServer`
+        :param json_frames: whether the process writes line-delimited JSON
+          (``read_mumble_link.py -d``) rather than binary frames
+          (``read_mumble_link.py -b``)
+        :type json_frames: bool
+        :param push: whether the process is in push mode
+          (``read_mumble_link.py -p``) and frames must be acknowledged
+        :type push: bool
         """
         logger.debug("Initializing WineProcessProtocol")
         self.parent_server = parent_server
         self.have_data = False
+        #: :py:class:`~.PollScheduler` to report changes to, if not in push
+        #: mode
+        self.poll_scheduler = None
+        self._json_frames = json_frames
+        self._push = push
+        self._framer = self._make_framer()
+
+    def _make_framer(self):
+        """
+        Return a new framer for the process' output format.
+
+        :return: :py:class:`~.LineFramer` for JSON output, otherwise
+          :py:class:`~.BinaryFramer`
+        :rtype: object
+        """
+        if self._json_frames:
+            return LineFramer()
+        return BinaryFramer()
 
     def connectionMade(self):
         """Triggered when the process starts; just logs a debug message"""
@@ -213,20 +303,82 @@ class WineProcessProtocol(protocol.ProcessProtocol):
 
     def outReceived(self, data):
         """
-        Called when output is received from the process; attempts to deserialize
-        JSON and on success passes it back to ``self.parent_server`` via
-        :py:meth:`~.TwistedServer.update_mumble_data`.
+        Called when output is received from the process. The output is split
+        into complete frames, however it was chunked, and each frame is
+        deserialized and passed back to ``self.parent_server`` via
+        :py:meth:`~.TwistedServer.update_mumble_data`; deltas (see
+        :py:class:`~.BinaryFrameEncoder` and :py:class:`~.DeltaEncoder`) are
+        passed on as partial updates.
+
+        In push mode, the frames are then acknowledged (see
+        :py:class:`~.FlowControl`) so the process can send more.
 
-        :param data: JSON data read from MumbleLink
+        :param data: data read from the process' STDOUT
         :type data: str
         """
-        logger.debug("Data received: %s", data)
+        logger.debug("Data received: %r", data)
         try:
-            d = json.loads(data.strip())
-            self.have_data = True
-            self.parent_server.update_mumble_data(d)
+            frames = self._framer.feed(data)
         except Exception:
-            logger.exception("Could not deserialize data")
+            # there are no sync markers in the stream; this only happens if
+            # the process writes something other than frames to STDOUT
+            logger.exception("Could not deframe data; discarding output "
+                             "buffered so far")
+            self._framer = self._make_framer()
+            return
+        for frame in frames:
+            try:
+                if self._json_frames:
+                    d, partial = self._decode_json(frame)
+                else:
+                    d, partial = self._decode_binary(*frame)
+            except Exception:
+                logger.exception("Could not deserialize data")
+                continue
+            if d.get('error', False):
+                logger.error('read_mumble_link.py error: %s\n%s',
+                             d.get('exception'), d.get('traceback'))
+                continue
+            self.have_data = True
+            changed = self.parent_server.update_mumble_data(
+                d, partial=partial)
+            if self.poll_scheduler is not None:
+                self.poll_scheduler.observe(changed)
+        if self._push and frames:
+            self.transport.write('%d\n' % len(frames))
+
+    @staticmethod
+    def _decode_json(line):
+        """
+        Deserialize one line of JSON output.
+
+        :param line: line of output
+        :type line: str
+        :return: 2-tuple of (data dict, whether it is a partial update)
+        :rtype: tuple
+        """
+        d = json.loads(line)
+        if 'frame' not in d:
+            # full data, from a reader not in delta mode
+            return d, False
+        return d['data'], d['frame'] == 'delta'
+
+    @staticmethod
+    def _decode_binary(frame_type, payload):
+        """
+        Deserialize one binary frame.
+
+        :param frame_type: frame type
+        :type frame_type: int
+        :param payload: frame payload
+        :type payload: str
+        :return: 2-tuple of (data dict, whether it is a partial update)
+        :rtype: tuple
+        """
+        d = decode_frame(frame_type, payload)
+        if frame_type == FRAME_ERROR:
+            return d, False
+        return d, frame_type == FRAME_DELTA
 
     def errReceived(self, data):
         """
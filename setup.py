@@ -106,5 +106,6 @@ setup(
     entry_points="""
     [console_scripts]
     gw2copilot = gw2copilot.runner:console_entry_point
+    gw2copilot-mumble-writer = gw2copilot.shm_mumble_reader:writer_entry_point
     """,
 )